@@ -0,0 +1,311 @@
+"""
+Asyncio advice server with request coalescing.
+
+Answers choose_best_keep / choose_best_category / expected_turn_value from
+the read-only DP tables (FrozenBot). Incoming requests are queued, and a
+single batcher task drains the queue into micro-batches: requests are
+grouped by turn-start state (avail_mask, upper_total, y_bonus), each
+distinct state's widget is solved once with one vectorized solve_widgets
+call in a worker thread, and every request in the group is answered from
+that widget.
+
+Protocol: one JSON object per line, one JSON reply per line, matched by "id".
+
+    {"id": 1, "op": "keep", "dice": [1,3,3,5,6], "rolls_left": 2, "score_sheet": {...}}
+    {"id": 2, "op": "category", "dice": [...], "score_sheet": {...}}
+    {"id": 3, "op": "turn_value", "dice": [...], "reroll_mask": 7, "rolls_left": 1, "score_sheet": {...}}
+    {"id": 4, "op": "stats"}
+
+    -> {"id": 1, "result": 9}    or    {"id": 1, "error": "..."}
+
+A missing or null "score_sheet" means a fresh game; filled categories must
+hold an int score that category can take. The server can be used
+in-process without any sockets (await server.submit(request)), or served
+over a Unix socket or localhost TCP:
+
+    python advice_server.py --dp-table yahtzee_value_table.npy --unix /tmp/yahtzee.sock
+    python advice_server.py --greedy --port 8765
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from evaluate import CATS
+from frozen_bot import FrozenBot
+
+OPS = ("keep", "category", "turn_value")
+
+#-----------------------------
+# SERVER
+#-----------------------------
+
+class AdviceServer:
+    def __init__(self, bot, max_batch=512, max_wait_ms=2.0, latency_window=10_000):
+        """
+        bot: FrozenBot (DP or greedy tables); it is shared with the solver thread.
+        max_batch: most requests answered by one micro-batch.
+        max_wait_ms: how long the batcher waits for more requests after the first one.
+        """
+        self.bot = bot
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._batcher = None
+        self._latencies = deque(maxlen=latency_window)
+        self._n_requests = 0
+        self._n_errors = 0
+        self._n_batches = 0
+        self._n_states_solved = 0
+        self._max_depth = 0
+        # points each category can be scored with (Joker overrides score the same values)
+        t = bot.tables
+        self._legal_scores = {
+            c: frozenset(int(v) for v in t.score_table[:, ci]) | {0} for ci, c in enumerate(t.categories)
+        }
+
+    # --- lifecycle
+
+    async def start(self):
+        if self._batcher is None:
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.create_task(self._run_batcher())
+
+    async def stop(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    # --- requests
+
+    async def submit(self, request):
+        """Answer one request dict; returns the reply dict."""
+        if not isinstance(request, dict):
+            self._n_requests += 1
+            self._n_errors += 1
+            return {"id": None, "error": "request must be a JSON object"}
+        if request.get("op") == "stats":
+            return {"id": request.get("id"), "result": self.stats()}
+        await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((request, future, time.perf_counter()))
+        self._max_depth = max(self._max_depth, self._queue.qsize())
+        return await future
+
+    def _parse(self, request):
+        op = request.get("op")
+        if op not in OPS:
+            raise ValueError(f"unknown op {op!r}")
+        dice = tuple(sorted(int(d) for d in request["dice"]))
+        sid = self.bot.tables.state_to_id.get(dice)
+        if sid is None:
+            raise ValueError(f"invalid dice {request['dice']!r}")
+        sheet = request.get("score_sheet") or {c: None for c in CATS}
+        missing = [c for c in CATS if c not in sheet]
+        if missing:
+            raise ValueError(f"score_sheet missing {missing}")
+        for c in CATS:
+            v = sheet[c]
+            if v is not None and (type(v) is not int or v not in self._legal_scores[c]):
+                raise ValueError(f"score_sheet[{c!r}] must be null or one of {sorted(self._legal_scores[c])}")
+        if all(sheet[c] is not None for c in CATS):
+            raise ValueError("score_sheet has no open category")
+        rolls_left = int(request.get("rolls_left", 0))
+        if not 0 <= rolls_left <= 2:
+            raise ValueError("rolls_left must be 0, 1 or 2")
+        reroll_mask = 0
+        if op == "turn_value":
+            reroll_mask = int(request.get("reroll_mask", 0))
+            if not 0 <= reroll_mask < self.bot.tables.n_masks:
+                raise ValueError(f"reroll_mask must be in 0..{self.bot.tables.n_masks - 1}")
+        return op, sid, rolls_left, reroll_mask, self.bot.turn_state(sheet)
+
+    def _answer(self, op, sid, rolls_left, reroll_mask, ev, policy, b):
+        t = self.bot.tables
+        if op == "category":
+            return t.categories[int(policy["category"][b, sid])]
+        if op == "keep":
+            if rolls_left == 0:
+                return 0
+            return int(policy["keep2" if rolls_left == 2 else "keep1"][b, sid])
+        if rolls_left == 0 or reroll_mask == 0:
+            return float(ev[0, b, sid])
+        keep = t.keep_by_mask[sid, reroll_mask]
+        return float(t.keep_transition[keep] @ ev[rolls_left - 1, b])
+
+    def _solve_batch(self, batch):
+        """Runs in a worker thread: one widget solve per distinct turn-start state."""
+        parsed, states = [], {}
+        for request, _, _ in batch:
+            try:
+                p = self._parse(request)
+            except (KeyError, TypeError, ValueError) as e:
+                parsed.append(e)
+                continue
+            parsed.append(p)
+            states.setdefault(p[-1], len(states))
+
+        ev, policy = self.bot.solve_turns(list(states))
+        replies = []
+        for (request, _, _), p in zip(batch, parsed):
+            if isinstance(p, Exception):
+                replies.append({"id": request.get("id"), "error": str(p)})
+                continue
+            op, sid, rolls_left, reroll_mask, state = p
+            result = self._answer(op, sid, rolls_left, reroll_mask, ev, policy, states[state])
+            replies.append({"id": request.get("id"), "result": result})
+        return replies, len(states)
+
+    async def _run_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+
+            try:
+                replies, n_states = await loop.run_in_executor(None, self._solve_batch, batch)
+            except Exception as e:  # keep serving; fail only this batch
+                replies = [{"id": r.get("id"), "error": f"internal error: {e}"} for r, _, _ in batch]
+                n_states = 0
+
+            now = time.perf_counter()
+            self._n_batches += 1
+            self._n_states_solved += n_states
+            for (_, future, t_enq), reply in zip(batch, replies):
+                self._n_requests += 1
+                if "error" in reply:
+                    self._n_errors += 1
+                self._latencies.append(now - t_enq)
+                if not future.done():
+                    future.set_result(reply)
+
+    # --- observability
+
+    def stats(self):
+        lat = np.asarray(self._latencies) * 1000.0
+        pct = {}
+        if len(lat):
+            for p in (50, 90, 99):
+                pct[f"p{p}_ms"] = float(np.percentile(lat, p))
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self._max_depth,
+            "requests": self._n_requests,
+            "errors": self._n_errors,
+            "batches": self._n_batches,
+            "mean_batch_size": self._n_requests / self._n_batches if self._n_batches else 0.0,
+            "states_solved": self._n_states_solved,
+            "latency": pct,
+        }
+
+    # --- transport
+
+    async def handle_connection(self, reader, writer):
+        """JSON lines in, JSON lines out; replies may arrive out of order (match on "id")."""
+        pending = set()
+
+        async def reply(request):
+            response = await self.submit(request)
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    writer.write((json.dumps({"id": None, "error": f"bad json: {e}"}) + "\n").encode())
+                    await writer.drain()
+                    continue
+                task = asyncio.create_task(reply(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve_unix(self, path):
+        await self.start()
+        return await asyncio.start_unix_server(self.handle_connection, path=path)
+
+    async def serve_tcp(self, host="127.0.0.1", port=8765):
+        await self.start()
+        return await asyncio.start_server(self.handle_connection, host=host, port=port)
+
+#-----------------------------
+# DRIVER
+#-----------------------------
+
+async def _serve(server, args):
+    async with server:
+        if args.unix:
+            srv = await server.serve_unix(args.unix)
+            where = args.unix
+        else:
+            srv = await server.serve_tcp(args.host, args.port)
+            where = f"{args.host}:{args.port}"
+        print(f"advice server listening on {where}", flush=True)
+        async with srv:
+            await srv.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Yahtzee decisions over JSON lines.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--dp-table", default=None, help="DP value table (.npy)")
+    src.add_argument("--greedy", action="store_true", help="serve the GreedyBot policy (no table)")
+    parser.add_argument("--unix", default=None, help="Unix socket path (default: TCP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    if args.greedy:
+        bot = FrozenBot.greedy()
+    else:
+        from tables import load_value_table
+        bot = FrozenBot(load_value_table(args.dp_table))
+
+    server = AdviceServer(bot, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    try:
+        asyncio.run(_serve(server, args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Approximate DP value table: a fast mode for tables.build_value_table.
+
+The exact table tracks every capped upper total 0..63. Here the table is only
+solved at a few anchor distances to the 63-point bonus (points still needed),
+and values in between are interpolated linearly along that distance. Optionally
+the Yahtzee-bonus flag is dropped as well (future +100 bonuses are then not
+valued, though the current turn still scores them). The result is a compact
+table C[avail_mask, anchor, y_bonus]. Loaded, it is an ApproxValueTable that
+interpolates on lookup and is indexed like the exact V, so
+DynamicProgrammingBot, tables.solve_widgets and the harness use it unchanged
+while only C is held in memory (~1 MB instead of 8 MB). np.asarray(table)
+expands it to the full float64 table; FrozenBot and SharedTables do that, so
+for them only the file gets smaller.
+
+    python approx_tables.py --out approx.npz --exact-table yahtzee_value_table.npy
+
+reports build time, table size and the EV lost by playing with the approximate
+table instead of the exact one (exact policy evaluation on validation sheets).
+"""
+import argparse
+import time
+
+import numpy as np
+
+from rules import STANDARD_RULES
+from tables import (
+    get_static_tables, reachable_upper_totals, solve_widgets, load_value_table,
+    UPPER_CAP, N_UPPER,
+)
+
+# points-to-bonus distances (UPPER_CAP = 63 for the standard rules) where the
+# table is solved; the bonus cliff (0 and 1) stays exact, the far end (upper
+# total 0) bounds the interpolation
+DEFAULT_ANCHORS = (0, 1, 2, 3, 5, 8, 12, 17, 23, 31, 42, 63)
+
+#-----------------------------
+# ANCHORS / INTERPOLATION
+#-----------------------------
+
+def interpolation(anchors=DEFAULT_ANCHORS):
+    """
+    For every capped upper total u: (lo, w), so that
+    V[.., u] = w * C[.., lo] + (1 - w) * C[.., lo + 1]. Anchors are distances to
+    the bonus threshold (UPPER_CAP).
+    """
+    anchors = np.asarray(anchors)
+    if anchors[0] != 0 or anchors[-1] != UPPER_CAP or np.any(np.diff(anchors) <= 0):
+        raise ValueError(f"anchors must be strictly increasing from 0 to {UPPER_CAP}")
+    need = UPPER_CAP - np.arange(N_UPPER)
+    lo = np.minimum(np.searchsorted(anchors, need, side="right") - 1, len(anchors) - 2)
+    w = (anchors[lo + 1] - need) / (anchors[lo + 1] - anchors[lo])
+    return lo, w
+
+
+def expand_value_table(compact, anchors=DEFAULT_ANCHORS):
+    """Full-shape (2**13, 64, 2) table from a compact one (y axis of size 1 or 2)."""
+    lo, w = interpolation(anchors)
+    y_idx = np.array([0, 1]) if compact.shape[2] == 2 else np.array([0, 0])
+    C = compact[:, :, y_idx]
+    V = w[None, :, None] * C[:, lo, :] + (1.0 - w)[None, :, None] * C[:, lo + 1, :]
+    V[0] = 0.0
+    V[0, UPPER_CAP, :] = STANDARD_RULES.upper_bonus     # game over: the bonus is exact, not interpolated
+    return V
+
+
+class ApproxValueTable:
+    """
+    Read-only V[avail_mask, upper_total, y_bonus] interpolated on lookup from a
+    compact table (see expand_value_table for the values it returns).
+    """
+
+    def __init__(self, compact, anchors=DEFAULT_ANCHORS):
+        self.compact = np.asarray(compact, dtype=np.float64)
+        self.compact.setflags(write=False)
+        self.anchors = tuple(int(a) for a in anchors)
+        self._lo, self._w = interpolation(self.anchors)
+        self._track_y = self.compact.shape[2] == 2
+        # plain Python copies for scalar lookups (DynamicProgrammingBot)
+        self._lo_list = self._lo.tolist()
+        self._w_list = self._w.tolist()
+        self._flat = self.compact.reshape(-1)
+        self._n_anchors, self._n_y = self.compact.shape[1:]
+
+    @property
+    def shape(self):
+        return (self.compact.shape[0], N_UPPER, 2)
+
+    ndim = 3
+    dtype = np.dtype(np.float64)
+
+    @property
+    def nbytes(self):
+        return self.compact.nbytes
+
+    def __getitem__(self, key):
+        mask, upper, y = key
+        if isinstance(mask, slice) or isinstance(upper, slice) or isinstance(y, slice):
+            return np.asarray(self)[key]
+        if isinstance(mask, int) and isinstance(upper, int):
+            if mask == 0:
+                return float(STANDARD_RULES.upper_bonus) if upper >= UPPER_CAP else 0.0
+            lo, w = self._lo_list[upper], self._w_list[upper]
+            i = (mask * self._n_anchors + lo) * self._n_y + (int(y) if self._track_y else 0)
+            return w * self._flat.item(i) + (1.0 - w) * self._flat.item(i + self._n_y)
+
+        mask = np.asarray(mask, dtype=np.int64)
+        upper = np.asarray(upper, dtype=np.int64)
+        y = np.asarray(y, dtype=np.int64) if self._track_y else np.int64(0)
+        lo, w = self._lo[upper], self._w[upper]
+        i = (mask * self._n_anchors + lo) * self._n_y + y
+        v = w * self._flat.take(i) + (1.0 - w) * self._flat.take(i + self._n_y)
+        game_over = np.where(upper >= UPPER_CAP, float(STANDARD_RULES.upper_bonus), 0.0)
+        return np.where(mask == 0, game_over, v)
+
+    def __array__(self, dtype=None, copy=None):
+        V = expand_value_table(self.compact, self.anchors)
+        return V if dtype is None else V.astype(dtype)
+
+#-----------------------------
+# BUILD
+#-----------------------------
+
+def _needed_anchors(tables, mask, lo, w):
+    """Anchor indices whose values the reachable upper totals of `mask` interpolate from."""
+    needed = set()
+    for u in reachable_upper_totals(mask, tables):
+        needed.add(int(lo[u]))
+        if w[u] < 1.0:
+            needed.add(int(lo[u]) + 1)
+    return sorted(needed)
+
+
+def _layer_states(tables, n_open, anchors, lo, w, y_values):
+    """(masks, uppers, ybs, anchor indices) of the anchor states with n_open categories."""
+    yahtzee_bit = 1 << tables.cat_to_idx["yahtzee"]
+    masks, uppers, ybs, idxs = [], [], [], []
+    for mask in range(1 << tables.n_cat):
+        if mask.bit_count() != n_open:
+            continue
+        for k in _needed_anchors(tables, mask, lo, w):
+            for y in y_values:
+                if y and mask & yahtzee_bit:
+                    continue
+                masks.append(mask)
+                uppers.append(UPPER_CAP - anchors[k])
+                ybs.append(y)
+                idxs.append(k)
+    return (np.array(masks, dtype=np.int64), np.array(uppers, dtype=np.int64),
+            np.array(ybs, dtype=np.int64), np.array(idxs, dtype=np.int64))
+
+
+def build_approx_value_table(anchors=DEFAULT_ANCHORS, track_y_bonus=True,
+                             batch_size=256, progress=False):
+    """
+    Compact table C[avail_mask, anchor, y] (y axis of size 1 without
+    track_y_bonus), solved backwards like tables.build_value_table but only at
+    the anchor upper totals each mask's reachable totals interpolate from.
+    Returns (C, info) with info = {"build_s", "n_states_solved"}.
+    """
+    tables = get_static_tables()
+    lo, w = interpolation(anchors)
+    y_values = (0, 1) if track_y_bonus else (0,)
+
+    C = np.zeros((1 << tables.n_cat, len(anchors), len(y_values)))
+
+    t0 = time.perf_counter()
+    n_solved = 0
+    for n_open in range(1, tables.n_cat + 1):
+        masks, uppers, ybs, idxs = _layer_states(tables, n_open, anchors, lo, w, y_values)
+        V = expand_value_table(C, anchors)
+        for start in range(0, len(masks), batch_size):
+            sl = slice(start, start + batch_size)
+            ev, _ = solve_widgets(tables, V, masks[sl], uppers[sl], ybs[sl])
+            C[masks[sl], idxs[sl], ybs[sl]] = ev[2] @ tables.first_roll
+        n_solved += len(masks)
+        if progress:
+            print(f"  layer {n_open}: {len(masks)} states (elapsed {time.perf_counter() - t0:.1f}s)", flush=True)
+
+    if track_y_bonus:
+        # y=1 with Yahtzee still open is unreachable: mirror y=0, as the exact table does
+        yahtzee_bit = 1 << tables.cat_to_idx["yahtzee"]
+        open_y = (np.arange(1 << tables.n_cat) & yahtzee_bit) != 0
+        C[open_y, :, 1] = C[open_y, :, 0]
+
+    return C, {"build_s": time.perf_counter() - t0, "n_states_solved": n_solved}
+
+
+def save_approx_value_table(path, compact, anchors=DEFAULT_ANCHORS):
+    np.savez(path, table=compact, anchors=np.asarray(anchors))
+
+
+def load_approx_value_table(path):
+    """ApproxValueTable from a file written by save_approx_value_table."""
+    with np.load(path) as data:
+        return ApproxValueTable(data["table"], tuple(int(a) for a in data["anchors"]))
+
+#-----------------------------
+# VALIDATION
+#-----------------------------
+
+def validate(approx_V, exact_V, n_sheets=20, min_open=3, max_open=6, seed=0, progress=False):
+    """
+    EV lost by playing with approx_V instead of exact_V, from random mid/late-game
+    sheets, both policies scored exactly (policy_eval.evaluate_policy_exact).
+    Returns {"mean_loss", "max_loss", "mean_exact_ev", "n_sheets"}.
+    """
+    from evaluate import random_small_state, state_rng
+    from frozen_bot import FrozenBot
+    from policy_eval import evaluate_policy_exact
+
+    exact_bot, approx_bot = FrozenBot(exact_V), FrozenBot(approx_V)
+    losses, exact_evs = [], []
+    for i in range(n_sheets):
+        sheet = random_small_state(state_rng(seed, i), min_open=min_open, max_open=max_open)
+        best = evaluate_policy_exact(exact_bot, sheet)["expected_score"]
+        got = evaluate_policy_exact(approx_bot, sheet)["expected_score"]
+        losses.append(best - got)
+        exact_evs.append(best)
+        if progress:
+            print(f"  sheet {i}: exact {best:.3f}  approx {got:.3f}  loss {best - got:.4f}", flush=True)
+    return {
+        "mean_loss": float(np.mean(losses)),
+        "max_loss": float(np.max(losses)),
+        "mean_exact_ev": float(np.mean(exact_evs)),
+        "n_sheets": n_sheets,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an approximate (bucketed) DP value table.")
+    parser.add_argument("--out", default="yahtzee_value_table_approx.npz")
+    parser.add_argument("--anchors", nargs="+", type=int, default=list(DEFAULT_ANCHORS),
+                        help=f"points-to-bonus distances to solve at (0 ... {UPPER_CAP})")
+    parser.add_argument("--no-y-bonus", action="store_true", help="drop the Yahtzee-bonus flag")
+    parser.add_argument("--exact-table", default=None,
+                        help="exact table (.npy) to measure EV loss against")
+    parser.add_argument("--validate-sheets", type=int, default=20)
+    parser.add_argument("--min-open", type=int, default=3)
+    parser.add_argument("--max-open", type=int, default=6)
+    args = parser.parse_args(argv)
+
+    C, info = build_approx_value_table(tuple(args.anchors), not args.no_y_bonus, progress=True)
+    save_approx_value_table(args.out, C, tuple(args.anchors))
+    V = ApproxValueTable(C, tuple(args.anchors))
+    n_cat = get_static_tables().n_cat
+
+    exact_states = sum(len(reachable_upper_totals(m)) for m in range(1 << n_cat)) * 2
+    print(f"built in {info['build_s']:.1f}s: {info['n_states_solved']} states solved "
+          f"(exact table: ~{exact_states})")
+    print(f"table: {C.nbytes / 1e6:.2f} MB compact (exact: {np.asarray(V).nbytes / 1e6:.2f} MB) -> {args.out}")
+    print(f"EV of a fresh game (approx table's own estimate): {V[V.shape[0] - 1, 0, 0]:.4f}")
+
+    if args.exact_table:
+        exact_V = load_value_table(args.exact_table)
+        print(f"EV of a fresh game (exact): {exact_V[exact_V.shape[0] - 1, 0, 0]:.4f}")
+        report = validate(V, exact_V, args.validate_sheets, args.min_open, args.max_open, progress=True)
+        print(f"EV loss over {report['n_sheets']} sheets: mean {report['mean_loss']:.4f}, "
+              f"max {report['max_loss']:.4f} (mean exact EV {report['mean_exact_ev']:.2f})")
+
+
+if __name__ == "__main__":
+    main()
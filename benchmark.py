@@ -0,0 +1,456 @@
+"""
+Repeatable performance numbers for the bots.
+
+Measures cold and warm decision latency (p50/p99) split by number of open
+categories and rolls_left, games/second for full-game simulation, DP table
+build time, peak RSS, cold-process startup (import + first decision) and the
+value-table storage layouts (lookups/s, disk and RAM size). Results are
+written as flat JSON so a later run can be compared against a saved baseline:
+
+    python benchmark.py --out bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.2   # exits 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from evaluate import make_bot, make_state, play_small_game, random_small_state, state_rng, CATS
+
+BENCH_SEED = 2024
+
+# metric name suffixes where a larger number is better
+HIGHER_IS_BETTER = ("games_per_s", "decisions_per_s", "lookups_per_s")
+
+#-----------------------------
+# HELPERS
+#-----------------------------
+
+def _percentiles_ms(samples):
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "n": len(samples),
+    }
+
+
+def _sample_decisions(n_open, n_samples, seed=BENCH_SEED):
+    """(dice, score_sheet) pairs with exactly n_open categories open."""
+    out = []
+    for i in range(n_samples):
+        rng = state_rng(seed + n_open, i)
+        sheet = random_small_state(rng, min_open=n_open, max_open=n_open)
+        dice = sorted(int(v) for v in rng.integers(1, 7, size=5))
+        out.append((dice, sheet))
+    return out
+
+
+def _decide(bot, dice, rolls_left, sheet):
+    if rolls_left == 0:
+        return bot.choose_best_category(dice, sheet)
+    return bot.choose_best_keep(dice, rolls_left, sheet)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss / (1024.0 * 1024.0)
+    return rss / 1024.0
+
+#-----------------------------
+# BENCHMARKS
+#-----------------------------
+
+def bench_decision_latency(bot_name, bot, open_counts, rolls_left_values, n_samples, warm_repeats=5):
+    """
+    Cold: caches cleared before each decision.
+    Warm: the same decision repeated after the cold call filled the caches.
+    """
+    metrics = {}
+    for n_open in open_counts:
+        decisions = _sample_decisions(n_open, n_samples)
+        for rolls_left in rolls_left_values:
+            cold, warm = [], []
+            for dice, sheet in decisions:
+                bot.reset_cache()
+                t0 = time.perf_counter()
+                _decide(bot, dice, rolls_left, sheet)
+                cold.append(time.perf_counter() - t0)
+
+                for _ in range(warm_repeats):
+                    t0 = time.perf_counter()
+                    _decide(bot, dice, rolls_left, sheet)
+                    warm.append(time.perf_counter() - t0)
+
+            prefix = f"latency.{bot_name}.open{n_open}.rolls{rolls_left}"
+            for kind, samples in (("cold", cold), ("warm", warm)):
+                for k, v in _percentiles_ms(samples).items():
+                    metrics[f"{prefix}.{kind}.{k}"] = v
+    bot.reset_cache()
+    return metrics
+
+
+def bench_game_throughput(bot_name, bot, n_games, mode="full", n_open=13):
+    """Games/second playing through evaluate.play_small_game (single process)."""
+    states = []
+    for i in range(n_games):
+        if mode == "full":
+            states.append(make_state(BENCH_SEED, i, "full"))
+        else:
+            states.append(make_state(BENCH_SEED, i, "small", n_open, n_open))
+
+    t0 = time.perf_counter()
+    for start_sheet, roll_table in states:
+        play_small_game(bot, start_sheet, roll_table)
+    elapsed = time.perf_counter() - t0
+
+    return {
+        f"throughput.{bot_name}.{mode}.games_per_s": n_games / elapsed if elapsed > 0 else float("inf"),
+        f"throughput.{bot_name}.{mode}.n_games": n_games,
+    }
+
+
+def bench_dp_build(n_open_values, full=False):
+    """
+    DP cost: constructor (static tables) and tables.build_value_table, the
+    batched layer-by-layer solver, restricted to the sub-masks of a sheet with
+    n_open categories left (root_mask; the work roughly doubles per category).
+    full=True also times the whole 13-category table (minutes).
+    """
+    from dynamic_programming import DynamicProgrammingBot
+    from tables import build_value_table
+
+    metrics = {}
+    t0 = time.perf_counter()
+    bot = DynamicProgrammingBot()
+    metrics["dp_build.construct_s"] = time.perf_counter() - t0
+
+    for n_open in n_open_values:
+        rng = state_rng(BENCH_SEED, 10_000 + n_open)
+        sheet = random_small_state(rng, min_open=n_open, max_open=n_open)
+
+        t0 = time.perf_counter()
+        build_value_table(root_mask=bot._make_avail_mask(sheet))
+        metrics[f"dp_build.open{n_open}.table_s"] = time.perf_counter() - t0
+
+    if full:
+        t0 = time.perf_counter()
+        build_value_table()
+        metrics["dp_build.full.table_s"] = time.perf_counter() - t0
+    return metrics
+
+
+def bench_thread_scaling(bot_name, bot, thread_counts, n_decisions=400):
+    """Decisions/second with one shared (thread-safe) bot queried from N threads."""
+    queries = []
+    for n_open in (3, 6, 9, 13):
+        for dice, sheet in _sample_decisions(n_open, max(1, n_decisions // 4)):
+            queries.append((dice, 2, sheet))
+
+    metrics = {}
+    for n_threads in thread_counts:
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            t0 = time.perf_counter()
+            list(pool.map(lambda q: _decide(bot, *q), queries))
+            elapsed = time.perf_counter() - t0
+        metrics[f"threads.{bot_name}.t{n_threads}.decisions_per_s"] = len(queries) / elapsed
+    return metrics
+
+# Child process for bench_startup: times the import, the constructor and the
+# first decision of a fresh interpreter, and prints them as JSON.
+_STARTUP_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+from evaluate import make_bot, CATS
+t1 = time.perf_counter()
+bot = make_bot(sys.argv[1])
+t2 = time.perf_counter()
+sheet = {c: 0 for c in CATS}
+sheet["chance"] = None
+sheet["yahtzee"] = None
+bot.choose_best_keep([1, 3, 3, 5, 6], 2, sheet)
+t3 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "construct_s": t2 - t1, "first_decision_s": t3 - t2}))
+"""
+
+
+def bench_startup(bot_names, repeats=3):
+    """
+    Cold start in a fresh interpreter: import, construct, first decision (two
+    open categories, so the DP solve stays small), plus whole-process wall time.
+    Medians over `repeats` runs.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")])))
+    metrics = {}
+    for name in bot_names:
+        runs = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, "-c", _STARTUP_CHILD, name],
+                capture_output=True, text=True, check=True, cwd=here, env=env,
+            )
+            wall = time.perf_counter() - t0
+            run = json.loads(out.stdout.strip().splitlines()[-1])
+            run["process_s"] = wall
+            runs.append(run)
+        for key in runs[0]:
+            metrics[f"startup.{name}.{key}"] = float(np.median([r[key] for r in runs]))
+    return metrics
+
+def _played_states(n_states, seed=BENCH_SEED):
+    """
+    (masks, uppers, y_bonus) of the turn-start states of GreedyBot full games,
+    upper totals capped as in the value table: the keys a bot actually looks up.
+    """
+    from greedy import GreedyBot
+    from policy_eval import sheet_to_state
+    from evaluate import score_category_with_joker
+
+    bot = GreedyBot()
+    states = []
+    game_id = 0
+    while len(states) < n_states:
+        start_sheet, roll_table = make_state(seed, game_id, "full")
+        turn_log = []
+        play_small_game(bot, start_sheet, roll_table, turn_log=turn_log)
+        sheet = dict(start_sheet)
+        for turn in turn_log:
+            states.append(sheet_to_state(sheet, cap_upper=True))
+            pts, _ = score_category_with_joker(turn["rolls"][-1], turn["category"], sheet)
+            sheet[turn["category"]] = pts
+        game_id += 1
+    masks, uppers, ys = (np.array(col, dtype=np.int64) for col in zip(*states[:n_states]))
+    return masks, uppers, ys
+
+
+def bench_value_table_layouts(value_table, n_scalar=100_000, n_turns=200, repeats=5):
+    """
+    The DP value table stored as float64 V[mask, upper, y] (as built) vs. the
+    packed_tables layouts. Per layout: RAM and on-disk size, max abs error,
+    scalar lookups/s (DynamicProgrammingBot-style, one Python lookup each) and
+    gathered lookups/s (every successor entry of a turn solve, as in
+    tables.solve_widgets).
+    """
+    import tempfile
+    from packed_tables import pack_value_table, save_packed_value_table
+    from tables import get_static_tables, category_outcomes
+
+    V = np.asarray(value_table, dtype=np.float64)
+    rng = np.random.default_rng(BENCH_SEED)
+
+    # scalar queries drawn from, and turn-solve gathers at, the turn-start
+    # states of played games
+    masks, uppers, ys = _played_states(max(n_turns, 20 * len(CATS)))
+    pick = rng.integers(0, len(masks), size=n_scalar)
+    scalar = list(zip(masks[pick].tolist(), uppers[pick].tolist(), ys[pick].tolist()))
+    tables = get_static_tables()
+    out = category_outcomes(tables, masks[:n_turns], uppers[:n_turns], ys[:n_turns])
+    gather = (out["next_mask"][:, None, :], out["new_upper"], out["new_y"].astype(np.int64))
+    n_gathered = out["new_upper"].size
+
+    layouts = {"float64": V}
+    for dtype in ("float32", "uint16"):
+        layouts[dtype] = pack_value_table(V, dtype)
+
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, table in layouts.items():
+            path = os.path.join(tmp, f"{name}.npz" if name != "float64" else "float64.npy")
+            if name == "float64":
+                np.save(path, table)
+            else:
+                save_packed_value_table(path, table)
+
+            times = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                for key in scalar:
+                    float(table[key])
+                times.append(time.perf_counter() - t0)
+            scalar_s = min(times)
+
+            times = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                table[gather]
+                times.append(time.perf_counter() - t0)
+            gather_s = min(times)
+
+            prefix = f"layout.{name}"
+            metrics[f"{prefix}.ram_mb"] = table.nbytes / 1e6
+            metrics[f"{prefix}.disk_mb"] = os.path.getsize(path) / 1e6
+            metrics[f"{prefix}.max_error"] = float(np.abs(np.asarray(table) - V).max())
+            metrics[f"{prefix}.scalar_lookups_per_s"] = n_scalar / scalar_s
+            metrics[f"{prefix}.gather_lookups_per_s"] = n_gathered / gather_s
+    return metrics
+
+#-----------------------------
+# BASELINE COMPARISON
+#-----------------------------
+
+def compare(current, baseline, tolerance):
+    """
+    Returns list of (name, baseline, current, ratio) for metrics that got worse
+    by more than `tolerance` (fraction). Counts (.n, .n_games) are ignored.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        if name not in current or name.endswith(".n") or name.endswith(".n_games"):
+            continue
+        cur = current[name]
+        if not base or base <= 0:
+            continue
+        ratio = cur / base
+        if name.endswith(HIGHER_IS_BETTER):
+            worse = ratio < 1.0 - tolerance
+        else:
+            worse = ratio > 1.0 + tolerance
+        if worse:
+            regressions.append((name, base, cur, ratio))
+    return regressions
+
+#-----------------------------
+# DRIVER
+#-----------------------------
+
+def run_benchmarks(
+    bot_names=("greedy", "dp", "ml"),
+    open_counts=(1, 2, 3),
+    dp_max_open=2,
+    rolls_left_values=(2, 1, 0),
+    n_samples=5,
+    n_games=20,
+    throughput_bots=("greedy", "ml"),
+    ml_model_path=None,
+    value_table=None,
+    thread_counts=(),
+    startup_bots=(),
+    layouts=False,
+    dp_build_open=(3, 5, 7),
+    dp_build_full=False,
+):
+    metrics = {}
+
+    for name in bot_names:
+        bot = make_bot(name, ml_model_path, value_table)
+        opens = [k for k in open_counts if name != "dp" or k <= dp_max_open]
+        metrics.update(bench_decision_latency(name, bot, opens, rolls_left_values, n_samples))
+
+    for name in throughput_bots:
+        bot = make_bot(name, ml_model_path, value_table)
+        metrics.update(bench_game_throughput(name, bot, n_games))
+
+    if thread_counts:
+        frozen = ["frozen-greedy"] + (["frozen-dp"] if value_table is not None else [])
+        for name in frozen:
+            metrics.update(bench_thread_scaling(name, make_bot(name, value_table=value_table), thread_counts))
+
+    if startup_bots:
+        metrics.update(bench_startup(startup_bots))
+
+    if layouts:
+        if value_table is None:
+            raise ValueError("the layout benchmark needs a DP value table (--dp-table)")
+        metrics.update(bench_value_table_layouts(value_table))
+
+    if "dp" in bot_names:
+        metrics.update(bench_dp_build(dp_build_open, dp_build_full))
+
+    metrics["peak_rss_mb"] = peak_rss_mb()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "n_categories": len(CATS),
+        },
+        "metrics": metrics,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bot decision latency and throughput.")
+    parser.add_argument("--bots", nargs="+", default=["greedy", "dp", "ml"])
+    parser.add_argument("--open", nargs="+", type=int, default=[1, 2, 3],
+                        help="numbers of open categories to sample")
+    parser.add_argument("--dp-max-open", type=int, default=2,
+                        help="skip DP cases with more open categories than this")
+    parser.add_argument("--rolls-left", nargs="+", type=int, default=[2, 1, 0])
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--throughput-bots", nargs="*", default=["greedy", "ml"])
+    parser.add_argument("--ml-model", default=None)
+    parser.add_argument("--dp-table", default=None,
+                        help="DP value table (.npy); enables table-backed dp and frozen-dp")
+    parser.add_argument("--threads", nargs="*", type=int, default=[],
+                        help="thread counts for the shared FrozenBot scaling benchmark")
+    parser.add_argument("--startup", nargs="*", default=[],
+                        help="bots to time from a fresh interpreter (import + first decision)")
+    parser.add_argument("--layouts", action="store_true",
+                        help="compare float64 / float32 / uint16 value-table layouts (needs --dp-table)")
+    parser.add_argument("--dp-build-open", nargs="*", type=int, default=[3, 5, 7],
+                        help="time build_value_table below a sheet with this many open categories")
+    parser.add_argument("--dp-build-full", action="store_true",
+                        help="also time building the whole value table (minutes)")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown before flagging a regression")
+    args = parser.parse_args(argv)
+
+    value_table = None
+    if args.dp_table:
+        from tables import load_value_table
+        value_table = load_value_table(args.dp_table)
+
+    results = run_benchmarks(
+        bot_names=args.bots,
+        open_counts=args.open,
+        dp_max_open=args.dp_max_open,
+        rolls_left_values=args.rolls_left,
+        n_samples=args.samples,
+        n_games=args.games,
+        throughput_bots=args.throughput_bots,
+        ml_model_path=args.ml_model,
+        value_table=value_table,
+        thread_counts=args.threads,
+        startup_bots=args.startup,
+        layouts=args.layouts,
+        dp_build_open=args.dp_build_open,
+        dp_build_full=args.dp_build_full,
+    )
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+        regressions = compare(results["metrics"], baseline, args.tolerance)
+        for name, base, cur, ratio in regressions:
+            print(f"REGRESSION {name}: {base:.4g} -> {cur:.4g} (x{ratio:.2f})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
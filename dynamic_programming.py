@@ -1,18 +1,67 @@
-from yahtzee_game import YahtzeeGame
-from utils import calculate_score
-from itertools import combinations_with_replacement
 from functools import lru_cache
+from collections import namedtuple
 import time
 
+import numpy as np
+
+from profiling import debug_profiler
+from rules import STANDARD_RULES, categories as rules_categories, upper_categories, check_rules
+from tables import get_static_tables, solve_rerolls, _multiset_prob
+
+# turn widgets kept per process; each is a few KB, and a turn-start state is
+# rarely revisited once the game has moved on
+WIDGET_CACHE_SIZE = 4096
+
+# ev (3, 252), keep_ev (2, 462), masks (2, 252): see tables.solve_rerolls;
+# category: best category name per dice state; keep_by_mask: (252, 32) keep ids
+# (sizes for the standard rules)
+TurnWidget = namedtuple("TurnWidget", ["ev", "keep_ev", "masks", "category", "keep_by_mask"])
+
+
+@lru_cache(maxsize=None)
+def _static_tables(rules):
+    """
+    Python-list views of tables.get_static_tables(rules) for the scalar
+    recursion in DynamicProgrammingBot (list indexing beats NumPy scalars
+    there), built once per process and rules config and shared (read-only)
+    by all instances.
+    """
+    tables = get_static_tables(rules)
+
+    # --- multinomial-weighted outcomes for rolling k dice (k=0..n_dice):
+    # the kept multisets of size k, each as (sorted_tuple_of_len_k, prob)
+    roll_outcomes_by_k = [[] for _ in range(tables.n_dice + 1)]
+    for outcome in tables.keeps:
+        roll_outcomes_by_k[len(outcome)].append((outcome, _multiset_prob(outcome, rules.n_faces)))
+
+    # NOTE: scoring MUST be "standard" category scoring (no Joker baked in),
+    # because Joker overrides are handled in _best_category_value / choose_best_category.
+    return {
+        "dice_states": tables.dice_states,
+        "state_to_id": tables.state_to_id,
+        "roll_outcomes_by_k": roll_outcomes_by_k,
+        "first_roll": [(sid, float(p)) for sid, p in enumerate(tables.first_roll) if p > 0],
+        "score_table": tables.score_table.tolist(),
+    }
+
 
 class DynamicProgrammingBot:
-    def __init__(self):
-        self._categories = list(YahtzeeGame().score_sheet.keys())
+    def __init__(self, value_table=None, rules=STANDARD_RULES):
+        """
+        value_table: optional precomputed V[avail_mask, upper_total, y_bonus]
+        (tables.build_value_table, possibly a shared_tables.SharedTables view).
+        With a table, future EVs are lookups instead of recursive solves.
+        rules: rules.Rules (dice, faces, rerolls, bonuses); a value table must
+        have been built for the same rules.
+        """
+        self._rules = check_rules(rules)
+        self._n_dice = rules.n_dice
+        self._n_rerolls = rules.n_rerolls
+        self._upper_cap = rules.upper_bonus_threshold
+        self._categories = list(rules_categories(rules))
         self._n_cat = len(self._categories)
 
-        self._numeric_scores = {
-            "aces": 1, "twos": 2, "threes": 3, "fours": 4, "fives": 5, "sixes": 6,
-        }
+        self._numeric_scores = upper_categories(rules)
         self._upper_categories = set(self._numeric_scores.keys())
 
         # --- category indices + upper mask (bit i = category i is upper section)
@@ -23,61 +72,31 @@ class DynamicProgrammingBot:
         self._idx_lgstraight = self._cat_to_idx.get("lgstraight")
 
         # face value -> corresponding upper category index
-        self._upper_idx_by_face = {
-            1: self._cat_to_idx["aces"],
-            2: self._cat_to_idx["twos"],
-            3: self._cat_to_idx["threes"],
-            4: self._cat_to_idx["fours"],
-            5: self._cat_to_idx["fives"],
-            6: self._cat_to_idx["sixes"],
-        }
+        self._upper_idx_by_face = {face: self._cat_to_idx[c] for c, face in self._numeric_scores.items()}
 
         self._upper_mask = 0
         for c in self._upper_categories:
             if c in self._cat_to_idx:
                 self._upper_mask |= (1 << self._cat_to_idx[c])
 
-        # --- all 252 dice multisets, interned to ids (0..251)
-        self._dice_states = list(combinations_with_replacement(range(1, 7), 5))  # each is a sorted 5-tuple
-        self._state_to_id = {s: i for i, s in enumerate(self._dice_states)}
-
-        # --- small factorials 0..5
-        self._fact = [1] * 6
-        for i in range(1, 6):
-            self._fact[i] = self._fact[i - 1] * i
-
-        # --- precompute multinomial-weighted outcomes for rolling k dice (k=0..5)
-        # Each entry: list of (sorted_tuple_of_len_k, prob)
-        self._roll_outcomes_by_k = [[] for _ in range(6)]
-        self._roll_outcomes_by_k[0] = [((), 1.0)]
-        for k in range(1, 6):
-            denom_pow = 6 ** k
-            fk = self._fact[k]
-            outs = []
-            for outcome in combinations_with_replacement(range(1, 7), k):
-                counts = [0] * 6
-                for v in outcome:
-                    counts[v - 1] += 1
-                denom = 1
-                for c in counts:
-                    denom *= self._fact[c]
-                prob = (fk / denom) / denom_pow
-                outs.append((outcome, prob))
-            self._roll_outcomes_by_k[k] = outs
-
-        # --- precompute first-roll distribution as (state_id, prob)
-        self._first_roll = [(self._state_to_id[out], p) for (out, p) in self._roll_outcomes_by_k[5]]
-
-        # NOTE: calculate_score MUST be "standard" category scoring (no Joker baked in),
-        # because Joker overrides are handled in _best_category_value / choose_best_category.
-        self._score_table = [[0] * self._n_cat for _ in range(len(self._dice_states))]
-        for sid, dice in enumerate(self._dice_states):
-            for ci, cat in enumerate(self._categories):
-                self._score_table[sid][ci] = calculate_score(dice, cat)
+        # --- dice states, roll distributions and score table are rules-only,
+        # so they are built once per process and shared by every instance
+        static = _static_tables(rules)
+        self._dice_states = static["dice_states"]
+        self._state_to_id = static["state_to_id"]
+        self._roll_outcomes_by_k = static["roll_outcomes_by_k"]
+        self._first_roll = static["first_roll"]
+        self._score_table = static["score_table"]
+
+        # optional profiling.SolverProfiler; None keeps hooks to one attribute check
+        self._profiler = None
+
+        self._value_table = value_table
+        self._future_ev = self._get_future_ev if value_table is None else self._table_future_ev
 
     def intmask_to_listmask(self, reroll_mask_int):
         # bit i = 1 means reroll die i
-        return [1 if ((reroll_mask_int >> i) & 1) else 0 for i in range(5)]
+        return [1 if ((reroll_mask_int >> i) & 1) else 0 for i in range(self._n_dice)]
 
     @staticmethod
     def _merge_sorted(a, b):
@@ -105,41 +124,59 @@ class DynamicProgrammingBot:
         return m
 
     def _get_upper_total(self, score_sheet):
-        """Calculate current upper section total from score sheet (cap at 63)."""
+        """Calculate current upper section total from score sheet (cap at the bonus threshold, 63)."""
         total = 0
         for cat in self._upper_categories:
             if cat in score_sheet and score_sheet[cat] is not None:
                 total += score_sheet[cat]
-        return 63 if total >= 63 else total
+        return min(total, self._upper_cap)
 
     @lru_cache(maxsize=None)
     def _get_future_ev(self, avail_mask, upper_total, y_bonus_enabled):
         """
         EV of the rest of the game given available categories (bitmask),
-        assuming a fresh roll of 5 dice. upper_total capped to 63.
+        assuming a fresh roll of all dice. upper_total capped to 63.
         """
         if avail_mask == 0:
-            return 35.0 if upper_total >= 63 else 0.0
+            return float(self._rules.upper_bonus) if upper_total >= self._upper_cap else 0.0
+
+        prof = self._profiler
+        if prof is not None:
+            prof.count("expand._get_future_ev")
+            prof.enter_layer(avail_mask.bit_count())
 
         total_ev = 0.0
         for sid, prob in self._first_roll:
-            total_ev += prob * self._best_ev(sid, 2, avail_mask, upper_total, y_bonus_enabled)
+            total_ev += prob * self._best_ev(sid, self._n_rerolls, avail_mask, upper_total, y_bonus_enabled)
+
+        if prof is not None:
+            prof.exit_layer()
         return total_ev
 
+    def _table_future_ev(self, avail_mask, upper_total, y_bonus_enabled):
+        """_get_future_ev served from the precomputed value table."""
+        if self._profiler is not None:
+            self._profiler.count("table_lookups")
+        return float(self._value_table[avail_mask, upper_total, 1 if y_bonus_enabled else 0])
+
     @lru_cache(maxsize=None)
     def _best_category_value(self, state_id, avail_mask, upper_total, y_bonus_enabled):
         """
         max over legal available categories of (immediate score + yahtzee bonus (if any) + future EV),
         including Joker legality + overrides.
         """
-        dice = self._dice_states[state_id]  # sorted 5-tuple
+        dice = self._dice_states[state_id]  # sorted tuple
+        rules = self._rules
+
+        if self._profiler is not None:
+            self._profiler.count("expand._best_category_value")
 
         # --- Joker / Yahtzee bonus detection
-        is_yahtzee_roll = (dice[0] == dice[4])
+        is_yahtzee_roll = (dice[0] == dice[-1])
         yahtzee_open = bool(avail_mask & (1 << self._idx_yahtzee)) if self._idx_yahtzee is not None else False
         apply_joker = is_yahtzee_roll and (not yahtzee_open) and y_bonus_enabled
 
-        immediate_bonus = 100.0 if apply_joker else 0.0
+        immediate_bonus = float(rules.yahtzee_bonus) if apply_joker else 0.0
 
         # If Joker applies and the corresponding upper slot is open, you MUST use it.
         forced_upper = None
@@ -172,28 +209,31 @@ class DynamicProgrammingBot:
             # joker scoring overrides (only when forced upper is NOT open)
             if apply_joker and forced_upper is None:
                 if ci == self._idx_fullhouse:
-                    score = 25
+                    score = rules.fullhouse_score
                 elif ci == self._idx_smstraight:
-                    score = 30
+                    score = rules.smstraight_score
                 elif ci == self._idx_lgstraight:
-                    score = 40
+                    score = rules.lgstraight_score
 
             # update upper total
             new_upper_total = upper_total
             if self._upper_mask & (1 << ci):
                 s = upper_total + score
-                new_upper_total = 63 if s >= 63 else s
+                new_upper_total = self._upper_cap if s >= self._upper_cap else s
 
             new_avail = avail_mask & ~(1 << ci)
 
             # enable future yahtzee bonuses iff we scored Yahtzee category with 50
             new_y_bonus = y_bonus_enabled
-            if ci == self._idx_yahtzee and score == 50:
+            if ci == self._idx_yahtzee and score == rules.yahtzee_score:
                 new_y_bonus = True
 
-            future_val = self._get_future_ev(new_avail, new_upper_total, new_y_bonus)
+            future_val = self._future_ev(new_avail, new_upper_total, new_y_bonus)
             total_val = immediate_bonus + score + future_val
 
+            if self._profiler is not None:
+                self._profiler.count("category_evals")
+
             if total_val > best:
                 best = total_val
 
@@ -207,13 +247,17 @@ class DynamicProgrammingBot:
         if r_left == 0:
             return self._best_category_value(state_id, avail_mask, upper_total, y_bonus_enabled)
 
+        if self._profiler is not None:
+            self._profiler.count("expand._best_ev")
+
         # Option: stop early and score now (equivalent to rerolling 0 dice)
         best = self._best_category_value(state_id, avail_mask, upper_total, y_bonus_enabled)
 
         dice = self._dice_states[state_id]
-        for m in range(1, 32):
+        n = self._n_dice
+        for m in range(1, 1 << n):
             k = m.bit_count()
-            kept = tuple(dice[i] for i in range(5) if not ((m >> i) & 1))
+            kept = tuple(dice[i] for i in range(n) if not ((m >> i) & 1))
             v = self._ev_after_reroll(kept, k, r_left, avail_mask, upper_total, y_bonus_enabled)
             if v > best:
                 best = v
@@ -226,8 +270,13 @@ class DynamicProgrammingBot:
         Expected value if we reroll k dice (consuming 1 reroll), keeping 'kept' (sorted tuple).
         Distribution is over unique multisets of k dice with multinomial probabilities.
         """
+        outcomes = self._roll_outcomes_by_k[k]
+        if self._profiler is not None:
+            self._profiler.count("expand._ev_after_reroll")
+            self._profiler.count("transition_evals", len(outcomes))
+
         total = 0.0
-        for outcome, prob in self._roll_outcomes_by_k[k]:
+        for outcome, prob in outcomes:
             new_dice = self._merge_sorted(kept, outcome)
             new_sid = self._state_to_id[new_dice]
             total += prob * self._best_ev(new_sid, r_left - 1, avail_mask, upper_total, y_bonus_enabled)
@@ -240,37 +289,26 @@ class DynamicProgrammingBot:
         state_id = self._state_to_id[dice_t]
         avail_mask = self._make_avail_mask(score_sheet)
         upper_total = self._get_upper_total(score_sheet)
-        y_bonus_enabled = (score_sheet.get("yahtzee") == 50)
+        y_bonus_enabled = (score_sheet.get("yahtzee") == self._rules.yahtzee_score)
 
         if rolls_left == 0:
             return 0
 
-        best_mask = 0
-        best_val = float("-inf")
-
-        if debug:
-            print(f"    [bot] evaluating 32 masks for dice={list(dice_t)} rolls_left={rolls_left}", flush=True)
+        prof = self._profiler
+        if debug and prof is None:
+            prof = debug_profiler()
 
         t_start = time.perf_counter()
-        for m in range(32):
-            if debug and (m % 4 == 0):
-                elapsed = time.perf_counter() - t_start
-                print(f"    [bot] mask {m:2d}/31 (elapsed {elapsed:.2f}s) best={best_val:.3f}", flush=True)
-
-            if m == 0:
-                v = self._best_category_value(state_id, avail_mask, upper_total, y_bonus_enabled)
-            else:
-                k = m.bit_count()
-                kept = tuple(dice_t[i] for i in range(5) if not ((m >> i) & 1))
-                v = self._ev_after_reroll(kept, k, rolls_left, avail_mask, upper_total, y_bonus_enabled)
-
-            if v > best_val:
-                best_val = v
-                best_mask = m
+        widget = self._turn_widget(avail_mask, upper_total, y_bonus_enabled)
+        r = min(rolls_left, self._n_rerolls)
+        best_mask = int(widget.masks[r - 1][state_id])
 
-        if debug:
-            elapsed = time.perf_counter() - t_start
-            print(f"    [bot] done in {elapsed:.2f}s best_mask={best_mask:05b} ev={best_val:.3f}", flush=True)
+        if prof is not None:
+            prof.decision(
+                "choose_best_keep", time.perf_counter() - t_start,
+                dice=list(dice_t), rolls_left=rolls_left, n_open=avail_mask.bit_count(),
+                best_mask=f"{best_mask:0{self._n_dice}b}", ev=float(widget.ev[r][state_id]),
+            )
 
         return best_mask
 
@@ -279,32 +317,29 @@ class DynamicProgrammingBot:
         state_id = self._state_to_id[dice_t]
         avail_mask = self._make_avail_mask(score_sheet)
         upper_total = self._get_upper_total(score_sheet)
-        y_bonus_enabled = (score_sheet.get("yahtzee") == 50)
+        y_bonus_enabled = (score_sheet.get("yahtzee") == self._rules.yahtzee_score)
 
+        widget = self._turn_widget(avail_mask, upper_total, y_bonus_enabled)
         if rolls_left == 0 or reroll_mask == 0:
-            return self._best_category_value(state_id, avail_mask, upper_total, y_bonus_enabled)
+            return float(widget.ev[0][state_id])
+        r = min(rolls_left, self._n_rerolls)
+        return float(widget.keep_ev[r - 1][widget.keep_by_mask[state_id, reroll_mask]])
 
-        k = reroll_mask.bit_count()
-        kept = tuple(dice_t[i] for i in range(5) if not ((reroll_mask >> i) & 1))
-        return self._ev_after_reroll(kept, k, rolls_left, avail_mask, upper_total, y_bonus_enabled)
-
-    def choose_best_category(self, dice, score_sheet):
-        dice_t = tuple(sorted(dice))
-        state_id = self._state_to_id[dice_t]
-        avail_mask = self._make_avail_mask(score_sheet)
-        upper_total = self._get_upper_total(score_sheet)
-        y_bonus_enabled = (score_sheet.get("yahtzee") == 50)
+    def _best_category(self, state_id, avail_mask, upper_total, y_bonus_enabled):
+        """(best category, its value) for one dice state; same rules as _best_category_value."""
+        dice = self._dice_states[state_id]
+        rules = self._rules
 
         # --- Joker / Yahtzee bonus detection
-        is_yahtzee_roll = (dice_t[0] == dice_t[4])
+        is_yahtzee_roll = (dice[0] == dice[-1])
         yahtzee_open = bool(avail_mask & (1 << self._idx_yahtzee)) if self._idx_yahtzee is not None else False
         apply_joker = is_yahtzee_roll and (not yahtzee_open) and y_bonus_enabled
 
-        immediate_bonus = 100.0 if apply_joker else 0.0
+        immediate_bonus = float(rules.yahtzee_bonus) if apply_joker else 0.0
 
         forced_upper = None
         if apply_joker:
-            upper_idx = self._upper_idx_by_face[dice_t[0]]
+            upper_idx = self._upper_idx_by_face[dice[0]]
             if avail_mask & (1 << upper_idx):
                 forced_upper = upper_idx
 
@@ -330,34 +365,99 @@ class DynamicProgrammingBot:
             # Joker scoring overrides (only when not forced into upper)
             if apply_joker and forced_upper is None:
                 if ci == self._idx_fullhouse:
-                    s = 25
+                    s = rules.fullhouse_score
                 elif ci == self._idx_smstraight:
-                    s = 30
+                    s = rules.smstraight_score
                 elif ci == self._idx_lgstraight:
-                    s = 40
+                    s = rules.lgstraight_score
 
             new_upper_total = upper_total
             if self._upper_mask & (1 << ci):
                 t = upper_total + s
-                new_upper_total = 63 if t >= 63 else t
+                new_upper_total = self._upper_cap if t >= self._upper_cap else t
 
             new_avail = avail_mask & ~(1 << ci)
 
             new_y_bonus = y_bonus_enabled
-            if ci == self._idx_yahtzee and s == 50:
+            if ci == self._idx_yahtzee and s == rules.yahtzee_score:
                 new_y_bonus = True
 
-            f_ev = self._get_future_ev(new_avail, new_upper_total, new_y_bonus)
+            f_ev = self._future_ev(new_avail, new_upper_total, new_y_bonus)
             total_val = immediate_bonus + s + f_ev
 
             if total_val > best_total_val:
                 best_total_val = total_val
                 best_cat = self._categories[ci]
 
+        return best_cat, best_total_val
+
+    @lru_cache(maxsize=WIDGET_CACHE_SIZE)
+    def _turn_widget(self, avail_mask, upper_total, y_bonus_enabled):
+        """
+        The whole turn solved at once for a turn-start state: EV and best action
+        for every dice state and rolls_left (see tables.solve_rerolls). The first
+        decision of a turn pays for it; the rest of the turn are lookups.
+        """
+        if self._profiler is not None:
+            self._profiler.count("expand._turn_widget")
+
+        best = [self._best_category(sid, avail_mask, upper_total, y_bonus_enabled)
+                for sid in range(len(self._dice_states))]
+        tables = get_static_tables(self._rules)
+        ev, keep_ev, masks = solve_rerolls(tables, np.array([v for _, v in best]))
+        return TurnWidget(ev, keep_ev, masks, [c for c, _ in best], tables.keep_by_mask)
+
+    def _sheet_widget(self, score_sheet):
+        """Turn widget for the turn-start state of this sheet (as GreedyBot._sheet_widget)."""
+        return self._turn_widget(
+            self._make_avail_mask(score_sheet),
+            self._get_upper_total(score_sheet),
+            score_sheet.get("yahtzee") == self._rules.yahtzee_score,
+        )
+
+    def choose_best_category(self, dice, score_sheet):
+        t_start = time.perf_counter()
+        dice_t = tuple(sorted(dice))
+        state_id = self._state_to_id[dice_t]
+        avail_mask = self._make_avail_mask(score_sheet)
+        upper_total = self._get_upper_total(score_sheet)
+        y_bonus_enabled = (score_sheet.get("yahtzee") == self._rules.yahtzee_score)
+
+        widget = self._turn_widget(avail_mask, upper_total, y_bonus_enabled)
+        best_cat = widget.category[state_id]
+
+        if self._profiler is not None:
+            self._profiler.decision(
+                "choose_best_category", time.perf_counter() - t_start,
+                dice=list(dice_t), rolls_left=0, n_open=avail_mask.bit_count(),
+                category=best_cat, ev=float(widget.ev[0][state_id]),
+            )
+
         return best_cat
 
+    # --- Instrumentation
+
+    def set_profiler(self, profiler):
+        """Attach a profiling.SolverProfiler (or None to detach)."""
+        if self._profiler is not None:
+            self._profiler.detach()
+        self._profiler = profiler
+        if profiler is not None:
+            profiler.attach(self)
+
+    def cache_info(self):
+        # NOTE: lru_cache on methods is shared by all instances of the class
+        return {
+            "_get_future_ev": self._get_future_ev.cache_info(),
+            "_best_category_value": self._best_category_value.cache_info(),
+            "_best_ev": self._best_ev.cache_info(),
+            "_ev_after_reroll": self._ev_after_reroll.cache_info(),
+            "_turn_widget": self._turn_widget.cache_info(),
+        }
+
     def reset_cache(self):
         self._get_future_ev.cache_clear()
         self._best_category_value.cache_clear()
         self._best_ev.cache_clear()
         self._ev_after_reroll.cache_clear()
+        self._turn_widget.cache_clear()
@@ -0,0 +1,651 @@
+"""
+Parallel evaluation harness.
+
+Plays (state, bot) jobs across a process pool. Every state gets its own seeded
+NumPy stream, so each bot sees exactly the same starting sheet and the same
+dice (common random numbers), no matter which worker plays it or in what order.
+Result rows are streamed to CSV or Parquet as jobs finish.
+
+    python evaluate.py --bots greedy dp ml --mode small --n-states 10000 --workers 8 --out results.csv
+    python evaluate.py --bots greedy ml --mode full --n-states 100000 --out results.parquet
+
+House rules (rules.py) apply to full games with the greedy and dp bots:
+
+    python evaluate.py --bots greedy dp --mode full --dice 6 --rerolls 3 --n-states 1000
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from yahtzee_game import CATEGORIES
+from utils import calculate_score
+from rules import (
+    STANDARD_RULES, UPPER_NAMES, categories as rules_categories, upper_categories, score,
+    add_rules_arguments, rules_from_args,
+)
+
+#-----------------------------
+# CONSTANTS
+#-----------------------------
+
+CATS = list(CATEGORIES)
+
+UPPER_CATS = ("aces", "twos", "threes", "fours", "fives", "sixes")
+LOWER_CATS = tuple(c for c in CATS if c not in UPPER_CATS)
+
+NUMERIC_SCORES = {
+    "aces": 1, "twos": 2, "threes": 3, "fours": 4, "fives": 5, "sixes": 6
+}
+UPPER_BY_FACE = {1: "aces", 2: "twos", 3: "threes", 4: "fours", 5: "fives", 6: "sixes"}
+
+RESULT_FIELDS = [
+    "game_id", "open_k", "bot", "total", "yahtzee_bonus_count",
+    "upper", "upper_bonus", "lower", "runtime_s", "yahtzee_enabled_start",
+]
+
+#-----------------------------
+# SCORING
+#-----------------------------
+
+def is_yahtzee_roll(dice_sorted):
+    return len(set(dice_sorted)) == 1
+
+
+def _upper_cats(rules):
+    return UPPER_CATS if rules == STANDARD_RULES else tuple(upper_categories(rules))
+
+
+def _base_score(dice_sorted, choice, rules):
+    if rules == STANDARD_RULES:
+        return calculate_score(dice_sorted, choice)
+    return score(dice_sorted, choice, rules)
+
+
+def upper_sum(score_sheet, rules=STANDARD_RULES):
+    return sum(score_sheet[c] for c in _upper_cats(rules))
+
+
+def upper_bonus(score_sheet, rules=STANDARD_RULES):
+    return rules.upper_bonus if upper_sum(score_sheet, rules) >= rules.upper_bonus_threshold else 0
+
+
+def lower_sum(score_sheet):
+    return sum(score_sheet[c] for c in LOWER_CATS)
+
+
+def final_total(score_sheet, yahtzee_bonus_count, rules=STANDARD_RULES):
+    return (upper_sum(score_sheet, rules) + upper_bonus(score_sheet, rules) + lower_sum(score_sheet)
+            + rules.yahtzee_bonus * yahtzee_bonus_count)
+
+
+def score_category_with_joker(dice_sorted, choice, score_sheet, rules=STANDARD_RULES):
+    """
+    Returns (category_points, bonus100_awarded_this_turn); the bonus is
+    rules.yahtzee_bonus (100) when awarded, else 0.
+
+    Assumes utils.calculate_score is STANDARD scoring (no 'yahtzee counts as straight/fullhouse').
+    """
+    joker_active = is_yahtzee_roll(dice_sorted) and (score_sheet.get("yahtzee") == rules.yahtzee_score)
+
+    bonus100 = rules.yahtzee_bonus if joker_active else 0
+
+    if not joker_active:
+        return _base_score(dice_sorted, choice, rules), bonus100
+
+    face = dice_sorted[0]
+    forced_upper = UPPER_NAMES[face - 1]
+    upper_open = (score_sheet.get(forced_upper) is None)
+
+    lower_open_exists = any(score_sheet.get(c) is None for c in LOWER_CATS)
+
+    # legality enforcement / correction (bots should already obey; this prevents crashes)
+    if upper_open and choice != forced_upper:
+        choice = forced_upper
+
+    if (not upper_open) and lower_open_exists and (choice in _upper_cats(rules)):
+        for c in LOWER_CATS:
+            if score_sheet.get(c) is None:
+                choice = c
+                break
+
+    # scoring overrides when NOT forced into the corresponding upper
+    if not upper_open:
+        if choice == "fullhouse":
+            return rules.fullhouse_score, bonus100
+        if choice == "smstraight":
+            return rules.smstraight_score, bonus100
+        if choice == "lgstraight":
+            return rules.lgstraight_score, bonus100
+
+    return _base_score(dice_sorted, choice, rules), bonus100
+
+#-----------------------------
+# RANDOM STREAMS
+#-----------------------------
+
+def state_rng(base_seed, game_id):
+    """Independent, reproducible stream for one evaluation state."""
+    return np.random.default_rng(np.random.SeedSequence([base_seed, game_id]))
+
+
+def make_roll_table(rng, n_turns, rules=STANDARD_RULES):
+    """
+    For each remaining turn, pre-generate an array of shape (n_turns, 3, 5):
+      [t, 0]: initial roll
+      [t, 1]: values used when rerolling dice positions on reroll #1
+      [t, 2]: values used when rerolling dice positions on reroll #2
+    (n_turns, n_rerolls + 1, n_dice) under other rules.
+    """
+    return rng.integers(1, rules.n_faces + 1, size=(n_turns, rules.n_rerolls + 1, rules.n_dice))
+
+
+def apply_reroll_by_mask(dice_sorted, mask_int, roll_values_5):
+    """
+    dice_sorted: list length 5, assumed sorted
+    mask_int: bit i=1 reroll that position i (in the CURRENT sorted dice)
+    roll_values_5: length 5, new values for each position if rerolled
+    (any number of dice works the same way)
+    """
+    dice = list(dice_sorted)
+    for i in range(len(dice)):
+        if (mask_int >> i) & 1:
+            dice[i] = int(roll_values_5[i])
+    dice.sort()
+    return dice
+
+
+def random_small_state(rng, min_open=1, max_open=5):
+    """
+    Returns a plausible-ish score_sheet dict with k open categories (None),
+    and all others filled with plausible values.
+    """
+    k = int(rng.integers(min_open, max_open + 1))
+    open_cats = set(rng.choice(CATS, size=k, replace=False).tolist())
+
+    sheet = {}
+    for c in CATS:
+        if c in open_cats:
+            sheet[c] = None
+            continue
+
+        if c in NUMERIC_SCORES:
+            face = NUMERIC_SCORES[c]
+            sheet[c] = face * int(rng.integers(0, 6))
+        elif c in ("threekind", "fourkind", "chance"):
+            sheet[c] = int(rng.integers(0, 31))
+        elif c == "fullhouse":
+            sheet[c] = 25 if rng.random() < 0.25 else 0
+        elif c == "smstraight":
+            sheet[c] = 30 if rng.random() < 0.25 else 0
+        elif c == "lgstraight":
+            sheet[c] = 40 if rng.random() < 0.20 else 0
+        elif c == "yahtzee":
+            sheet[c] = 50 if rng.random() < 0.15 else 0
+        else:
+            sheet[c] = 0
+
+    return sheet
+
+
+def make_state(base_seed, game_id, mode, min_open=1, max_open=5, rules=STANDARD_RULES):
+    """
+    Starting sheet + roll table for one evaluation state.
+    Identical for every bot and every worker given (base_seed, game_id).
+    Small (random late-game) states are only generated for the standard rules.
+    """
+    rng = state_rng(base_seed, game_id)
+    if mode == "full":
+        start_sheet = {c: None for c in rules_categories(rules)}
+    elif rules != STANDARD_RULES:
+        raise ValueError("small mode needs the standard rules; use mode='full'")
+    else:
+        start_sheet = random_small_state(rng, min_open=min_open, max_open=max_open)
+    open_count = sum(v is None for v in start_sheet.values())
+    return start_sheet, make_roll_table(rng, open_count, rules)
+
+#-----------------------------
+# GAME PLAY
+#-----------------------------
+
+def play_small_game(bot, start_sheet, roll_table, turn_log=None, rules=STANDARD_RULES):
+    """
+    Plays exactly len(open categories) turns, using the pre-generated roll_table
+    (make_roll_table with the same rules).
+    Returns: (total_score, yahtzee_bonus_count, final_sheet)
+
+    If turn_log is a list, one record per turn is appended:
+      {"rolls": [dice after each roll], "masks": [keep masks], "category": str}
+    masks[i] is the decision taken on rolls[i]; a 0 mask ends the rerolls.
+    """
+    sheet = dict(start_sheet)
+    yahtzee_bonus_count = 0
+
+    open_count = sum(v is None for v in sheet.values())
+    assert open_count == len(roll_table), "roll_table length must match number of open categories"
+
+    for turn_i in range(open_count):
+        roll0, *reroll_values = roll_table[turn_i]
+
+        dice = sorted(int(v) for v in roll0)
+        rolls = [dice]
+        masks = []
+
+        # two rerolls max (rules.n_rerolls), rolls_left passed as 2 then 1
+        for rolls_left, roll_vals in zip(range(len(reroll_values), 0, -1), reroll_values):
+            mask = bot.choose_best_keep(dice, rolls_left, sheet)
+            masks.append(mask)
+            if mask == 0:
+                break
+            dice = apply_reroll_by_mask(dice, mask, roll_vals)
+            rolls.append(dice)
+
+        choice = bot.choose_best_category(dice, sheet)
+
+        # safety: if bot returns None, pick any open category
+        if choice is None or sheet.get(choice) is not None:
+            for c in sheet:
+                if sheet[c] is None:
+                    choice = c
+                    break
+
+        pts, bonus100 = score_category_with_joker(dice, choice, sheet, rules)
+        if bonus100:
+            yahtzee_bonus_count += 1
+
+        # store only category points in the sheet (bonus tracked separately)
+        sheet[choice] = pts
+
+        if turn_log is not None:
+            turn_log.append({"rolls": rolls, "masks": masks, "category": choice})
+
+    return final_total(sheet, yahtzee_bonus_count, rules), yahtzee_bonus_count, sheet
+
+#-----------------------------
+# BOTS
+#-----------------------------
+
+def make_bot(name, ml_model_path=None, value_table=None, rules=STANDARD_RULES):
+    """
+    Build a bot by CLI name. Imports are local so workers only load what they play.
+    Only greedy, dp, lookahead-greedy and rollout play non-standard rules (a
+    value table must match them).
+    """
+    if name == "greedy":
+        from greedy import GreedyBot
+        return GreedyBot(rules=rules)
+    if name == "dp":
+        from dynamic_programming import DynamicProgrammingBot
+        return DynamicProgrammingBot(value_table=value_table, rules=rules)
+    if name == "lookahead-greedy":
+        from greedy import LookaheadGreedyBot
+        if value_table is None:
+            raise ValueError("lookahead-greedy needs a DP value table (--dp-table) to distill")
+        return LookaheadGreedyBot.from_value_table(value_table, rules)
+    if name == "rollout":
+        # the harness already runs one game per worker: rollouts stay in-process
+        from rollout_bot import RolloutBot
+        return RolloutBot(policy="greedy", workers=0, rules=rules)
+    if rules != STANDARD_RULES:
+        raise ValueError(f"{name} only plays the standard rules")
+    if name == "ml":
+        from ml import MLBot
+        return MLBot(model_path=ml_model_path)
+    if name == "frozen-greedy":
+        from frozen_bot import FrozenBot
+        return FrozenBot.greedy()
+    if name == "frozen-dp":
+        from frozen_bot import FrozenBot
+        if value_table is None:
+            raise ValueError("frozen-dp needs a DP value table (--dp-table)")
+        return FrozenBot(value_table)
+    raise ValueError(f"Unknown bot: {name}")
+
+
+BOT_NAMES = ("greedy", "dp", "ml", "frozen-greedy", "frozen-dp", "lookahead-greedy", "rollout")
+
+# Per-process bot instances, so caches survive across chunks in a worker
+_worker_bots = {}
+_worker_config = {}
+_worker_shared = {}
+
+
+def _init_worker(config):
+    _worker_config.clear()
+    _worker_config.update(config)
+    _worker_bots.clear()
+    _worker_shared.clear()
+    if config.get("shared_tables"):
+        from shared_tables import SharedTables
+        _worker_shared["tables"] = SharedTables.attach(config["shared_tables"],
+                                                      config.get("rules", STANDARD_RULES))
+
+
+def _get_worker_bot(name):
+    bot = _worker_bots.get(name)
+    if bot is None:
+        shared = _worker_shared.get("tables")
+        value_table = shared.value_table if shared is not None else None
+        bot = make_bot(name, _worker_config.get("ml_model_path"), value_table,
+                       _worker_config.get("rules", STANDARD_RULES))
+        _worker_bots[name] = bot
+    return bot
+
+
+def play_chunk(bot_name, game_ids):
+    """
+    Play one bot over a list of states. Runs inside a pool worker.
+    Returns (result rows, game logs); logs are empty unless config["log_games"].
+    """
+    cfg = _worker_config
+    rules = cfg.get("rules", STANDARD_RULES)
+    bot = _get_worker_bot(bot_name)
+
+    rows = []
+    logs = []
+    for game_id in game_ids:
+        start_sheet, roll_table = make_state(
+            cfg["base_seed"], game_id, cfg["mode"], cfg["min_open"], cfg["max_open"], rules
+        )
+        turn_log = [] if cfg.get("log_games") else None
+
+        start = time.perf_counter()
+        total, ybonus_ct, final_sheet = play_small_game(bot, start_sheet, roll_table, turn_log, rules)
+        dt = time.perf_counter() - start
+
+        if turn_log is not None:
+            logs.append({
+                "game_id": game_id,
+                "bot": bot_name,
+                "start_sheet": start_sheet,
+                "turns": turn_log,
+                "total": total,
+            })
+
+        rows.append({
+            "game_id": game_id,
+            "open_k": len(roll_table),
+            "bot": bot_name,
+            "total": total,
+            "yahtzee_bonus_count": ybonus_ct,
+            "upper": upper_sum(final_sheet, rules),
+            "upper_bonus": upper_bonus(final_sheet, rules),
+            "lower": lower_sum(final_sheet),
+            "runtime_s": dt,
+            "yahtzee_enabled_start": (start_sheet.get("yahtzee") == rules.yahtzee_score),
+        })
+
+    # Keep worker memory bounded over long runs; caches are keyed per sheet
+    # and rarely reused across random states.
+    if cfg.get("reset_cache", True):
+        bot.reset_cache()
+
+    return rows, logs
+
+#-----------------------------
+# OUTPUT
+#-----------------------------
+
+class ResultWriter:
+    """Streams result rows to .csv or .parquet (pyarrow) as they arrive."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fmt = "parquet" if path.endswith(".parquet") else "csv"
+        self._file = None
+        self._writer = None
+
+        if self._fmt == "csv":
+            self._file = open(path, "w", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS)
+            self._writer.writeheader()
+        else:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Parquet output requires pyarrow; use a .csv path instead") from e
+            self._pa = pa
+            self._pq = pq
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        if self._fmt == "csv":
+            self._writer.writerows(rows)
+            self._file.flush()
+            return
+
+        table = self._pa.Table.from_pylist(rows)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._fmt == "csv":
+            if self._file is not None:
+                self._file.close()
+        elif self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RunningSummary:
+    """Per-bot totals and paired (same game_id) differences, accumulated on the fly."""
+
+    def __init__(self, bot_names):
+        self.bot_names = list(bot_names)
+        self._stats = {b: [0, 0.0, 0.0] for b in self.bot_names}  # n, sum, sum_sq
+        self._pairs = {}
+        for i, a in enumerate(self.bot_names):
+            for b in self.bot_names[i + 1:]:
+                self._pairs[(a, b)] = [0, 0.0, 0.0]
+        self._pending = {}
+
+    def add(self, row):
+        bot, total = row["bot"], row["total"]
+        s = self._stats[bot]
+        s[0] += 1
+        s[1] += total
+        s[2] += total * total
+
+        game = self._pending.setdefault(row["game_id"], {})
+        game[bot] = total
+        if len(game) == len(self.bot_names):
+            del self._pending[row["game_id"]]
+            for (a, b), p in self._pairs.items():
+                d = game[a] - game[b]
+                p[0] += 1
+                p[1] += d
+                p[2] += d * d
+
+    @staticmethod
+    def _mean_ci(n, s, ss, z=1.96):
+        if n == 0:
+            return float("nan"), float("nan")
+        mean = s / n
+        if n < 2:
+            return mean, float("inf")
+        var = max(ss - n * mean * mean, 0.0) / (n - 1)
+        return mean, z * math.sqrt(var / n)
+
+    def report(self):
+        lines = ["bot         n        mean     +/-95%"]
+        for b in self.bot_names:
+            n, s, ss = self._stats[b]
+            mean, hw = self._mean_ci(n, s, ss)
+            lines.append(f"{b:<8} {n:>8} {mean:>10.2f} {hw:>10.2f}")
+        if self._pairs:
+            lines.append("")
+            lines.append("paired difference (common random numbers)")
+            for (a, b), (n, s, ss) in self._pairs.items():
+                mean, hw = self._mean_ci(n, s, ss)
+                lines.append(f"{a} - {b}: {mean:+.2f} +/- {hw:.2f} (n={n})")
+        return "\n".join(lines)
+
+#-----------------------------
+# DRIVER
+#-----------------------------
+
+def _chunks(n_states, chunk_size):
+    for start in range(0, n_states, chunk_size):
+        yield list(range(start, min(start + chunk_size, n_states)))
+
+
+def check_run_options(bot_names, mode, rules=STANDARD_RULES):
+    """Raise ValueError for a mode / bots / rules combination the harness cannot play."""
+    if mode not in ("small", "full"):
+        raise ValueError(f"Unknown mode: {mode}")
+    if rules != STANDARD_RULES:
+        if mode != "full":
+            raise ValueError("house rules need mode='full'")
+        unsupported = [b for b in bot_names if b not in ("greedy", "dp", "lookahead-greedy", "rollout")]
+        if unsupported:
+            raise ValueError(f"bots {unsupported} only play the standard rules")
+
+
+def run_evaluation(
+    bot_names,
+    n_states,
+    out_path,
+    mode="small",
+    base_seed=67,
+    workers=None,
+    chunk_size=50,
+    min_open=1,
+    max_open=5,
+    ml_model_path=None,
+    reset_cache=True,
+    progress=True,
+    log_games_path=None,
+    dp_table_path=None,
+    rules=STANDARD_RULES,
+):
+    """
+    Evaluate each bot on n_states states and stream rows to out_path.
+    If log_games_path is set, every game's turns are written there: JSON lines,
+    or compact binary records (game_record.py) when the path ends in .yzr.
+    If dp_table_path is set, the DP value table (tables.build_value_table) is
+    loaded once here and shared with all workers through shared memory.
+    rules (rules.Rules) other than the standard ones need mode="full" and the
+    greedy / dp bots.
+    Returns a RunningSummary.
+    """
+    check_run_options(bot_names, mode, rules)
+
+    config = {
+        "base_seed": base_seed,
+        "mode": mode,
+        "min_open": min_open,
+        "max_open": max_open,
+        "ml_model_path": ml_model_path,
+        "reset_cache": reset_cache,
+        "log_games": log_games_path is not None,
+        "rules": rules,
+    }
+    shared = None
+    if dp_table_path:
+        from shared_tables import SharedTables
+        from tables import load_value_table
+        shared = SharedTables.create(load_value_table(dp_table_path), rules=rules)
+        config["shared_tables"] = shared.descriptor
+
+    workers = workers or os.cpu_count() or 1
+    summary = RunningSummary(bot_names)
+
+    # Interleave bots per chunk so the paired summary fills in as we go
+    jobs = [(b, ids) for ids in _chunks(n_states, chunk_size) for b in bot_names]
+
+    t0 = time.perf_counter()
+    done = 0
+    log_file = None
+    binary_log = bool(log_games_path) and log_games_path.endswith(".yzr")
+    try:
+        if binary_log:
+            from game_record import GameRecordWriter
+            log_file = GameRecordWriter(log_games_path, bot_names=bot_names)
+        elif log_games_path:
+            log_file = open(log_games_path, "w")
+        with ResultWriter(out_path) as writer, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(config,)
+        ) as pool:
+            futures = [pool.submit(play_chunk, b, ids) for b, ids in jobs]
+            for fut in as_completed(futures):
+                rows, logs = fut.result()
+                writer.write_rows(rows)
+                for row in rows:
+                    summary.add(row)
+                if binary_log:
+                    for game in logs:
+                        log_file.write(game)
+                elif log_file is not None:
+                    for game in logs:
+                        log_file.write(json.dumps(game) + "\n")
+                done += 1
+                if progress:
+                    elapsed = time.perf_counter() - t0
+                    print(f"  chunk {done}/{len(jobs)} (elapsed {elapsed:.1f}s)", flush=True)
+    finally:
+        if log_file is not None:
+            log_file.close()
+        if shared is not None:
+            shared.close()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate Yahtzee bots with common random numbers.")
+    parser.add_argument("--bots", nargs="+", default=["greedy", "ml"], choices=BOT_NAMES)
+    parser.add_argument("--mode", default="small", choices=("small", "full"),
+                        help="small: random late-game states, full: 13-turn games")
+    parser.add_argument("--n-states", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=67)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--min-open", type=int, default=1)
+    parser.add_argument("--max-open", type=int, default=5)
+    parser.add_argument("--ml-model", default=None)
+    parser.add_argument("--dp-table", default=None,
+                        help="DP value table (.npy from tables.py) shared with all workers")
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="do not clear bot caches between chunks")
+    parser.add_argument("--out", default="results.csv", help=".csv or .parquet")
+    parser.add_argument("--log-games", default=None,
+                        help="also write every game's turns as JSON lines, or binary records if "
+                             "the path ends in .yzr (for regret.py)")
+    parser.add_argument("--quiet", action="store_true")
+    add_rules_arguments(parser)
+    args = parser.parse_args(argv)
+
+    summary = run_evaluation(
+        args.bots,
+        args.n_states,
+        args.out,
+        mode=args.mode,
+        base_seed=args.seed,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        min_open=args.min_open,
+        max_open=args.max_open,
+        ml_model_path=args.ml_model,
+        reset_cache=not args.keep_cache,
+        progress=not args.quiet,
+        log_games_path=args.log_games,
+        dp_table_path=args.dp_table,
+        rules=rules_from_args(args),
+    )
+    print(summary.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Frozen, thread-safe bot served from precomputed NumPy arrays.
+
+FrozenBot holds only read-only arrays: the game-value table and the static
+transition/score tables. Every decision solves the current turn widget with
+tables.solve_widgets, using local arrays only. There are no lru caches and
+no per-call state on the instance, so one FrozenBot can be shared by any
+number of threads, or asyncio tasks in a thread executor. The heavy lifting
+is in NumPy matmuls and ufuncs, which release the GIL.
+
+    bot = FrozenBot(load_value_table("yahtzee_value_table.npy"))   # DP policy
+    bot = FrozenBot.greedy()                                        # GreedyBot policy
+
+    with ThreadPoolExecutor(8) as pool:
+        masks = list(pool.map(lambda q: bot.choose_best_keep(*q), queries))
+"""
+import numpy as np
+
+from rules import upper_categories
+from tables import get_static_tables, solve_widgets
+
+
+class FrozenBot:
+    __slots__ = ("_tables", "_value_table", "_upper_idxs", "_frozen")
+
+    def __init__(self, value_table, tables=None):
+        """
+        value_table: V[avail_mask, upper_total, y_bonus] (e.g. tables.build_value_table,
+        or a shared_tables.SharedTables view). Writable arrays are copied read-only.
+        """
+        tables = tables or get_static_tables()
+        value_table = np.asarray(value_table)
+        if value_table.flags.writeable:
+            value_table = value_table.copy()
+            value_table.setflags(write=False)
+
+        object.__setattr__(self, "_tables", tables)
+        object.__setattr__(self, "_value_table", value_table)
+        object.__setattr__(self, "_upper_idxs", tuple(
+            tables.cat_to_idx[c] for c in upper_categories(tables.rules)
+        ))
+        object.__setattr__(self, "_frozen", True)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenBot is immutable")
+
+    @classmethod
+    def greedy(cls):
+        """Same policy as GreedyBot: best EV of this turn only (no future value, no upper bonus)."""
+        tables = get_static_tables()
+        zeros = np.zeros((1 << tables.n_cat, tables.upper_cap + 1, 2))
+        return cls(zeros, tables)
+
+    # --- state helpers (pure functions of the arguments)
+
+    def turn_state(self, score_sheet):
+        """(avail_mask, upper_total capped at 63, y_bonus) of a score sheet."""
+        avail_mask = 0
+        for i, cat in enumerate(self._tables.categories):
+            if score_sheet[cat] is None:
+                avail_mask |= (1 << i)
+        upper_total = 0
+        for ci in self._upper_idxs:
+            v = score_sheet[self._tables.categories[ci]]
+            if v is not None:
+                upper_total += v
+        y_bonus = score_sheet.get("yahtzee") == self._tables.rules.yahtzee_score
+        return avail_mask, min(self._tables.upper_cap, upper_total), y_bonus
+
+    def solve_turn(self, avail_mask, upper_total, y_bonus):
+        """(ev, policy) of one turn widget; see tables.solve_widgets (B = 1)."""
+        ev, policy = solve_widgets(
+            self._tables, self._value_table, [avail_mask], [upper_total], [int(y_bonus)],
+            return_policy=True,
+        )
+        return ev[:, 0, :], {k: v[0] for k, v in policy.items()}
+
+    def solve_turns(self, states, batch_size=256):
+        """
+        Widgets for many distinct turn-start states, solved in batches.
+        Returns (ev, policy) with the state axis in the order of `states`.
+        """
+        evs, parts = [], []
+        for start in range(0, len(states), batch_size):
+            chunk = states[start:start + batch_size]
+            ev, p = solve_widgets(
+                self._tables, self._value_table,
+                [s[0] for s in chunk], [s[1] for s in chunk], [int(s[2]) for s in chunk],
+                return_policy=True,
+            )
+            evs.append(ev)
+            parts.append(p)
+        if not parts:
+            return None, {}
+        return np.concatenate(evs, axis=1), {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+    @property
+    def tables(self):
+        return self._tables
+
+    def intmask_to_listmask(self, reroll_mask_int):
+        # bit i = 1 means reroll die i
+        return [1 if ((reroll_mask_int >> i) & 1) else 0 for i in range(self._tables.n_dice)]
+
+    # --- Public API (same as the other bots)
+
+    def choose_best_keep(self, dice, rolls_left, score_sheet, debug=False):
+        if rolls_left == 0:
+            return 0
+        sid = self._tables.state_to_id[tuple(sorted(dice))]
+        _, policy = self.solve_turn(*self.turn_state(score_sheet))
+        return int(policy[f"keep{min(rolls_left, self._tables.n_rerolls)}"][sid])
+
+    def choose_best_category(self, dice, score_sheet):
+        sid = self._tables.state_to_id[tuple(sorted(dice))]
+        _, policy = self.solve_turn(*self.turn_state(score_sheet))
+        return self._tables.categories[int(policy["category"][sid])]
+
+    def expected_turn_value(self, dice, reroll_mask, rolls_left, score_sheet):
+        """EV of applying reroll_mask now and playing on optimally (includes future turns)."""
+        t = self._tables
+        sid = t.state_to_id[tuple(sorted(dice))]
+        ev, _ = self.solve_turn(*self.turn_state(score_sheet))
+        if rolls_left == 0 or reroll_mask == 0:
+            return float(ev[0][sid])
+        keep = t.keep_by_mask[sid, reroll_mask]
+        return float(t.keep_transition[keep] @ ev[rolls_left - 1])
+
+    def decide_batch(self, queries, batch_size=256):
+        """
+        Decisions for many (dice, rolls_left, score_sheet) queries; one widget
+        solve per distinct turn-start state (used by policy_eval).
+        """
+        t = self._tables
+        states = [self.turn_state(sheet) for _, _, sheet in queries]
+        uniq = sorted(set(states))
+        _, policy = self.solve_turns(uniq, batch_size)
+        row = {s: i for i, s in enumerate(uniq)}
+
+        out = []
+        for (dice, rolls_left, _), state in zip(queries, states):
+            b = row[state]
+            sid = t.state_to_id[tuple(sorted(dice))]
+            if rolls_left == 0:
+                out.append(t.categories[int(policy["category"][b, sid])])
+            else:
+                key = f"keep{min(rolls_left, t.n_rerolls)}"
+                out.append(int(policy[key][b, sid]))
+        return out
+
+    def cache_info(self):
+        return {}
+
+    def reset_cache(self):
+        pass
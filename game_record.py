@@ -0,0 +1,317 @@
+"""
+Compact binary game records.
+
+A file is a fixed-size header (HEADER_SIZE bytes: magic, version, record
+size and a table of up to MAX_BOTS bot names) followed by fixed-size game
+records (99 bytes), so it can be streamed in chunks or mapped straight into a
+NumPy structured array for bulk analytics.
+
+Each turn packs into 6 bytes:
+
+    roll0  dice state id (0..251, tables.StaticTables.dice_states) of the first roll
+    mask1  reroll mask chosen on roll0 (bit i = reroll die i of the sorted dice, 0 = stop)
+    roll1  dice state id after reroll 1 (== roll0 when mask1 == 0)
+    mask2  reroll mask chosen on roll1 (0 = stop; 0 when mask1 == 0)
+    roll2  dice state id after reroll 2 (== roll1 when mask2 == 0)
+    cat    bits 0-3 category index, bit 4 set when a +100 Yahtzee bonus was paid
+
+The dice that were actually rolled are the multiset difference between
+consecutive states, so a record replays the game exactly.
+
+A game record also stores the game_id, the bot (index into the header's
+name table, 255 = unknown), the starting sheet (255 = open) and the final
+total, so late-game states from evaluate.py round-trip as well.
+
+    with GameRecordWriter("games.yzr", bot_names=["greedy", "dp"]) as w:
+        w.write(logged_game)
+    for game in iter_games("games.yzr"):
+        ...
+    arr = read_array("games.yzr")       # np.memmap of GAME_DTYPE
+    names = read_bot_names("games.yzr")  # arr["bot"] indexes this list
+"""
+import numpy as np
+
+from tables import get_static_tables
+from yahtzee_game import YahtzeeGame
+from evaluate import CATS, score_category_with_joker, final_total
+
+MAGIC = b"YZGR"
+VERSION = 2
+MAX_BOTS = 32
+BOT_NAME_SIZE = 32            # bytes per name, UTF-8, NUL-padded
+HEADER_SIZE = 16 + MAX_BOTS * BOT_NAME_SIZE
+OPEN = 255
+NO_BOT = 255
+BONUS_FLAG = 0x10
+MAX_TURNS = len(CATS)
+
+TURN_DTYPE = np.dtype([
+    ("roll0", "u1"), ("mask1", "u1"), ("roll1", "u1"),
+    ("mask2", "u1"), ("roll2", "u1"), ("cat", "u1"),
+])
+
+GAME_DTYPE = np.dtype([
+    ("game_id", "<u4"),
+    ("bot", "u1"),
+    ("n_turns", "u1"),
+    ("total", "<u2"),
+    ("start", "u1", (len(CATS),)),
+    ("turns", TURN_DTYPE, (MAX_TURNS,)),
+])
+
+
+def _header(bot_names=()):
+    head = MAGIC + np.array([VERSION, GAME_DTYPE.itemsize, len(bot_names)], dtype="<u2").tobytes()
+    head += b"\0" * (16 - len(head))
+    for name in bot_names:
+        head += name.encode().ljust(BOT_NAME_SIZE, b"\0")
+    return head + b"\0" * (HEADER_SIZE - len(head))
+
+
+def _check_header(head):
+    """Validate a header; returns its bot name table."""
+    if len(head) < HEADER_SIZE or head[:4] != MAGIC:
+        raise ValueError("not a game record file")
+    version, itemsize, n_bots = np.frombuffer(head[4:10], dtype="<u2")
+    if version != VERSION or itemsize != GAME_DTYPE.itemsize:
+        raise ValueError(f"unsupported game record version {version} (record size {itemsize})")
+    return [head[16 + i * BOT_NAME_SIZE:16 + (i + 1) * BOT_NAME_SIZE].rstrip(b"\0").decode()
+            for i in range(n_bots)]
+
+#-----------------------------
+# ENCODE / DECODE
+#-----------------------------
+
+def encode_game(game, out=None, bot_index=NO_BOT):
+    """
+    Pack a logged-game dict ({"game_id", "bot", "start_sheet", "turns",
+    "total"}, as written by evaluate.py --log-games) into one GAME_DTYPE
+    record. bot_index: the bot's position in the file's name table.
+    """
+    tables = get_static_tables()
+    rec = out if out is not None else np.zeros((), dtype=GAME_DTYPE)
+    rec["game_id"] = game.get("game_id", 0)
+    rec["bot"] = bot_index
+
+    start = game.get("start_sheet") or {c: None for c in CATS}
+    sheet = dict(start)
+    rec["start"] = [OPEN if start[c] is None else start[c] for c in CATS]
+
+    turns = game["turns"]
+    if len(turns) > MAX_TURNS:
+        raise ValueError(f"game has {len(turns)} turns (max {MAX_TURNS})")
+    rec["n_turns"] = len(turns)
+
+    for t, turn in enumerate(turns):
+        ids = [tables.state_to_id[tuple(sorted(r))] for r in turn["rolls"]]
+        masks = list(turn["masks"]) + [0, 0]
+        ids = ids + [ids[-1]] * (3 - len(ids))
+
+        final_dice = sorted(turn["rolls"][-1])
+        pts, bonus100 = score_category_with_joker(final_dice, turn["category"], sheet)
+        sheet[turn["category"]] = pts
+
+        cat = tables.cat_to_idx[turn["category"]] | (BONUS_FLAG if bonus100 else 0)
+        rec["turns"][t] = (ids[0], masks[0], ids[1], masks[1] if masks[0] else 0, ids[2], cat)
+
+    total = game.get("total")
+    if total is None:
+        total = record_total(rec)
+    rec["total"] = total
+    return rec
+
+
+def decode_game(rec, bot_names=()):
+    """
+    Inverse of encode_game: a logged-game dict usable by regret.py and
+    replay_game. bot_names: the file's name table (read_bot_names); "bot" is
+    None when the index is not in it.
+    """
+    tables = get_static_tables()
+    start = {c: (None if v == OPEN else int(v)) for c, v in zip(CATS, rec["start"])}
+
+    turns = []
+    for t in range(int(rec["n_turns"])):
+        roll0, mask1, roll1, mask2, roll2, cat = (int(x) for x in rec["turns"][t])
+        rolls = [list(tables.dice_states[roll0])]
+        masks = [mask1]
+        if mask1:
+            rolls.append(list(tables.dice_states[roll1]))
+            masks.append(mask2)
+            if mask2:
+                rolls.append(list(tables.dice_states[roll2]))
+        turns.append({"rolls": rolls, "masks": masks, "category": CATS[cat & 0x0F]})
+
+    bot = int(rec["bot"])
+    return {
+        "game_id": int(rec["game_id"]),
+        "bot": bot_names[bot] if bot < len(bot_names) else None,
+        "start_sheet": start,
+        "turns": turns,
+        "total": int(rec["total"]),
+    }
+
+
+def record_total(rec):
+    """Final total (with upper and Yahtzee bonuses) recomputed from a record."""
+    return decode_game_sheet(rec)[0]
+
+
+def decode_game_sheet(rec):
+    """(total, final_sheet, yahtzee_bonus_count) for one record, scored like evaluate.py."""
+    tables = get_static_tables()
+    sheet = {c: (None if v == OPEN else int(v)) for c, v in zip(CATS, rec["start"])}
+    bonus_count = 0
+    for t in range(int(rec["n_turns"])):
+        turn = rec["turns"][t]
+        cat = int(turn["cat"])
+        choice = CATS[cat & 0x0F]
+        dice = list(tables.dice_states[int(turn["roll2"])])
+        pts, _ = score_category_with_joker(dice, choice, sheet)
+        sheet[choice] = pts
+        if cat & BONUS_FLAG:
+            bonus_count += 1
+
+    total = final_total({c: v or 0 for c, v in sheet.items()}, bonus_count)
+    return total, sheet, bonus_count
+
+
+def replay_game(game):
+    """
+    Replay a logged-game dict (or a GAME_DTYPE record) on a YahtzeeGame.
+    Yields (turn_index, game) after each scored turn; `game.dice` holds the
+    final dice of that turn and `game.score_sheet` / `game.yahtzee_count`
+    the running state.
+    """
+    if isinstance(game, np.void):
+        game = decode_game(game)
+
+    g = YahtzeeGame()
+    start = game.get("start_sheet") or {}
+    for c, v in start.items():
+        g.score_sheet[c] = v
+
+    for t, turn in enumerate(game["turns"]):
+        g.dice = sorted(turn["rolls"][-1])
+        try:
+            g.score(turn["category"])
+        except ValueError:
+            # the harness corrects illegal Joker choices instead of rejecting them
+            pts, bonus100 = score_category_with_joker(g.dice, turn["category"], g.score_sheet)
+            g.score_sheet[turn["category"]] = pts
+            if bonus100:
+                g.yahtzee_count += 1
+        yield t, g
+
+#-----------------------------
+# STREAMING
+#-----------------------------
+
+class GameRecordWriter:
+    """
+    Appends encoded games to a record file, buffering `buffer_games` records
+    per write. Bots not in `bot_names` are added to the name table as they
+    appear (the header is rewritten on flush).
+    """
+
+    def __init__(self, path, buffer_games=4096, bot_names=()):
+        self.bot_names = []
+        self._bot_index = {}
+        for name in bot_names:
+            self._add_bot(name)
+        self._file = open(path, "wb")
+        self._file.write(_header(self.bot_names))
+        self._header_dirty = False
+        self._buf = np.zeros(buffer_games, dtype=GAME_DTYPE)
+        self._n = 0
+        self.games_written = 0
+
+    def _add_bot(self, name):
+        if len(name.encode()) > BOT_NAME_SIZE:
+            raise ValueError(f"bot name {name!r} is longer than {BOT_NAME_SIZE} bytes")
+        if len(self.bot_names) == MAX_BOTS:
+            raise ValueError(f"more than {MAX_BOTS} bots in one game record file")
+        self._bot_index[name] = len(self.bot_names)
+        self.bot_names.append(name)
+
+    def write(self, game):
+        bot = game.get("bot")
+        index = NO_BOT
+        if bot is not None:
+            if bot not in self._bot_index:
+                self._add_bot(bot)
+                self._header_dirty = True
+            index = self._bot_index[bot]
+        encode_game(game, out=self._buf[self._n:self._n + 1][0], bot_index=index)
+        self._n += 1
+        if self._n == len(self._buf):
+            self.flush()
+
+    def flush(self):
+        if self._n:
+            self._file.write(self._buf[:self._n].tobytes())
+            self.games_written += self._n
+            self._buf[:self._n] = 0
+            self._n = 0
+        if self._header_dirty:
+            end = self._file.tell()
+            self._file.seek(0)
+            self._file.write(_header(self.bot_names))
+            self._file.seek(end)
+            self._header_dirty = False
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_bot_names(path):
+    """The file's bot name table; GAME_DTYPE["bot"] indexes it."""
+    with open(path, "rb") as f:
+        return _check_header(f.read(HEADER_SIZE))
+
+
+def iter_record_chunks(path, chunk_games=65536):
+    """Yield GAME_DTYPE arrays of up to chunk_games records."""
+    with open(path, "rb") as f:
+        _check_header(f.read(HEADER_SIZE))
+        while True:
+            data = f.read(chunk_games * GAME_DTYPE.itemsize)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=GAME_DTYPE)
+
+
+def iter_games(path, chunk_games=65536):
+    """Yield decoded logged-game dicts."""
+    bot_names = read_bot_names(path)
+    for chunk in iter_record_chunks(path, chunk_games):
+        for rec in chunk:
+            yield decode_game(rec, bot_names)
+
+
+def read_array(path):
+    """Read-only memory-mapped GAME_DTYPE array over the whole file."""
+    with open(path, "rb") as f:
+        _check_header(f.read(HEADER_SIZE))
+    return np.memmap(path, dtype=GAME_DTYPE, mode="r", offset=HEADER_SIZE)
+
+
+def turn_categories(arr):
+    """(n_games, MAX_TURNS) category index per turn, -1 past n_turns."""
+    cats = (arr["turns"]["cat"] & 0x0F).astype(np.int8)
+    cats[np.arange(MAX_TURNS)[None, :] >= arr["n_turns"][:, None]] = -1
+    return cats
+
+
+def yahtzee_bonus_counts(arr):
+    """+100 bonuses paid per game."""
+    valid = np.arange(MAX_TURNS)[None, :] < arr["n_turns"][:, None]
+    return (((arr["turns"]["cat"] & BONUS_FLAG) != 0) & valid).sum(axis=1)
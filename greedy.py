@@ -1,15 +1,36 @@
-from yahtzee_game import YahtzeeGame
-from utils import calculate_score
 from itertools import product
 from functools import lru_cache
+from collections import namedtuple
 import time
 
+import numpy as np
+
+from profiling import debug_profiler
+from rules import STANDARD_RULES, categories as rules_categories, upper_categories, score, check_rules
+from tables import get_static_tables, category_outcomes, reachable_upper_totals, solve_rerolls
+
+# turn widgets kept per process; greedy widgets depend only on the open
+# categories and the Yahtzee-bonus flag, so few distinct ones occur
+WIDGET_CACHE_SIZE = 4096
+
+# ev (3, 252), keep_ev (2, 462), masks (2, 252): see tables.solve_rerolls;
+# category: best category name per dice state; keep_by_mask: (252, 32) keep ids
+# (sizes for the standard rules)
+TurnWidget = namedtuple("TurnWidget", ["ev", "keep_ev", "masks", "category", "keep_by_mask"])
+
+
 class GreedyBot:
-    def __init__(self):
-        self._categories = list(YahtzeeGame().score_sheet.keys())
-        self._numeric_scores = {
-            "aces": 1, "twos": 2, "threes": 3, "fours": 4, "fives": 5, "sixes": 6,
-        }
+    def __init__(self, rules=STANDARD_RULES):
+        """rules: rules.Rules (dice, faces, rerolls, bonuses); default standard Yahtzee."""
+        self._rules = check_rules(rules)
+        self._n_dice = rules.n_dice
+        self._n_rerolls = rules.n_rerolls
+        self._categories = list(rules_categories(rules))
+        self._numeric_scores = upper_categories(rules)
+        # sorted dice states and their ids, shared with the static tables
+        self._tables = get_static_tables(rules)
+        self._dice_states = self._tables.dice_states
+        self._state_to_id = self._tables.state_to_id
 
         self._cat_to_idx = {c: i for i, c in enumerate(self._categories)}
         self._idx_yahtzee = self._cat_to_idx.get("yahtzee")
@@ -20,30 +41,30 @@ class GreedyBot:
         self._upper_idxs = {self._cat_to_idx[c] for c in self._numeric_scores.keys()}
         self._lower_idxs = {i for i in range(len(self._categories)) if i not in self._upper_idxs}
 
-        self._upper_idx_by_face = {
-            1: self._cat_to_idx["aces"],
-            2: self._cat_to_idx["twos"],
-            3: self._cat_to_idx["threes"],
-            4: self._cat_to_idx["fours"],
-            5: self._cat_to_idx["fives"],
-            6: self._cat_to_idx["sixes"],
-        }
+        self._upper_idx_by_face = {face: self._cat_to_idx[c] for c, face in self._numeric_scores.items()}
+
+        # optional profiling.SolverProfiler; None keeps hooks to one attribute check
+        self._profiler = None
 
     def intmask_to_listmask(self, reroll_mask_int):
         # bit i = 1 means reroll die i
-        return [1 if ((reroll_mask_int >> i) & 1) else 0 for i in range(5)]
+        return [1 if ((reroll_mask_int >> i) & 1) else 0 for i in range(self._n_dice)]
 
     @lru_cache(maxsize=None)
     def _score_category(self, dice_state, cat):
-        return calculate_score(dice_state, cat)
+        return score(dice_state, cat, self._rules)
 
     @lru_cache(maxsize=None)
     def _best_category_value(self, dice_state, avail_t, y_bonus_enabled):
-        is_yahtzee_roll = (dice_state[0] == dice_state[4])
+        if self._profiler is not None:
+            self._profiler.count("expand._best_category_value")
+
+        rules = self._rules
+        is_yahtzee_roll = (dice_state[0] == dice_state[-1])
         yahtzee_open = bool(avail_t[self._idx_yahtzee]) if self._idx_yahtzee is not None else False
         apply_joker = is_yahtzee_roll and (not yahtzee_open) and y_bonus_enabled
 
-        immediate_bonus = 100.0 if apply_joker else 0.0
+        immediate_bonus = float(rules.yahtzee_bonus) if apply_joker else 0.0
 
         forced_upper = None
         if apply_joker:
@@ -64,17 +85,19 @@ class GreedyBot:
             if apply_joker and forced_upper is None and lower_avail and (ci in self._upper_idxs):
                 continue
 
-            score = self._score_category(dice_state, cat)
+            pts = self._score_category(dice_state, cat)
 
             if apply_joker and forced_upper is None:
                 if ci == self._idx_fullhouse:
-                    score = 25
+                    pts = rules.fullhouse_score
                 elif ci == self._idx_smstraight:
-                    score = 30
+                    pts = rules.smstraight_score
                 elif ci == self._idx_lgstraight:
-                    score = 40
+                    pts = rules.lgstraight_score
 
-            val = immediate_bonus + score
+            val = immediate_bonus + pts
+            if self._profiler is not None:
+                self._profiler.count("category_evals")
             if val > best:
                 best = val
 
@@ -84,19 +107,27 @@ class GreedyBot:
     def _best_ev(self, dice_state, r_left, avail_t, y_bonus_enabled):
         if r_left == 0:
             return self._best_category_value(dice_state, avail_t, y_bonus_enabled)
-        return max(self._ev_if_reroll_mask(dice_state, m, r_left, avail_t, y_bonus_enabled) for m in range(1 << 5))
+        if self._profiler is not None:
+            self._profiler.count("expand._best_ev")
+        return max(self._ev_if_reroll_mask(dice_state, m, r_left, avail_t, y_bonus_enabled)
+                   for m in range(1 << self._n_dice))
 
     @lru_cache(maxsize=None)
     def _ev_if_reroll_mask(self, dice_state, m, r_left, avail_t, y_bonus_enabled):
-        reroll_idxs = [i for i in range(5) if ((m >> i) & 1) == 1]
+        reroll_idxs = [i for i in range(self._n_dice) if ((m >> i) & 1) == 1]
         k = len(reroll_idxs)
 
         if k == 0:
             return self._best_category_value(dice_state, avail_t, y_bonus_enabled)
 
+        n_faces = self._rules.n_faces
+        if self._profiler is not None:
+            self._profiler.count("expand._ev_if_reroll_mask")
+            self._profiler.count("transition_evals", n_faces ** k)
+
         total = 0.0
-        p_each = (1.0 / 6.0) ** k
-        for outcome in product(range(1, 7), repeat=k):
+        p_each = (1.0 / n_faces) ** k
+        for outcome in product(range(1, n_faces + 1), repeat=k):
             new_dice = list(dice_state)
             for idx, val in zip(reroll_idxs, outcome):
                 new_dice[idx] = val
@@ -109,32 +140,26 @@ class GreedyBot:
     def choose_best_keep(self, dice, rolls_left, score_sheet, debug=False):
         dice_t = tuple(sorted(dice))
         avail_t = tuple(score_sheet[cat] is None for cat in self._categories)
-        y_bonus_enabled = (score_sheet.get("yahtzee") == 50)
 
-        # pick best mask using the *same* cache
         if rolls_left == 0:
             return 0  # no rerolls possible
 
-        best_mask = 0
-        best_val = float("-inf")
-
-        if debug:
-            print(f"    [bot] evaluating 32 masks for dice={list(dice_t)} rolls_left={rolls_left}", flush=True)
+        prof = self._profiler
+        if debug and prof is None:
+            prof = debug_profiler()
 
         t_start = time.perf_counter()
-        for m in range(1 << 5):
-            if debug and (m % 4 == 0):
-                elapsed = time.perf_counter() - t_start
-                print(f"    [bot] mask {m:2d}/31 (elapsed {elapsed:.2f}s) best={best_val:.3f}", flush=True)
-
-            v = self._ev_if_reroll_mask(dice_t, m, rolls_left, avail_t, y_bonus_enabled)
-            if v > best_val:
-                best_val = v
-                best_mask = m
-
-        if debug:
-            elapsed = time.perf_counter() - t_start
-            print(f"    [bot] done in {elapsed:.2f}s best_mask={best_mask:05b} ev={best_val:.3f}", flush=True)
+        widget = self._sheet_widget(score_sheet)
+        state_id = self._state_to_id[dice_t]
+        r = min(rolls_left, self._n_rerolls)
+        best_mask = int(widget.masks[r - 1][state_id])
+
+        if prof is not None:
+            prof.decision(
+                "choose_best_keep", time.perf_counter() - t_start,
+                dice=list(dice_t), rolls_left=rolls_left, n_open=sum(avail_t),
+                best_mask=f"{best_mask:0{self._n_dice}b}", ev=float(widget.ev[r][state_id]),
+            )
 
         return best_mask
 
@@ -149,24 +174,19 @@ class GreedyBot:
           - bit 0 => keep that die
         """
         dice_t = tuple(sorted(dice))
-        avail_t = tuple(score_sheet[cat] is None for cat in self._categories)
-        y_bonus_enabled = (score_sheet.get("yahtzee") == 50)
 
         # We are evaluating the EV of taking *this specific* mask now
-        if rolls_left == 0:
-            return self._best_category_value(dice_t, avail_t, y_bonus_enabled)
-
-        return self._ev_if_reroll_mask(dice_t, reroll_mask, rolls_left, avail_t, y_bonus_enabled)
+        widget = self._sheet_widget(score_sheet)
+        state_id = self._state_to_id[dice_t]
+        if rolls_left == 0 or reroll_mask == 0:
+            return float(widget.ev[0][state_id])
+        r = min(rolls_left, self._n_rerolls)
+        return float(widget.keep_ev[r - 1][widget.keep_by_mask[state_id, reroll_mask]])
     
-    def choose_best_category(self, dice, score_sheet):
-        """
-        When rolls_left == 0, pick the best available category for these dice.
-        """
-        dice_t = tuple(sorted(dice))
-        avail_t = tuple(score_sheet[cat] is None for cat in self._categories)
-        y_bonus_enabled = (score_sheet.get("yahtzee") == 50)
-
-        is_yahtzee_roll = (dice_t[0] == dice_t[4])
+    def _best_category(self, dice_t, avail_t, y_bonus_enabled):
+        """(best category, its immediate score) for sorted dice; Joker rules as in _best_category_value."""
+        rules = self._rules
+        is_yahtzee_roll = (dice_t[0] == dice_t[-1])
         yahtzee_open = bool(avail_t[self._idx_yahtzee]) if self._idx_yahtzee is not None else False
         apply_joker = is_yahtzee_roll and (not yahtzee_open) and y_bonus_enabled
 
@@ -194,20 +214,195 @@ class GreedyBot:
 
             if apply_joker and forced_upper is None:
                 if ci == self._idx_fullhouse:
-                    s = 25
+                    s = rules.fullhouse_score
                 elif ci == self._idx_smstraight:
-                    s = 30
+                    s = rules.smstraight_score
                 elif ci == self._idx_lgstraight:
-                    s = 40
+                    s = rules.lgstraight_score
 
             if s > best_val:
                 best_val = s
                 best_cat = cat
 
+        return best_cat, best_val
+
+    @lru_cache(maxsize=WIDGET_CACHE_SIZE)
+    def _turn_widget(self, avail_t, y_bonus_enabled):
+        """
+        The whole turn solved at once: EV and best action for every dice state
+        and rolls_left (see tables.solve_rerolls). Replaces enumerating 6**k
+        reroll outcomes per decision; the rest of the turn are lookups.
+        """
+        if self._profiler is not None:
+            self._profiler.count("expand._turn_widget")
+
+        ev0 = np.array([self._best_category_value(d, avail_t, y_bonus_enabled) for d in self._dice_states])
+        category = [self._best_category(d, avail_t, y_bonus_enabled)[0] for d in self._dice_states]
+        ev, keep_ev, masks = solve_rerolls(self._tables, ev0)
+        return TurnWidget(ev, keep_ev, masks, category, self._tables.keep_by_mask)
+
+    def _sheet_widget(self, score_sheet):
+        """Turn widget for the turn-start state of this sheet."""
+        avail_t = tuple(score_sheet[cat] is None for cat in self._categories)
+        return self._turn_widget(avail_t, score_sheet.get("yahtzee") == self._rules.yahtzee_score)
+
+    def choose_best_category(self, dice, score_sheet):
+        """
+        When rolls_left == 0, pick the best available category for these dice.
+        """
+        t_start = time.perf_counter()
+        dice_t = tuple(sorted(dice))
+        avail_t = tuple(score_sheet[cat] is None for cat in self._categories)
+
+        widget = self._sheet_widget(score_sheet)
+        state_id = self._state_to_id[dice_t]
+        best_cat = widget.category[state_id]
+        best_val = float(widget.ev[0][state_id])
+
+        if self._profiler is not None:
+            self._profiler.decision(
+                "choose_best_category", time.perf_counter() - t_start,
+                dice=list(dice_t), rolls_left=0, n_open=sum(avail_t),
+                category=best_cat, ev=best_val,
+            )
+
         return best_cat
 
+    # --- Instrumentation
+
+    def set_profiler(self, profiler):
+        """Attach a profiling.SolverProfiler (or None to detach)."""
+        if self._profiler is not None:
+            self._profiler.detach()
+        self._profiler = profiler
+        if profiler is not None:
+            profiler.attach(self)
+
+    def cache_info(self):
+        # NOTE: lru_cache on methods is shared by all instances of the class
+        return {
+            "_score_category": self._score_category.cache_info(),
+            "_best_category_value": self._best_category_value.cache_info(),
+            "_best_ev": self._best_ev.cache_info(),
+            "_ev_if_reroll_mask": self._ev_if_reroll_mask.cache_info(),
+            "_turn_widget": self._turn_widget.cache_info(),
+        }
+
     def reset_cache(self):
         self._score_category.cache_clear()
         self._best_category_value.cache_clear()
         self._best_ev.cache_clear()
         self._ev_if_reroll_mask.cache_clear()
+        self._turn_widget.cache_clear()
+
+
+#-----------------------------
+# GREEDY + FUTURE-VALUE LOOKUP
+#-----------------------------
+
+# upper progress = upper total - par (3 of each filled upper face); bucket edges
+# on that difference, plus one extra bucket for "bonus already secured"
+PROGRESS_EDGES = (-12, -6, -3, 0, 3, 6)
+N_PROGRESS = len(PROGRESS_EDGES) + 2
+
+
+def upper_par(avail_mask, rules=STANDARD_RULES):
+    """
+    Par upper total of the filled upper categories: the bonus threshold split
+    over the faces in proportion to face value (3 dice of each face for the
+    standard rules).
+    """
+    cat_idx = {c: i for i, c in enumerate(rules_categories(rules))}
+    faces = upper_categories(rules)
+    face_sum = sum(faces.values())
+    return sum(rules.upper_bonus_threshold * face / face_sum
+               for cat, face in faces.items() if not (avail_mask >> cat_idx[cat]) & 1)
+
+
+def progress_bucket(upper_total, par, threshold=STANDARD_RULES.upper_bonus_threshold):
+    """Bucket of (upper_total, par); works elementwise on NumPy arrays."""
+    bucket = np.searchsorted(np.asarray(PROGRESS_EDGES), np.asarray(upper_total) - par, side="right")
+    return np.where(np.asarray(upper_total) >= threshold, N_PROGRESS - 1, bucket)
+
+
+def build_future_table(value_table, rules=STANDARD_RULES):
+    """
+    Future-value lookup F[avail_mask, y_bonus, progress bucket] distilled from
+    a DP value table built for `rules`: the mean of V[avail_mask, upper_total,
+    y_bonus] over the reachable upper totals in each bucket. Buckets no
+    reachable total falls into copy the nearest filled bucket.
+    (2**13, 2, N_PROGRESS) float32, ~520 KB.
+    """
+    tables = get_static_tables(rules)
+    n_masks = value_table.shape[0]
+    F = np.zeros((n_masks, 2, N_PROGRESS), dtype=np.float32)
+    for mask in range(n_masks):
+        totals = np.asarray(reachable_upper_totals(mask, tables))
+        buckets = progress_bucket(totals, upper_par(mask, rules), rules.upper_bonus_threshold)
+        filled = [b for b in range(N_PROGRESS) if np.any(buckets == b)]
+        for y in (0, 1):
+            values = np.asarray(value_table[mask, totals, y])
+            for b in range(N_PROGRESS):
+                src = b if b in filled else min(filled, key=lambda f: abs(f - b))
+                F[mask, y, b] = values[buckets == src].mean()
+    return F
+
+
+class LookaheadGreedyBot(GreedyBot):
+    """
+    GreedyBot's turn-level search, but each category is worth its points plus a
+    looked-up estimate of the rest of the game: F[open categories after scoring,
+    Yahtzee bonus flag, upper progress bucket] (see build_future_table).
+    Sacrifices a weak category, chases the upper bonus when behind, etc., at
+    greedy speed.
+    """
+
+    def __init__(self, future_table, rules=STANDARD_RULES):
+        """future_table: build_future_table output for the same rules."""
+        super().__init__(rules)
+        self._future_table = np.asarray(future_table, dtype=np.float64)
+        # par of the filled upper categories, per avail mask
+        self._par = np.array([upper_par(m, rules) for m in range(self._future_table.shape[0])])
+
+    @classmethod
+    def from_value_table(cls, value_table, rules=STANDARD_RULES):
+        return cls(build_future_table(value_table, rules), rules)
+
+    def _sheet_widget(self, score_sheet):
+        rules = self._rules
+        avail_mask = 0
+        for i, cat in enumerate(self._categories):
+            if score_sheet[cat] is None:
+                avail_mask |= (1 << i)
+        upper_total = sum(score_sheet[c] for c in self._numeric_scores if score_sheet[c] is not None)
+        return self._lookahead_widget(avail_mask, min(rules.upper_bonus_threshold, upper_total),
+                                      score_sheet.get("yahtzee") == rules.yahtzee_score)
+
+    @lru_cache(maxsize=WIDGET_CACHE_SIZE)
+    def _lookahead_widget(self, avail_mask, upper_total, y_bonus_enabled):
+        """Turn widget with category value = points (+ Joker bonus) + future lookup."""
+        if self._profiler is not None:
+            self._profiler.count("expand._lookahead_widget")
+
+        rules = self._rules
+        tables = self._tables
+        out = category_outcomes(tables, [avail_mask], [upper_total], [y_bonus_enabled])
+        next_mask = out["next_mask"][0]                                       # (C,)
+        buckets = progress_bucket(out["new_upper"][0], self._par[next_mask][None, :],
+                                  rules.upper_bonus_threshold)
+        future = self._future_table[next_mask[None, :], out["new_y"][0].astype(np.int64), buckets]  # (S, C)
+        cat_val = out["pts"][0] + float(rules.yahtzee_bonus) * out["joker"][0][:, None] + future
+        cat_val[~out["legal"][0]] = -np.inf
+
+        ev, keep_ev, masks = solve_rerolls(tables, cat_val.max(axis=1))
+        category = [self._categories[ci] for ci in cat_val.argmax(axis=1)]
+        return TurnWidget(ev, keep_ev, masks, category, tables.keep_by_mask)
+
+    def cache_info(self):
+        info = super().cache_info()
+        info["_lookahead_widget"] = self._lookahead_widget.cache_info()
+        return info
+
+    def reset_cache(self):
+        super().reset_cache()
+        self._lookahead_widget.cache_clear()
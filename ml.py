@@ -1,13 +1,14 @@
 import numpy as np
-from sklearn.neural_network import MLPClassifier
 from collections import Counter
 import random
 import os
 import pickle
+import time
 import warnings
 
 from yahtzee_game import YahtzeeGame
 from utils import calculate_score
+from profiling import debug_profiler
 
 warnings.filterwarnings('ignore')
 
@@ -130,9 +131,14 @@ def category_to_action(cat):
 #-----------------------------
 
 class MLBot:
+    # features use the raw upper sum, so exact evaluators must not cap it at 63
+    reads_raw_upper_total = True
+
     def __init__(self, model_path=None):
         self._categories = CATEGORIES
         self.model = None
+        # optional profiling.SolverProfiler; None keeps hooks to one attribute check
+        self._profiler = None
         
         if model_path and os.path.exists(model_path):
             self.load_model(model_path)
@@ -149,7 +155,13 @@ class MLBot:
             return probs
         
         # Get model probabilities
-        model_probs = self.model.predict_proba([features])[0]
+        if self._profiler is not None:
+            t0 = time.perf_counter()
+            model_probs = self.model.predict_proba([features])[0]
+            self._profiler.count("model_predict")
+            self._profiler.count("model_predict_us", int((time.perf_counter() - t0) * 1e6))
+        else:
+            model_probs = self.model.predict_proba([features])[0]
         
         full_probs = np.zeros(NUM_ACTIONS)
         for i, cls in enumerate(self.model.classes_):
@@ -193,6 +205,7 @@ class MLBot:
         if rolls_left == 0:
             return 0
         
+        t_start = time.perf_counter()
         features = extract_features(dice, score_sheet, rolls_left)
         legal = get_legal_mask(score_sheet, rolls_left)
         legal[32:] = False  # Only reroll actions
@@ -200,13 +213,20 @@ class MLBot:
         probs = self._get_action_probs(features, legal)
         best_action = int(np.argmax(probs))
         
-        if debug:
-            print(f"    [ml] dice={dice} rolls_left={rolls_left} -> mask={best_action:05b}")
+        prof = self._profiler
+        if debug and prof is None:
+            prof = debug_profiler()
+        if prof is not None:
+            prof.decision(
+                "choose_best_keep", time.perf_counter() - t_start,
+                dice=list(dice), rolls_left=rolls_left, best_mask=f"{best_action:05b}",
+            )
         
         return best_action
     
     def choose_best_category(self, dice, score_sheet, debug=False):
         """Greedy category selection for evaluation."""
+        t_start = time.perf_counter()
         features = extract_features(dice, score_sheet, rolls_remaining=0)
         legal = get_legal_mask(score_sheet, rolls_remaining=0)
         legal[0:32] = False  # Only score actions
@@ -214,11 +234,49 @@ class MLBot:
         probs = self._get_action_probs(features, legal)
         best_action = int(np.argmax(probs))
         
-        if debug:
-            print(f"    [ml] dice={dice} -> category={action_to_category(best_action)}")
+        prof = self._profiler
+        if debug and prof is None:
+            prof = debug_profiler()
+        if prof is not None:
+            prof.decision(
+                "choose_best_category", time.perf_counter() - t_start,
+                dice=list(dice), rolls_left=0, category=action_to_category(best_action),
+            )
         
         return action_to_category(best_action)
     
+    def decide_batch(self, queries):
+        """
+        Greedy decisions for many (dice, rolls_left, score_sheet) queries with one
+        model call. Returns reroll masks for rolls_left > 0, categories for 0.
+        """
+        if not queries:
+            return []
+        
+        features = np.stack([extract_features(d, sheet, r) for d, r, sheet in queries])
+        legal = np.stack([get_legal_mask(sheet, r) for _, r, sheet in queries])
+        is_keep = np.array([r > 0 for _, r, _ in queries])
+        legal[is_keep, 32:] = False
+        legal[~is_keep, 0:32] = False
+        
+        if self.model is None:
+            probs = legal / legal.sum(axis=1, keepdims=True)
+        else:
+            model_probs = self.model.predict_proba(features)
+            probs = np.zeros((len(queries), NUM_ACTIONS))
+            probs[:, self.model.classes_] = model_probs
+            probs[~legal] = 0
+            sums = probs.sum(axis=1, keepdims=True)
+            empty = (sums[:, 0] == 0)
+            probs[empty] = legal[empty] / legal[empty].sum(axis=1, keepdims=True)
+            sums[empty] = 1.0
+            probs /= sums
+            if self._profiler is not None:
+                self._profiler.count("model_predict")
+        
+        best = np.argmax(probs, axis=1)
+        return [int(a) if k else action_to_category(int(a)) for a, k in zip(best, is_keep)]
+    
     def save_model(self, path):
         with open(path, 'wb') as f:
             pickle.dump(self.model, f)
@@ -227,6 +285,17 @@ class MLBot:
         with open(path, 'rb') as f:
             self.model = pickle.load(f)
     
+    def set_profiler(self, profiler):
+        """Attach a profiling.SolverProfiler (or None to detach)."""
+        if self._profiler is not None:
+            self._profiler.detach()
+        self._profiler = profiler
+        if profiler is not None:
+            profiler.attach(self)
+    
+    def cache_info(self):
+        return {}
+    
     def reset_cache(self):
         pass
 
@@ -298,13 +367,137 @@ def play_game_and_record(bot, temperature=1.0):
 # SELF-PLAY TRAINING
 # =============================================================================
 
+def train_iteration(
+    bot,
+    iteration,
+    num_iterations=20,
+    games_per_iteration=500,
+    top_percentile=30,
+    temperature_start=2.0,
+    temperature_end=0.5,
+    hidden_layer_sizes=(128, 64),
+    eval_games=100,
+    verbose=True,
+):
+    """
+    One self-play iteration: play games with bot's current policy at the
+    annealed temperature, fit a new model on the top games and evaluate it
+    greedily. The new model replaces bot.model. Everything carried between
+    iterations is bot.model, so a run can be stopped and resumed from a saved
+    model (see sweep.py).
+
+    Returns a metrics dict: iteration, temperature, selfplay_mean,
+    selfplay_std, n_pairs, eval_mean, eval_std.
+    """
+    log = print if verbose else (lambda *a, **k: None)
+
+    # Anneal temperature
+    progress = iteration / max(num_iterations - 1, 1)
+    temperature = temperature_start + progress * (temperature_end - temperature_start)
+
+    log(f"\n{'='*60}")
+    log(f"Iteration {iteration + 1}/{num_iterations} | Temperature: {temperature:.2f}")
+    log(f"{'='*60}")
+
+    # Play games
+    log(f"Playing {games_per_iteration} games...")
+    all_games = []
+
+    for g in range(games_per_iteration):
+        if (g + 1) % 100 == 0:
+            log(f"  Game {g + 1}/{games_per_iteration}")
+        trajectory, score = play_game_and_record(bot, temperature)
+        all_games.append((trajectory, score))
+
+    scores = [s for _, s in all_games]
+    log(f"Scores: mean={np.mean(scores):.1f}, std={np.std(scores):.1f}, "
+        f"min={np.min(scores)}, max={np.max(scores)}")
+
+    # Select top games
+    threshold = np.percentile(scores, 100 - top_percentile)
+    top_games = [(t, s) for t, s in all_games if s >= threshold]
+    log(f"Selected {len(top_games)} games with score >= {threshold:.0f}")
+
+    # Build training data
+    states = []
+    actions = []
+    weights = []
+
+    top_scores = [s for _, s in top_games]
+    min_score = min(top_scores)
+    max_score = max(top_scores)
+    score_range = max(max_score - min_score, 1)
+
+    for trajectory, score in top_games:
+        weight = 1.0 + (score - min_score) / score_range
+        for features, action in trajectory:
+            states.append(features)
+            actions.append(action)
+            weights.append(weight)
+
+    states = np.array(states)
+    actions = np.array(actions)
+    weights = np.array(weights)
+
+    log(f"Training on {len(states)} state-action pairs...")
+
+    # Train model (sklearn is imported here so playing with a saved model,
+    # or with no model at all, does not pay for it at import time)
+    from sklearn.neural_network import MLPClassifier
+    model = MLPClassifier(
+        hidden_layer_sizes=tuple(hidden_layer_sizes),
+        activation='relu',
+        solver='adam',
+        alpha=0.0001,
+        batch_size=64,
+        learning_rate='adaptive',
+        learning_rate_init=0.001,
+        max_iter=100,
+        early_stopping=True,
+        validation_fraction=0.1,
+        n_iter_no_change=10,
+        verbose=False,
+        random_state=iteration
+    )
+
+    # Oversample high-weight examples
+    indices = np.random.choice(
+        len(states),
+        size=len(states),
+        replace=True,
+        p=weights / weights.sum()
+    )
+
+    model.fit(states[indices], actions[indices])
+    bot.model = model
+
+    # Evaluate
+    log("Evaluating...")
+    eval_scores = [play_game_and_record(bot, temperature=0)[1] for _ in range(eval_games)]
+    mean_score = float(np.mean(eval_scores))
+
+    log(f"Evaluation: mean={mean_score:.1f}, std={np.std(eval_scores):.1f}")
+
+    return {
+        "iteration": iteration,
+        "temperature": temperature,
+        "selfplay_mean": float(np.mean(scores)),
+        "selfplay_std": float(np.std(scores)),
+        "n_pairs": int(len(states)),
+        "eval_mean": mean_score,
+        "eval_std": float(np.std(eval_scores)),
+    }
+
+
 def train_self_play(
     num_iterations=20,
     games_per_iteration=500,
     top_percentile=30,
     temperature_start=2.0,
     temperature_end=0.5,
-    model_path="yahtzee_ml_model.pkl"
+    model_path="yahtzee_ml_model.pkl",
+    hidden_layer_sizes=(128, 64),
+    eval_games=100,
 ):
     """
     Train using self-play with reward-weighted learning.
@@ -314,6 +507,8 @@ def train_self_play(
     2. Keep only the top-scoring games
     3. Train on (state, action) pairs from those good games
     4. Repeat with decreasing temperature (less exploration over time)
+
+    Each iteration is train_iteration; sweep.py runs many configurations of it.
     """
     
     print("=" * 60)
@@ -324,90 +519,17 @@ def train_self_play(
     best_mean_score = 0
     
     for iteration in range(num_iterations):
-        # Anneal temperature
-        progress = iteration / max(num_iterations - 1, 1)
-        temperature = temperature_start + progress * (temperature_end - temperature_start)
-        
-        print(f"\n{'='*60}")
-        print(f"Iteration {iteration + 1}/{num_iterations} | Temperature: {temperature:.2f}")
-        print(f"{'='*60}")
-        
-        # Play games
-        print(f"Playing {games_per_iteration} games...")
-        all_games = []
-        
-        for g in range(games_per_iteration):
-            if (g + 1) % 100 == 0:
-                print(f"  Game {g + 1}/{games_per_iteration}")
-            trajectory, score = play_game_and_record(bot, temperature)
-            all_games.append((trajectory, score))
-        
-        scores = [s for _, s in all_games]
-        print(f"Scores: mean={np.mean(scores):.1f}, std={np.std(scores):.1f}, "
-              f"min={np.min(scores)}, max={np.max(scores)}")
-        
-        # Select top games
-        threshold = np.percentile(scores, 100 - top_percentile)
-        top_games = [(t, s) for t, s in all_games if s >= threshold]
-        print(f"Selected {len(top_games)} games with score >= {threshold:.0f}")
-        
-        # Build training data
-        states = []
-        actions = []
-        weights = []
-        
-        top_scores = [s for _, s in top_games]
-        min_score = min(top_scores)
-        max_score = max(top_scores)
-        score_range = max(max_score - min_score, 1)
-        
-        for trajectory, score in top_games:
-            weight = 1.0 + (score - min_score) / score_range
-            for features, action in trajectory:
-                states.append(features)
-                actions.append(action)
-                weights.append(weight)
-        
-        states = np.array(states)
-        actions = np.array(actions)
-        weights = np.array(weights)
-        
-        print(f"Training on {len(states)} state-action pairs...")
-        
-        # Train model
-        model = MLPClassifier(
-            hidden_layer_sizes=(128, 64),
-            activation='relu',
-            solver='adam',
-            alpha=0.0001,
-            batch_size=64,
-            learning_rate='adaptive',
-            learning_rate_init=0.001,
-            max_iter=100,
-            early_stopping=True,
-            validation_fraction=0.1,
-            n_iter_no_change=10,
-            verbose=False,
-            random_state=iteration
-        )
-        
-        # Oversample high-weight examples
-        indices = np.random.choice(
-            len(states), 
-            size=len(states), 
-            replace=True, 
-            p=weights / weights.sum()
+        metrics = train_iteration(
+            bot, iteration,
+            num_iterations=num_iterations,
+            games_per_iteration=games_per_iteration,
+            top_percentile=top_percentile,
+            temperature_start=temperature_start,
+            temperature_end=temperature_end,
+            hidden_layer_sizes=hidden_layer_sizes,
+            eval_games=eval_games,
         )
-        
-        model.fit(states[indices], actions[indices])
-        bot.model = model
-        
-        # Evaluate
-        print("Evaluating...")
-        eval_scores = [play_game_and_record(bot, temperature=0)[1] for _ in range(100)]
-        mean_score = np.mean(eval_scores)
-        
-        print(f"Evaluation: mean={mean_score:.1f}, std={np.std(eval_scores):.1f}")
+        mean_score = metrics["eval_mean"]
         
         if mean_score > best_mean_score:
             best_mean_score = mean_score
@@ -419,4 +541,4 @@ def train_self_play(
     print(f"{'='*60}")
     
     bot.load_model(model_path)
-    return bot
\ No newline at end of file
+    return bot
@@ -0,0 +1,134 @@
+"""
+Compact storage for the DP value table.
+
+tables.build_value_table returns float64 V[avail_mask, upper_total, y_bonus]
+(8 MB). PackedValueTable stores the same values in a smaller, read-friendlier
+form and is indexed exactly like V, so DynamicProgrammingBot, tables.solve_widgets
+and the harness take it unchanged:
+
+  values   uint16 fixed point: v = q * scale + offset, scale = (max - min) / 65535,
+           max abs error scale / 2 (~0.003 points for the exact table; 2 MB), or
+           float32: max abs error |v| * 2**-24 (~2e-5 points; 4 MB)
+  layout   data[avail_mask, y_bonus, upper_total]: one 2 x 64 record per mask,
+           upper total innermost. A turn solve reads, per successor (one bit of
+           avail_mask cleared), a few upper totals at one y_bonus: a single
+           contiguous 128-byte (uint16) run instead of 1 KB strided reads
+
+    packed = pack_value_table(V, "uint16")
+    save_packed_value_table("yahtzee_value_table_u16.npz", packed)
+    V = load_value_table("yahtzee_value_table_u16.npz")   # tables.load_value_table
+
+or from the command line:
+
+    python packed_tables.py --table yahtzee_value_table.npy --dtype uint16 --out yahtzee_value_table_u16.npz
+
+np.asarray(packed) gives the dequantized float64 table back (FrozenBot and
+SharedTables convert this way). benchmark.py --layouts compares lookups/s,
+disk and RAM size of the layouts.
+"""
+import argparse
+import os
+
+import numpy as np
+
+DTYPES = ("uint16", "float32")
+
+_Q_MAX = np.iinfo(np.uint16).max
+
+
+class PackedValueTable:
+    """Read-only V[avail_mask, upper_total, y_bonus] over a packed array."""
+
+    def __init__(self, data, scale=1.0, offset=0.0):
+        """data: (n_masks, 2, n_upper) uint16 (fixed point) or float32."""
+        self.data = np.asarray(data)
+        self.data.setflags(write=False)
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self._quantized = self.data.dtype == np.uint16
+        self._flat = self.data.reshape(-1)
+        self._n_y, self._n_upper = self.data.shape[1:]
+
+    @property
+    def shape(self):
+        n_masks, n_y, n_upper = self.data.shape
+        return (n_masks, n_upper, n_y)
+
+    ndim = 3
+    dtype = np.dtype(np.float64)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    @property
+    def max_error(self):
+        """Bound on |stored - original| for any entry."""
+        if self._quantized:
+            return self.scale / 2
+        return float(np.abs(self.data).max()) * 2.0 ** -24
+
+    def __getitem__(self, key):
+        mask, upper, y = key
+        if isinstance(mask, slice) or isinstance(upper, slice) or isinstance(y, slice):
+            q = self.data[mask, y, upper]
+        else:
+            # integer / array keys: one flat gather (and no NumPy scalars for int keys)
+            idx = (mask * self._n_y + y) * self._n_upper + upper
+            if isinstance(idx, int):
+                q = self._flat.item(idx)
+                return q * self.scale + self.offset if self._quantized else q
+            q = self._flat.take(idx)
+        if self._quantized:
+            return q * self.scale + self.offset
+        return q.astype(np.float64)
+
+    def __array__(self, dtype=None, copy=None):
+        q = self.data.transpose(0, 2, 1)
+        V = q * self.scale + self.offset if self._quantized else q.astype(np.float64)
+        return V if dtype is None else V.astype(dtype)
+
+
+def pack_value_table(value_table, dtype="uint16"):
+    """PackedValueTable holding value_table (any (n_masks, n_upper, 2) array) as `dtype`."""
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}")
+    V = np.asarray(value_table, dtype=np.float64)
+    data = V.transpose(0, 2, 1)
+    if dtype == "float32":
+        return PackedValueTable(np.ascontiguousarray(data, dtype=np.float32))
+    lo, hi = float(V.min()), float(V.max())
+    scale = (hi - lo) / _Q_MAX if hi > lo else 1.0
+    q = np.rint((data - lo) / scale).astype(np.uint16)
+    return PackedValueTable(np.ascontiguousarray(q), scale, lo)
+
+
+def save_packed_value_table(path, packed):
+    np.savez(path, packed=packed.data, scale=packed.scale, offset=packed.offset)
+
+
+def load_packed_value_table(path):
+    with np.load(path) as f:
+        return PackedValueTable(f["packed"], float(f["scale"]), float(f["offset"]))
+
+
+def main(argv=None):
+    from tables import load_value_table
+
+    parser = argparse.ArgumentParser(description="Pack a DP value table as uint16 or float32.")
+    parser.add_argument("--table", required=True, help="value table (.npy)")
+    parser.add_argument("--dtype", default="uint16", choices=DTYPES)
+    parser.add_argument("--out", required=True, help="packed table (.npz)")
+    args = parser.parse_args(argv)
+
+    V = np.asarray(load_value_table(args.table))
+    packed = pack_value_table(V, args.dtype)
+    save_packed_value_table(args.out, packed)
+    err = float(np.abs(np.asarray(packed) - V).max())
+    print(f"{args.dtype}: {V.nbytes / 1e6:.2f} MB -> {packed.nbytes / 1e6:.2f} MB in RAM, "
+          f"{os.path.getsize(args.out) / 1e6:.2f} MB on disk -> {args.out}")
+    print(f"max abs error {err:.2e} (bound {packed.max_error:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Exact expected final score of a deterministic policy.
+
+Instead of sampling games, follow the bot's own actions through the
+(avail_mask, upper_total, y_bonus, dice state, rolls_left) space and compute
+the expectation directly:
+
+  forward  layer by layer (one more category filled per layer), get the bot's
+           keep mask at rolls_left=2 and 1 and its category at 0 for all
+           252 dice states of every turn-start state in the layer, and push
+           the dice distribution through those actions
+  backward combine immediate points with the successors' values
+
+Works for any bot whose decisions depend on the sheet only through
+(open categories, upper total, Yahtzee scored 50), e.g. GreedyBot,
+DynamicProgrammingBot and greedy MLBot. Decisions come from the bot's turn
+widget when it has one (GreedyBot, DynamicProgrammingBot: one solve per
+state), else from bot.decide_batch (FrozenBot, MLBot), else one call each.
+
+upper_total is capped at 63, where the bonus is decided, which keeps the
+state space small. Bots that look at the raw upper sum (MLBot) set
+reads_raw_upper_total and are followed uncapped, so they are still
+evaluated exactly.
+
+Scoring mirrors evaluate.play_small_game, so the result is the mean the
+Monte Carlo harness converges to.
+"""
+import time
+
+import numpy as np
+
+from rules import STANDARD_RULES
+from tables import get_static_tables, UPPER_CAP
+from evaluate import CATS, UPPER_CATS, NUMERIC_SCORES, score_category_with_joker
+
+
+def reads_raw_upper_total(bot):
+    """Whether the bot's decisions depend on the upper total beyond the bonus threshold."""
+    return getattr(bot, "reads_raw_upper_total", False)
+
+
+def sheet_to_state(score_sheet, cap_upper=False):
+    """(avail_mask, upper_total, y_bonus) for a score sheet; upper_total is capped at 63 if cap_upper."""
+    avail_mask = 0
+    for i, cat in enumerate(CATS):
+        if score_sheet[cat] is None:
+            avail_mask |= (1 << i)
+    upper_total = sum(score_sheet[c] for c in UPPER_CATS if score_sheet[c] is not None)
+    if cap_upper:
+        upper_total = min(UPPER_CAP, upper_total)
+    return avail_mask, upper_total, (score_sheet.get("yahtzee") == STANDARD_RULES.yahtzee_score)
+
+
+def canonical_sheet(avail_mask, upper_total, y_bonus):
+    """
+    A score sheet in the given state. The whole upper total sits on the first
+    filled upper category; other filled categories are 0 (yahtzee is 50 if y_bonus).
+    """
+    sheet = {}
+    rest = upper_total
+    for i, cat in enumerate(CATS):
+        if (avail_mask >> i) & 1:
+            sheet[cat] = None
+        elif cat in NUMERIC_SCORES:
+            sheet[cat] = rest
+            rest = 0
+        elif cat == "yahtzee":
+            sheet[cat] = STANDARD_RULES.yahtzee_score if y_bonus else 0
+        else:
+            sheet[cat] = 0
+    return sheet
+
+
+def decide_batch(bot, queries):
+    """
+    queries: list of (dice, rolls_left, score_sheet).
+    Returns reroll masks (rolls_left > 0) or categories (rolls_left == 0).
+    Uses bot.decide_batch when the bot provides one.
+    """
+    if hasattr(bot, "decide_batch"):
+        return bot.decide_batch(queries)
+    out = []
+    for dice, rolls_left, sheet in queries:
+        if rolls_left == 0:
+            out.append(bot.choose_best_category(dice, sheet))
+        else:
+            out.append(bot.choose_best_keep(dice, rolls_left, sheet))
+    return out
+
+
+def _final_dice_distribution(tables, keep2, keep1):
+    """P(dice state when the category is chosen) given keep masks per dice state."""
+    idx = np.arange(tables.n_states)
+    T = tables.keep_transition
+
+    p2 = tables.first_roll
+    stop2 = (keep2 == 0)
+    final = p2 * stop2
+    p1 = (p2 * ~stop2) @ T[tables.keep_by_mask[idx, keep2]]
+
+    stop1 = (keep1 == 0)
+    final = final + p1 * stop1
+    p0 = (p1 * ~stop1) @ T[tables.keep_by_mask[idx, keep1]]
+    return final + p0
+
+
+def _widget_actions(bot, sheet):
+    """(keep2, keep1, categories) for every dice state from the bot's turn widget."""
+    widget = bot._sheet_widget(sheet)
+    return np.asarray(widget.masks[1], dtype=np.int64), np.asarray(widget.masks[0], dtype=np.int64), \
+        widget.category
+
+
+def _turn_outcomes(tables, state, sheet, final, categories, cap_upper=False):
+    """
+    Score the chosen category for every reachable final dice state.
+    Returns {(next_state, category points, Yahtzee bonus): prob}.
+    """
+    avail_mask, upper_total, y_bonus = state
+    upper_cap = tables.upper_cap if cap_upper else float("inf")
+    yahtzee_score = tables.rules.yahtzee_score
+    outcomes = {}
+
+    for sid in np.nonzero(final > 0.0)[0]:
+        p = float(final[sid])
+        dice = list(tables.dice_states[sid])
+        choice = categories[sid]
+
+        # same fallback as evaluate.play_small_game
+        if choice is None or sheet.get(choice) is not None:
+            choice = next(c for c in CATS if sheet[c] is None)
+
+        pts, bonus100 = score_category_with_joker(dice, choice, sheet)
+        ci = tables.cat_to_idx[choice]
+        new_upper = min(upper_cap, upper_total + pts) if choice in NUMERIC_SCORES else upper_total
+        new_y_bonus = y_bonus or (choice == "yahtzee" and pts == yahtzee_score)
+        key = ((avail_mask & ~(1 << ci), new_upper, new_y_bonus), pts, bonus100)
+        outcomes[key] = outcomes.get(key, 0.0) + p
+
+    return outcomes
+
+
+def _turn_transitions(tables, state, sheet, final, categories, cap_upper=False):
+    """
+    Returns (expected category points, expected Yahtzee bonus, {next_state: prob}).
+    """
+    exp_pts = 0.0
+    exp_ybonus = 0.0
+    successors = {}
+    for (nxt, pts, bonus100), p in _turn_outcomes(tables, state, sheet, final, categories, cap_upper).items():
+        exp_pts += p * pts
+        exp_ybonus += p * bonus100
+        successors[nxt] = successors.get(nxt, 0.0) + p
+    return exp_pts, exp_ybonus, successors
+
+
+def policy_layers(bot, score_sheet, on_state, progress=False, chunk_size=256, cap_upper=False):
+    """
+    Forward pass shared by the exact evaluators: walks the turn-start states
+    reachable from `score_sheet` under `bot`, one layer (one more category
+    filled) at a time, with the bot's decisions from its turn widgets or
+    batched per layer.
+
+    on_state(state, sheet, final, categories) is called for every state with
+    the final dice distribution and the chosen category per dice state, and
+    must return the state's successor states (with upper totals capped if
+    cap_upper, as the root is).
+    Returns (layers, n_decisions); layers[0] = [root state].
+    """
+    tables = get_static_tables()
+    t0 = time.perf_counter()
+    root = sheet_to_state(score_sheet, cap_upper)
+    use_widgets = hasattr(bot, "_sheet_widget")
+
+    layers = []
+    layer = [root] if root[0] != 0 else []
+    n_decisions = 0
+    n = tables.n_states
+
+    while layer:
+        layers.append(layer)
+        next_layer = set()
+
+        # decisions are batched per chunk of states to bound memory on wide layers
+        for start in range(0, len(layer), chunk_size):
+            chunk = layer[start:start + chunk_size]
+            sheets = [canonical_sheet(*state) for state in chunk]
+
+            if use_widgets:
+                for state, sheet in zip(chunk, sheets):
+                    keep2, keep1, categories = _widget_actions(bot, sheet)
+                    final = _final_dice_distribution(tables, keep2, keep1)
+                    for nxt in on_state(state, sheet, final, categories):
+                        if nxt[0] != 0:
+                            next_layer.add(nxt)
+                n_decisions += 3 * n * len(chunk)
+                continue
+
+            queries = []
+            for sheet in sheets:
+                for rolls_left in (2, 1, 0):
+                    for dice in tables.dice_states:
+                        queries.append((list(dice), rolls_left, sheet))
+            actions = decide_batch(bot, queries)
+            n_decisions += len(queries)
+
+            for li, (state, sheet) in enumerate(zip(chunk, sheets)):
+                base = li * 3 * n
+                keep2 = np.asarray(actions[base:base + n], dtype=np.int64)
+                keep1 = np.asarray(actions[base + n:base + 2 * n], dtype=np.int64)
+                categories = actions[base + 2 * n:base + 3 * n]
+
+                final = _final_dice_distribution(tables, keep2, keep1)
+                for nxt in on_state(state, sheet, final, categories):
+                    if nxt[0] != 0:
+                        next_layer.add(nxt)
+
+        if progress:
+            print(f"  layer {len(layers)}: {len(layer)} states "
+                  f"(elapsed {time.perf_counter() - t0:.1f}s)", flush=True)
+        layer = sorted(next_layer)
+
+    return layers, n_decisions
+
+
+def evaluate_policy_exact(bot, score_sheet=None, progress=False):
+    """
+    Exact expected final score of `bot` playing out `score_sheet`
+    (default: a fresh game). Returns a dict:
+
+      expected_score          banked points + expected remaining points and bonuses
+      expected_category_points
+      expected_upper_bonus    (35 * p_upper_bonus)
+      p_upper_bonus
+      expected_yahtzee_bonus  (+100 bonuses from now on)
+      n_states, n_decisions, elapsed_s
+    """
+    tables = get_static_tables()
+    rules = tables.rules
+    t0 = time.perf_counter()
+
+    if score_sheet is None:
+        score_sheet = {c: None for c in CATS}
+    cap_upper = not reads_raw_upper_total(bot)
+    root = sheet_to_state(score_sheet, cap_upper)
+    banked = sum(v for v in score_sheet.values() if v is not None)
+
+    # --- forward: policy actions and successor distributions, one layer at a time
+    turn_info = {}       # state -> (exp_pts, exp_ybonus, successors)
+
+    def on_state(state, sheet, final, categories):
+        info = _turn_transitions(tables, state, sheet, final, categories, cap_upper)
+        turn_info[state] = info
+        return info[2]
+
+    layers, n_decisions = policy_layers(bot, score_sheet, on_state, progress, cap_upper=cap_upper)
+
+    # --- backward: values as (category points, upper bonus, yahtzee bonus)
+    values = {}
+
+    def value_of(state):
+        if state[0] == 0:
+            return (0.0, float(rules.upper_bonus) if state[1] >= rules.upper_bonus_threshold else 0.0, 0.0)
+        return values[state]
+
+    for layer in reversed(layers):
+        for state in layer:
+            exp_pts, exp_ybonus, successors = turn_info[state]
+            cat_v, ub_v, yb_v = exp_pts, 0.0, exp_ybonus
+            for nxt, p in successors.items():
+                c, u, y = value_of(nxt)
+                cat_v += p * c
+                ub_v += p * u
+                yb_v += p * y
+            values[state] = (cat_v, ub_v, yb_v)
+
+    cat_v, ub_v, yb_v = value_of(root)
+    return {
+        "expected_score": banked + cat_v + ub_v + yb_v,
+        "expected_category_points": cat_v,
+        "expected_upper_bonus": ub_v,
+        "p_upper_bonus": ub_v / rules.upper_bonus,
+        "expected_yahtzee_bonus": yb_v,
+        "n_states": len(turn_info),
+        "n_decisions": n_decisions,
+        "elapsed_s": time.perf_counter() - t0,
+    }
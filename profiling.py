@@ -0,0 +1,158 @@
+"""
+Structured solver instrumentation.
+
+Attach a SolverProfiler to any bot with `bot.set_profiler(profiler)`. While
+attached, the bot counts states expanded per cached function, transition
+evaluations and per-layer time, and reports one "decision" event per public
+call. With no profiler attached (the default) each hook is a single
+`is not None` check.
+
+    prof = SolverProfiler(sink=JsonlSink("metrics.jsonl"))
+    bot.set_profiler(prof)
+    bot.choose_best_keep(dice, 2, sheet)
+    print(prof.snapshot())
+"""
+import json
+import time
+
+
+class SolverProfiler:
+    """
+    Counters and timers fed by bot hooks.
+
+    callback: optional callable(event_name, fields_dict), fired per event
+    sink:     optional object with .emit(record_dict), e.g. JsonlSink
+    """
+
+    def __init__(self, callback=None, sink=None):
+        self.callback = callback
+        self.sink = sink
+        self._bot = None
+        self._cache_base = {}
+        self.reset()
+
+    # --- lifecycle
+
+    def attach(self, bot):
+        """Called by bot.set_profiler; remembers cache stats so snapshot() reports deltas."""
+        self._bot = bot
+        self._cache_base = self._cache_stats()
+
+    def detach(self):
+        self._bot = None
+        self._cache_base = {}
+
+    def reset(self):
+        self.counts = {}
+        self.layer_seconds = {}
+        self.layer_states = {}
+        self.decisions = 0
+        self.decision_seconds = 0.0
+        self._stack = []
+        if self._bot is not None:
+            self._cache_base = self._cache_stats()
+
+    # --- hooks (called from bot internals)
+
+    def count(self, key, n=1):
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    def enter_layer(self, layer):
+        """
+        Start timing one turn-start state in `layer` (number of open categories).
+        Time is exclusive: a nested layer pauses its parent's clock.
+        """
+        now = time.perf_counter()
+        if self._stack:
+            parent = self._stack[-1]
+            self.layer_seconds[parent[0]] = self.layer_seconds.get(parent[0], 0.0) + (now - parent[1])
+        self._stack.append([layer, now])
+
+    def exit_layer(self):
+        now = time.perf_counter()
+        layer, start = self._stack.pop()
+        self.layer_seconds[layer] = self.layer_seconds.get(layer, 0.0) + (now - start)
+        self.layer_states[layer] = self.layer_states.get(layer, 0) + 1
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def decision(self, method, elapsed, **fields):
+        self.decisions += 1
+        self.decision_seconds += elapsed
+        self.event("decision", method=method, elapsed_s=elapsed, **fields)
+
+    def event(self, name, **fields):
+        if self.callback is not None:
+            self.callback(name, fields)
+        if self.sink is not None:
+            self.sink.emit({"event": name, "time": time.time(), **fields})
+
+    # --- reporting
+
+    def _cache_stats(self):
+        if self._bot is None:
+            return {}
+        return {
+            name: (info.hits, info.misses, info.currsize)
+            for name, info in self._bot.cache_info().items()
+        }
+
+    def cache_stats(self):
+        """Cache hits/misses per cached function since attach/reset."""
+        out = {}
+        for name, (hits, misses, size) in self._cache_stats().items():
+            base_hits, base_misses, _ = self._cache_base.get(name, (0, 0, 0))
+            out[name] = {"hits": hits - base_hits, "misses": misses - base_misses, "size": size}
+        return out
+
+    def snapshot(self):
+        return {
+            "decisions": self.decisions,
+            "decision_seconds": self.decision_seconds,
+            "counts": dict(self.counts),
+            "cache": self.cache_stats(),
+            "layer_seconds": dict(sorted(self.layer_seconds.items())),
+            "layer_states": dict(sorted(self.layer_states.items())),
+        }
+
+    def flush(self):
+        """Emit the current snapshot as a 'snapshot' event."""
+        self.event("snapshot", **self.snapshot())
+
+
+class JsonlSink:
+    """Appends one JSON object per event to a file."""
+
+    def __init__(self, path):
+        self._file = open(path, "a")
+
+    def emit(self, record):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ListSink:
+    """Keeps events in memory (handy in notebooks)."""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def print_event(name, fields):
+    """Callback that prints events in the old `[bot] ...` debug style."""
+    if name == "decision":
+        parts = [f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in fields.items()]
+        print("    [bot] " + " ".join(parts), flush=True)
+    else:
+        print(f"    [bot] {name} {fields}", flush=True)
+
+
+def debug_profiler():
+    """Profiler used for `debug=True` calls when no profiler is attached."""
+    return SolverProfiler(callback=print_event)
@@ -0,0 +1,288 @@
+"""
+Bulk regret analysis of logged games against the DP oracle.
+
+For every logged decision (keep mask at rolls_left 2/1, category at 0) the
+oracle's EV of the chosen action is compared with the EV of its best action.
+The difference is the decision's EV loss. Losses are aggregated by turn
+number, chosen category and decision type.
+
+Decisions are read in blocks and grouped by turn-start state
+(avail_mask, upper_total, y_bonus), so every state is solved once (one turn
+widget, see DynamicProgrammingBot._turn_widget) and all decisions sharing it
+are lookups. With --dp-table the oracle reads future EVs from the value table
+instead of solving them recursively.
+
+Logged games are JSON lines as written by `evaluate.py --log-games`
+(or binary .yzr records, see game_record.py):
+
+    {"start_sheet": {...} or null, "turns": [
+        {"rolls": [[dice], [dice after reroll 1], ...], "masks": [m1, m2], "category": "sixes"},
+        ...]}
+
+masks[i] is the reroll mask chosen on rolls[i] (bit i = reroll die i of the
+sorted dice); a 0 mask means "stop rolling".
+
+    python regret.py games.jsonl --out decisions.csv
+    python regret.py games.jsonl --dp-table yahtzee_value_table.npy --json regret.json
+"""
+import argparse
+import csv
+import json
+import time
+
+from dynamic_programming import DynamicProgrammingBot
+from evaluate import CATS, score_category_with_joker
+from tables import N_MASKS
+
+DECISION_FIELDS = [
+    "game", "turn", "n_open", "kind", "dice", "action", "best_action",
+    "category", "chosen_ev", "best_ev", "loss",
+]
+
+#-----------------------------
+# INPUT
+#-----------------------------
+
+def iter_logged_games(path):
+    """JSON lines, or binary game records (game_record.py) for .yzr paths."""
+    if path.endswith(".yzr"):
+        from game_record import iter_games
+        yield from iter_games(path)
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_decisions(games):
+    """Flatten games into decision dicts (dice sorted, sheet as seen at decision time)."""
+    for game_idx, game in enumerate(games):
+        start = game.get("start_sheet")
+        sheet = dict(start) if start else {c: None for c in CATS}
+
+        for turn_idx, turn in enumerate(game["turns"]):
+            rolls = [sorted(r) for r in turn["rolls"]]
+            category = turn["category"]
+            turn_sheet = dict(sheet)
+            n_open = sum(v is None for v in turn_sheet.values())
+
+            for i, mask in enumerate(turn["masks"]):
+                yield {
+                    "game": game.get("game_id", game_idx), "turn": turn_idx, "n_open": n_open,
+                    "kind": f"keep{2 - i}", "rolls_left": 2 - i, "dice": rolls[i],
+                    "action": int(mask), "category": category, "sheet": turn_sheet,
+                }
+
+            final_dice = rolls[-1]
+            yield {
+                "game": game.get("game_id", game_idx), "turn": turn_idx, "n_open": n_open,
+                "kind": "category", "rolls_left": 0, "dice": final_dice,
+                "action": category, "category": category, "sheet": turn_sheet,
+            }
+
+            pts, _ = score_category_with_joker(final_dice, category, sheet)
+            sheet[category] = pts
+
+#-----------------------------
+# ORACLE LOOKUPS
+#-----------------------------
+
+class _StateContext:
+    """Oracle lookups for one turn-start state, from its turn widget."""
+
+    def __init__(self, oracle, sheet):
+        self.oracle = oracle
+        self.sheet = sheet
+        self.rules = oracle._rules
+        self.avail_mask = oracle._make_avail_mask(sheet)
+        self.upper_total = oracle._get_upper_total(sheet)
+        self.y_bonus = (sheet.get("yahtzee") == self.rules.yahtzee_score)
+        self.widget = oracle._turn_widget(self.avail_mask, self.upper_total, self.y_bonus)
+        self._category_values = {}
+
+    def keep_values(self, dice_t, rolls_left):
+        """EV for all N_MASKS reroll masks (mask 0 = score now)."""
+        w = self.widget
+        sid = self.oracle._state_to_id[dice_t]
+        vals = w.keep_ev[rolls_left - 1][w.keep_by_mask[sid]].tolist()
+        vals[0] = float(w.ev[0][sid])
+        return vals
+
+    def category_value(self, dice_t, category):
+        """Immediate points + bonus + future EV of scoring `category`, scored like the harness."""
+        key = (dice_t, category)
+        val = self._category_values.get(key)
+        if val is None:
+            o = self.oracle
+            pts, bonus100 = score_category_with_joker(list(dice_t), category, self.sheet)
+            ci = o._cat_to_idx[category]
+            new_upper = self.upper_total
+            if o._upper_mask & (1 << ci):
+                new_upper = min(self.rules.upper_bonus_threshold, new_upper + pts)
+            new_y_bonus = self.y_bonus or (category == "yahtzee" and pts == self.rules.yahtzee_score)
+            future = o._future_ev(self.avail_mask & ~(1 << ci), new_upper, new_y_bonus)
+            val = pts + bonus100 + future
+            self._category_values[key] = val
+        return val
+
+    def best_category(self, dice_t):
+        sid = self.oracle._state_to_id[dice_t]
+        return self.widget.category[sid], float(self.widget.ev[0][sid])
+
+
+def _score_decision(ctx, d):
+    dice_t = tuple(d["dice"])
+    if d["kind"] == "category":
+        best_cat, best_ev = ctx.best_category(dice_t)
+        chosen = d["action"]
+        if chosen is None or ctx.sheet.get(chosen) is not None:
+            chosen = next(c for c in CATS if ctx.sheet[c] is None)
+        chosen_ev = ctx.category_value(dice_t, chosen)
+        best_action = best_cat
+    else:
+        vals = ctx.keep_values(dice_t, d["rolls_left"])
+        best_action = max(range(N_MASKS), key=vals.__getitem__)
+        best_ev = vals[best_action]
+        chosen_ev = vals[d["action"]]
+    return chosen_ev, best_ev, best_action
+
+#-----------------------------
+# AGGREGATION
+#-----------------------------
+
+class RegretSummary:
+    """EV loss totals by decision type, turn number and chosen category."""
+
+    DIMENSIONS = ("kind", "turn", "category")
+
+    def __init__(self, mistake_eps=1e-9):
+        self.mistake_eps = mistake_eps
+        self.n = 0
+        self.total_loss = 0.0
+        self.by = {dim: {} for dim in self.DIMENSIONS}
+
+    def add(self, decision, loss):
+        self.n += 1
+        self.total_loss += loss
+        for dim in self.DIMENSIONS:
+            agg = self.by[dim].setdefault(decision[dim], [0, 0.0, 0])  # n, loss, mistakes
+            agg[0] += 1
+            agg[1] += loss
+            if loss > self.mistake_eps:
+                agg[2] += 1
+
+    def to_dict(self):
+        out = {"n_decisions": self.n, "total_loss": self.total_loss, "by": {}}
+        for dim, groups in self.by.items():
+            out["by"][dim] = {
+                str(k): {"n": n, "loss": loss, "mean_loss": loss / n, "mistakes": mistakes}
+                for k, (n, loss, mistakes) in sorted(groups.items(), key=lambda kv: str(kv[0]))
+            }
+        return out
+
+    def report(self):
+        lines = [f"{self.n} decisions, total EV loss {self.total_loss:.2f}"]
+        for dim, groups in self.by.items():
+            lines.append("")
+            lines.append(f"by {dim}:")
+            lines.append(f"  {'':<12} {'n':>9} {'loss':>10} {'mean':>8} {'mistakes':>9}")
+            for k, (n, loss, mistakes) in sorted(groups.items(), key=lambda kv: str(kv[0])):
+                lines.append(f"  {str(k):<12} {n:>9} {loss:>10.2f} {loss / n:>8.3f} {mistakes:>9}")
+        return "\n".join(lines)
+
+#-----------------------------
+# DRIVER
+#-----------------------------
+
+def _state_key(oracle, sheet):
+    return (oracle._make_avail_mask(sheet), oracle._get_upper_total(sheet),
+            sheet.get("yahtzee") == oracle._rules.yahtzee_score)
+
+
+def analyze_regret(games, oracle=None, block_size=100_000, on_decision=None, progress=False):
+    """
+    games: iterable of logged-game dicts.
+    oracle: DynamicProgrammingBot to score against (default: no value table;
+    pass one built with a value table for fresh games).
+    on_decision: optional callable(row_dict) receiving every scored decision.
+    Returns a RegretSummary.
+    """
+    oracle = oracle or DynamicProgrammingBot()
+    summary = RegretSummary()
+    t0 = time.perf_counter()
+
+    def flush(block):
+        groups = {}
+        for d in block:
+            groups.setdefault(_state_key(oracle, d["sheet"]), []).append(d)
+
+        for decisions in groups.values():
+            ctx = _StateContext(oracle, decisions[0]["sheet"])
+            for d in decisions:
+                chosen_ev, best_ev, best_action = _score_decision(ctx, d)
+                loss = max(best_ev - chosen_ev, 0.0)
+                summary.add(d, loss)
+                if on_decision is not None:
+                    on_decision({
+                        "game": d["game"], "turn": d["turn"], "n_open": d["n_open"],
+                        "kind": d["kind"], "dice": "".join(map(str, d["dice"])),
+                        "action": d["action"], "best_action": best_action,
+                        "category": d["category"], "chosen_ev": chosen_ev,
+                        "best_ev": best_ev, "loss": loss,
+                    })
+        if progress:
+            print(f"  {summary.n} decisions, {len(groups)} states in block "
+                  f"(elapsed {time.perf_counter() - t0:.1f}s)", flush=True)
+
+    block = []
+    for d in iter_decisions(games):
+        block.append(d)
+        if len(block) >= block_size:
+            flush(block)
+            block = []
+    if block:
+        flush(block)
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EV loss of logged games against the DP oracle.")
+    parser.add_argument("games", help="JSON lines of logged games (evaluate.py --log-games)")
+    parser.add_argument("--out", default=None, help="per-decision CSV")
+    parser.add_argument("--json", default=None, help="write aggregated summary JSON here")
+    parser.add_argument("--block-size", type=int, default=100_000)
+    parser.add_argument("--dp-table", default=None, help="DP value table for the oracle (.npy or packed .npz)")
+    args = parser.parse_args(argv)
+
+    value_table = None
+    if args.dp_table:
+        from tables import load_value_table
+        value_table = load_value_table(args.dp_table)
+
+    out_file = open(args.out, "w", newline="") if args.out else None
+    writer = None
+    if out_file is not None:
+        writer = csv.DictWriter(out_file, fieldnames=DECISION_FIELDS)
+        writer.writeheader()
+
+    summary = analyze_regret(
+        iter_logged_games(args.games),
+        oracle=DynamicProgrammingBot(value_table=value_table),
+        block_size=args.block_size,
+        on_decision=writer.writerow if writer else None,
+        progress=True,
+    )
+
+    if out_file is not None:
+        out_file.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary.to_dict(), f, indent=2)
+    print(summary.report())
+
+
+if __name__ == "__main__":
+    main()
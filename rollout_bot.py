@@ -0,0 +1,360 @@
+"""
+Time-budgeted Monte Carlo rollout bot.
+
+For states (or rule variants) with no value table: every candidate action at
+the current decision point (distinct keeps, or legal categories) is scored by
+playing the rest of the game with a fast default policy (GreedyBot by default,
+or any evaluate.make_bot name, e.g. "lookahead-greedy" with a value table).
+
+  common random numbers  rollout i uses the same dice for every candidate, so
+                         candidates are compared on paired differences
+  successive halving     the budget is split into rounds; after each round the
+                         worse half of the candidates is dropped, and the
+                         survivors get the next round's rollouts
+  process pool           each round is spread over the workers; every worker
+                         plays rollouts until the round's deadline
+
+    bot = RolloutBot(policy="greedy", budget_ms=200, workers=4)
+    decision = bot.decide([1, 3, 3, 5, 6], rolls_left=2, score_sheet=sheet)
+    decision.action, decision.candidates[0]["ci95"]
+    bot.close()
+
+RolloutBot also has the usual choose_best_keep / choose_best_category, so the
+harness can play it (evaluate.py --bots rollout, in-process rollouts).
+
+    python rollout_bot.py --dice 1 3 3 5 6 --rolls-left 2 --budget-ms 500 --workers 4
+"""
+import argparse
+import json
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from evaluate import (
+    CATS, LOWER_CATS, is_yahtzee_roll, make_roll_table,
+    apply_reroll_by_mask, score_category_with_joker, play_small_game, final_total, make_bot,
+)
+from rules import STANDARD_RULES, categories, upper_categories
+
+DEFAULT_BUDGET_MS = 200.0
+Z95 = 1.96
+
+# rollout ids of different workers in one round never overlap
+_ID_STRIDE = 1 << 32
+
+# action: keep mask or category; candidates: per-candidate stats, best first
+RolloutDecision = namedtuple(
+    "RolloutDecision", ["action", "kind", "candidates", "n_rollouts", "rounds", "elapsed_ms"]
+)
+
+#-----------------------------
+# CANDIDATES
+#-----------------------------
+
+def keep_candidates(dice, rules=STANDARD_RULES):
+    """One reroll mask per distinct kept multiset (smallest mask wins, so 0 = stop is first)."""
+    dice = sorted(dice)
+    seen = {}
+    for mask in range(1 << rules.n_dice):
+        kept = tuple(d for i, d in enumerate(dice) if not (mask >> i) & 1)
+        seen.setdefault(kept, mask)
+    return sorted(seen.values())
+
+
+def legal_categories(dice, score_sheet, rules=STANDARD_RULES):
+    """Open categories the Joker rules allow for these dice (see score_category_with_joker)."""
+    open_cats = [c for c in categories(rules) if score_sheet[c] is None]
+    dice = sorted(dice)
+    if not (is_yahtzee_roll(dice) and score_sheet.get("yahtzee") == rules.yahtzee_score):
+        return open_cats
+    forced_upper = {face: c for c, face in upper_categories(rules).items()}[dice[0]]
+    if score_sheet[forced_upper] is None:
+        return [forced_upper]
+    lower_open = [c for c in open_cats if c in LOWER_CATS]
+    return lower_open or open_cats
+
+#-----------------------------
+# ROLLOUTS (run in pool workers)
+#-----------------------------
+
+_worker = {}
+
+
+def _init_worker(policy, ml_model_path=None, shared_descriptor=None, rules=STANDARD_RULES):
+    _worker.clear()
+    value_table = None
+    if shared_descriptor is not None:
+        from shared_tables import SharedTables
+        _worker["shared"] = SharedTables.attach(shared_descriptor, rules)
+        value_table = _worker["shared"].value_table
+    _worker["policy"] = make_bot(policy, ml_model_path, value_table, rules)
+
+
+def _play_out(policy, kind, action, dice, rolls_left, sheet, turn_rolls, rest_table, rules):
+    """Final score after taking `action` now and playing the rest with `policy`."""
+    sheet = dict(sheet)
+    dice = sorted(dice)
+    if kind == "keep":
+        mask, r, i = action, rolls_left, 0
+        while mask:
+            dice = apply_reroll_by_mask(dice, mask, turn_rolls[i])
+            i += 1
+            r -= 1
+            mask = policy.choose_best_keep(dice, r, sheet) if r > 0 else 0
+        choice = policy.choose_best_category(dice, sheet)
+        if choice is None or sheet.get(choice) is not None:
+            choice = next(c for c in sheet if sheet[c] is None)
+    else:
+        choice = action
+
+    pts, bonus100 = score_category_with_joker(dice, choice, sheet, rules)
+    sheet[choice] = pts
+    if len(rest_table) == 0:
+        return final_total(sheet, 0, rules) + bonus100
+    total, _, _ = play_small_game(policy, sheet, rest_table, rules=rules)
+    return total + bonus100
+
+
+def _rollout_task(kind, candidates, dice, rolls_left, sheet, seed_key, first_id, max_rollouts,
+                  deadline, rules=STANDARD_RULES, policy=None):
+    """
+    Rollouts first_id, first_id + 1, ... for every candidate, until `deadline`
+    (time.time()) or max_rollouts; at least one. Returns (ids, scores (C, n)).
+    policy defaults to the pool worker's.
+    """
+    policy = policy or _worker["policy"]
+    n_rest = sum(v is None for v in sheet.values()) - 1
+    ids, columns = [], []
+    while len(ids) < max_rollouts and (not ids or time.time() < deadline):
+        rid = first_id + len(ids)
+        rng = np.random.default_rng(np.random.SeedSequence([*seed_key, rid]))
+        turn_rolls = rng.integers(1, rules.n_faces + 1, size=(rules.n_rerolls, rules.n_dice))
+        rest_table = make_roll_table(rng, n_rest, rules)
+        columns.append([
+            _play_out(policy, kind, a, dice, rolls_left, sheet, turn_rolls, rest_table, rules)
+            for a in candidates
+        ])
+        ids.append(rid)
+    return np.array(ids), np.array(columns, dtype=np.float64).T
+
+#-----------------------------
+# BOT
+#-----------------------------
+
+class RolloutBot:
+    def __init__(self, policy="greedy", budget_ms=DEFAULT_BUDGET_MS, workers=None,
+                 value_table=None, ml_model_path=None, seed=0, round_rollouts=None,
+                 rules=STANDARD_RULES):
+        """
+        policy: evaluate.make_bot name of the default (rollout) policy; it must
+            play `rules` (see evaluate.make_bot).
+        budget_ms: wall-clock time per decision.
+        workers: pool size (default: all CPUs); 0 plays rollouts in this process.
+        value_table: passed to the policy (shared with the workers via shared memory).
+        round_rollouts: optional cap on rollouts per round, and a single final
+            round; with a generous budget, decisions are then reproducible.
+        rules: rules.Rules the game is played under (default standard Yahtzee).
+        """
+        self.policy = policy
+        self.rules = rules
+        self.budget_ms = budget_ms
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.seed = seed
+        self.round_rollouts = round_rollouts
+        self.last_decision = None
+        self._n_decisions = 0
+        self._shared = None
+        self._pool = None
+        self._policy = None
+
+        if self.workers == 0:
+            self._policy = make_bot(policy, ml_model_path, value_table, rules)
+            return
+        descriptor = None
+        if value_table is not None:
+            from shared_tables import SharedTables
+            self._shared = SharedTables.create(value_table, include_static=False, rules=rules)
+            descriptor = self._shared.descriptor
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(policy, ml_model_path, descriptor, rules),
+        )
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- search
+
+    def _run_round(self, kind, alive, dice, rolls_left, sheet, seed_key, round_i, deadline, cap):
+        args = (kind, alive, dice, rolls_left, sheet, seed_key)
+        base = round_i * _ID_STRIDE * max(1, self.workers)
+        if self._pool is None:
+            return _rollout_task(*args, base, cap, deadline, self.rules, self._policy)
+        n_tasks = min(self.workers, cap)
+        per_task = math.ceil(cap / n_tasks)
+        futures = [self._pool.submit(_rollout_task, *args, base + w * _ID_STRIDE, per_task, deadline,
+                                     self.rules)
+                   for w in range(n_tasks)]
+        parts = [f.result() for f in futures]
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts], axis=1)
+
+    def decide(self, dice, rolls_left, score_sheet, budget_ms=None):
+        """Best action for this decision point, with per-candidate stats. Returns a RolloutDecision."""
+        t0 = time.time()
+        deadline = t0 + (self.budget_ms if budget_ms is None else budget_ms) / 1000.0
+        dice = sorted(int(d) for d in dice)
+        if rolls_left > 0:
+            kind, candidates = "keep", keep_candidates(dice, self.rules)
+        else:
+            kind, candidates = "category", legal_categories(dice, score_sheet, self.rules)
+        seed_key = (self.seed, self._n_decisions)
+        self._n_decisions += 1
+
+        scores = {a: [] for a in candidates}
+        alive = list(candidates)
+        cap = self.round_rollouts or 1 << 30
+        rounds = 0
+        n_total = 0
+        while len(alive) > 1:
+            now = time.time()
+            if now >= deadline and rounds > 0:
+                break
+            if len(alive) > 2:
+                # halving: the rest of the budget is split evenly over the rounds
+                # needed to get down to two candidates, plus a final one
+                round_deadline = now + (deadline - now) / math.ceil(math.log2(len(alive)))
+            else:
+                # final pair: refine in slices until the budget is spent or one is clearly better
+                round_deadline = now + max((deadline - now) / 2, min(deadline - now, 0.005))
+            _, s = self._run_round(kind, alive, dice, rolls_left, score_sheet,
+                                   seed_key, rounds, round_deadline, cap)
+            for a, row in zip(alive, s):
+                scores[a].extend(row.tolist())
+            n_total += s.size
+            rounds += 1
+
+            if len(alive) > 2:
+                alive = sorted(alive, key=lambda a: -np.mean(scores[a]))[:math.ceil(len(alive) / 2)]
+            elif self.round_rollouts or self._clearly_best(scores, alive):
+                break
+
+        stats = self._candidate_stats(scores, candidates, alive)
+        decision = RolloutDecision(
+            stats[0]["action"], kind, stats, n_total, rounds, (time.time() - t0) * 1000.0
+        )
+        self.last_decision = decision
+        return decision
+
+    @staticmethod
+    def _clearly_best(scores, alive):
+        """The leader's paired lead over every other survivor is significant."""
+        leader = max(alive, key=lambda a: np.mean(scores[a]))
+        lead = np.asarray(scores[leader])
+        for a in alive:
+            if a == leader:
+                continue
+            diff = lead - np.asarray(scores[a])
+            if len(diff) < 2 or diff.mean() - Z95 * diff.std(ddof=1) / math.sqrt(len(diff)) <= 0:
+                return False
+        return True
+
+    @staticmethod
+    def _candidate_stats(scores, candidates, alive):
+        """
+        Per candidate: rollouts n, mean and its 95% CI half-width, and the
+        paired gap to the best survivor (over the rollouts both played) with
+        its CI. Survivors first, then by how long a candidate survived.
+        """
+        def mean(a):
+            return float(np.mean(scores[a])) if scores[a] else float("-inf")
+
+        ranked = sorted(candidates, key=lambda a: (a not in alive, -len(scores[a]), -mean(a)))
+        best = np.asarray(scores[ranked[0]])
+        out = []
+        for a in ranked:
+            s = np.asarray(scores[a])
+            n = len(s)
+            row = {"action": a, "n": n, "mean": mean(a), "ci95": float("nan"),
+                   "gap": 0.0, "gap_ci95": 0.0}
+            if n >= 2:
+                row["ci95"] = float(Z95 * s.std(ddof=1) / math.sqrt(n))
+            if a != ranked[0] and n:
+                diff = best[:n] - s
+                row["gap"] = float(diff.mean())
+                row["gap_ci95"] = float(Z95 * diff.std(ddof=1) / math.sqrt(n)) if n >= 2 else float("nan")
+            out.append(row)
+        return out
+
+    # --- bot interface
+
+    def choose_best_keep(self, dice, rolls_left, score_sheet):
+        if rolls_left == 0:
+            return 0
+        return self.decide(dice, rolls_left, score_sheet).action
+
+    def choose_best_category(self, dice, score_sheet):
+        return self.decide(dice, 0, score_sheet).action
+
+    def cache_info(self):
+        # pool workers keep their own policy caches; only in-process ones are visible
+        return self._policy.cache_info() if self._policy is not None else {}
+
+    def reset_cache(self):
+        if self._policy is not None:
+            self._policy.reset_cache()
+
+    def decide_game(self, game, rolls_left):
+        """decide() from a YahtzeeGame's current dice and score sheet."""
+        return self.decide(game.dice, rolls_left, game.score_sheet)
+
+#-----------------------------
+# DRIVER
+#-----------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo rollout decision for one Yahtzee state.")
+    parser.add_argument("--dice", nargs=5, type=int, required=True)
+    parser.add_argument("--rolls-left", type=int, default=2, choices=(0, 1, 2))
+    parser.add_argument("--sheet", default=None, help="score sheet as JSON (default: fresh game)")
+    parser.add_argument("--policy", default="greedy", help="rollout policy (evaluate.make_bot name)")
+    parser.add_argument("--dp-table", default=None, help="value table for table-based policies")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sheet = json.loads(args.sheet) if args.sheet else {c: None for c in CATS}
+    value_table = None
+    if args.dp_table:
+        from tables import load_value_table
+        value_table = load_value_table(args.dp_table)
+
+    with RolloutBot(args.policy, args.budget_ms, args.workers, value_table, seed=args.seed) as bot:
+        bot.decide(args.dice, args.rolls_left, sheet, budget_ms=args.budget_ms)   # warm the workers
+        d = bot.decide(args.dice, args.rolls_left, sheet)
+
+    fmt = (lambda a: f"{a:05b}") if d.kind == "keep" else str
+    print(f"{d.kind}: {fmt(d.action)}  ({d.n_rollouts} rollouts, {d.rounds} rounds, {d.elapsed_ms:.0f} ms)")
+    print(f"{'action':>12} {'n':>6} {'mean':>8} {'+/-95%':>7} {'gap':>7} {'+/-95%':>7}")
+    for c in d.candidates:
+        print(f"{fmt(c['action']):>12} {c['n']:>6} {c['mean']:>8.2f} {c['ci95']:>7.2f} "
+              f"{c['gap']:>7.2f} {c['gap_ci95']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Rules configuration for house-rule variants.
+
+Everything rules-dependent (dice states, transitions, score tables, bonuses,
+the number of rerolls) is generated from one Rules value: tables.StaticTables,
+tables.build_value_table, DynamicProgrammingBot, GreedyBot and the
+evaluate.py game engine all take `rules=` and default to STANDARD_RULES.
+
+    from rules import Rules
+    from tables import get_static_tables, build_value_table
+
+    six_dice = Rules(n_dice=6, n_rerolls=3)
+    tables = get_static_tables(six_dice)     # 462 dice states, 924 keeps, 64 masks
+    V = build_value_table(rules=six_dice)
+
+Generalized scoring for n dice: full house = one face at least three times
+plus a different face at least twice, small straight = a run of n - 1
+consecutive faces, large straight = a run of n. With the standard rules this
+is exactly utils.calculate_score.
+"""
+from collections import namedtuple
+
+UPPER_NAMES = (
+    "aces", "twos", "threes", "fours", "fives", "sixes",
+    "sevens", "eights", "nines", "tens", "elevens", "twelves",
+)
+LOWER_CATEGORIES = (
+    "threekind", "fourkind", "fullhouse", "smstraight", "lgstraight", "yahtzee", "chance",
+)
+
+Rules = namedtuple(
+    "Rules",
+    [
+        "n_dice", "n_faces", "n_rerolls",
+        "upper_bonus_threshold", "upper_bonus",
+        "yahtzee_score", "yahtzee_bonus",
+        "fullhouse_score", "smstraight_score", "lgstraight_score",
+    ],
+    defaults=(5, 6, 2, 63, 35, 50, 100, 25, 30, 40),
+)
+
+STANDARD_RULES = Rules()
+
+
+def check_rules(rules):
+    """Raise ValueError for configs the tables cannot represent."""
+    if not 1 <= rules.n_faces <= len(UPPER_NAMES):
+        raise ValueError(f"n_faces must be 1..{len(UPPER_NAMES)}")
+    if rules.n_dice < 2:
+        raise ValueError("n_dice must be at least 2")
+    if rules.n_rerolls < 1:
+        raise ValueError("n_rerolls must be at least 1")
+    if rules.upper_bonus_threshold < 1:
+        raise ValueError("upper_bonus_threshold must be positive")
+    return rules
+
+
+def categories(rules=STANDARD_RULES):
+    """Score sheet order: one upper category per face, then the lower section."""
+    return UPPER_NAMES[:rules.n_faces] + LOWER_CATEGORIES
+
+
+def upper_categories(rules=STANDARD_RULES):
+    """{upper category: face}"""
+    return {name: face for face, name in enumerate(UPPER_NAMES[:rules.n_faces], start=1)}
+
+
+def _longest_run(faces):
+    best = run = 0
+    prev = None
+    for f in sorted(faces):
+        run = run + 1 if prev is not None and f == prev + 1 else 1
+        best = max(best, run)
+        prev = f
+    return best
+
+
+def score(dice, category, rules=STANDARD_RULES):
+    """Standard (non-joker) category score of `dice` under `rules`."""
+    faces = upper_categories(rules)
+    if category in faces:
+        n = faces[category]
+        return sum(d for d in dice if d == n)
+
+    s = sum(dice)
+    counts = sorted((list(dice).count(d) for d in set(dice)), reverse=True)
+
+    if category == "threekind":
+        return s if counts[0] >= 3 else 0
+    if category == "fourkind":
+        return s if counts[0] >= 4 else 0
+    if category == "fullhouse":
+        return rules.fullhouse_score if len(counts) >= 2 and counts[0] >= 3 and counts[1] >= 2 else 0
+    if category == "smstraight":
+        return rules.smstraight_score if _longest_run(set(dice)) >= rules.n_dice - 1 else 0
+    if category == "lgstraight":
+        return rules.lgstraight_score if _longest_run(set(dice)) >= rules.n_dice else 0
+    if category == "yahtzee":
+        return rules.yahtzee_score if len(counts) == 1 else 0
+    if category == "chance":
+        return s
+
+    raise ValueError(f"Unknown category: {category}")
+
+#-----------------------------
+# CLI
+#-----------------------------
+
+def add_rules_arguments(parser):
+    """--dice, --faces, --rerolls, --upper-threshold, --upper-bonus, --yahtzee-bonus."""
+    d = STANDARD_RULES
+    group = parser.add_argument_group("rules")
+    group.add_argument("--dice", type=int, default=d.n_dice)
+    group.add_argument("--faces", type=int, default=d.n_faces)
+    group.add_argument("--rerolls", type=int, default=d.n_rerolls)
+    group.add_argument("--upper-threshold", type=int, default=d.upper_bonus_threshold)
+    group.add_argument("--upper-bonus", type=int, default=d.upper_bonus)
+    group.add_argument("--yahtzee-bonus", type=int, default=d.yahtzee_bonus)
+    return group
+
+
+def rules_from_args(args):
+    return check_rules(Rules(
+        n_dice=args.dice, n_faces=args.faces, n_rerolls=args.rerolls,
+        upper_bonus_threshold=args.upper_threshold, upper_bonus=args.upper_bonus,
+        yahtzee_bonus=args.yahtzee_bonus,
+    ))
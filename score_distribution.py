@@ -0,0 +1,488 @@
+"""
+Final-score distributions instead of expectations.
+
+Two solvers, both layered (one more category filled per layer) so only the
+distributions of one layer and its successor layer are held at a time:
+
+  policy_score_distribution   the full distribution of the final score of a
+                              fixed deterministic bot (same forward pass as
+                              policy_eval.evaluate_policy_exact)
+  solve_threshold_table       the policy maximizing P(final score >= threshold):
+                              P(at least `need` more points) for every reachable
+                              state and need, solved in batched widgets over a
+                              process pool (as win_probability), persisted as .npz
+
+Distributions are truncated probability vectors: ScoreDistribution holds the
+pmf over [offset, offset + len(pmf)), and tails with mass below `eps` are
+pruned after every state, so vectors stay short. Successors are combined by
+convolving the turn's gain distribution with the successor's distribution
+(numpy FFT when the product of lengths is large, direct otherwise).
+
+    from score_distribution import policy_score_distribution, max_threshold_probability, ThresholdBot
+
+    dist = policy_score_distribution(bot, score_sheet)
+    dist.mean(), dist.quantile(0.9), dist.p_at_least(300)
+
+    max_threshold_probability(300, score_sheet)["p"]
+
+    bot = ThresholdBot(300, workers=4, table_dir="threshold_tables")
+    bot.choose_best_keep(dice, 2, score_sheet)
+    bot.choose_best_category(dice, score_sheet)
+    bot.probability(score_sheet)
+
+The threshold solver carries a vector over the points still needed in every
+state, which makes each turn widget ~threshold times more expensive than the
+EV solve: it is meant for late-game sheets (a handful of open categories).
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from evaluate import CATS, UPPER_CATS
+from policy_eval import policy_layers, reads_raw_upper_total, sheet_to_state, _turn_outcomes
+from tables import get_static_tables, category_outcomes, solve_rerolls
+
+DEFAULT_EPS = 1e-12
+
+# direct convolution below this many multiply-adds, FFT above
+_FFT_MIN_WORK = 1 << 15
+
+#-----------------------------
+# DISTRIBUTIONS
+#-----------------------------
+
+class ScoreDistribution:
+    """Truncated pmf of an integer score: P(score = offset + i) = pmf[i]."""
+
+    def __init__(self, offset, pmf):
+        self.offset = int(offset)
+        self.pmf = np.asarray(pmf, dtype=np.float64)
+
+    @property
+    def scores(self):
+        return np.arange(self.offset, self.offset + len(self.pmf))
+
+    @property
+    def mass(self):
+        """Total probability kept; 1 - mass is what eps-pruning dropped."""
+        return float(self.pmf.sum())
+
+    def mean(self):
+        return float(self.pmf @ self.scores) / self.mass
+
+    def std(self):
+        m = self.mean()
+        return float(np.sqrt(self.pmf @ (self.scores - m) ** 2 / self.mass))
+
+    def quantile(self, q):
+        cdf = np.cumsum(self.pmf) / self.mass
+        return int(self.offset + np.searchsorted(cdf, q))
+
+    def p_at_least(self, score):
+        i = max(0, score - self.offset)
+        return float(self.pmf[i:].sum())
+
+    def to_dict(self):
+        return {
+            "offset": self.offset, "pmf": self.pmf.tolist(),
+            "mean": self.mean(), "std": self.std(), "mass": self.mass,
+        }
+
+
+def _convolve(a, b):
+    if len(a) * len(b) < _FFT_MIN_WORK:
+        return np.convolve(a, b)
+    n = len(a) + len(b) - 1
+    size = 1 << (n - 1).bit_length()
+    out = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)[:n]
+    return np.maximum(out, 0.0)   # FFT round-off can go slightly negative
+
+
+def _prune(offset, pmf, eps):
+    """Drop leading/trailing entries whose combined mass is below eps (half on each side)."""
+    if eps <= 0 or len(pmf) == 0:
+        return offset, pmf
+    cdf = np.cumsum(pmf)
+    lo = int(np.searchsorted(cdf, eps / 2, side="right"))
+    tail = cdf[-1] - cdf                       # mass after each entry
+    hi = len(pmf) + 1 - int(np.searchsorted(tail[::-1], eps / 2, side="right"))
+    hi = max(hi, lo + 1)
+    return offset + lo, pmf[lo:hi]
+
+#-----------------------------
+# FIXED POLICY
+#-----------------------------
+
+def _terminal_distribution(rules, upper_total):
+    return rules.upper_bonus if upper_total >= rules.upper_bonus_threshold else 0, np.ones(1)
+
+
+def policy_score_distribution(bot, score_sheet=None, eps=DEFAULT_EPS, progress=False):
+    """
+    Distribution of the final score of `bot` playing out `score_sheet`
+    (default: a fresh game). Scoring and fallbacks follow
+    evaluate.play_small_game, so the mean equals evaluate_policy_exact.
+    Returns a ScoreDistribution (with .n_states and .elapsed_s attributes).
+    """
+    tables = get_static_tables()
+    t0 = time.perf_counter()
+
+    if score_sheet is None:
+        score_sheet = {c: None for c in CATS}
+    cap_upper = not reads_raw_upper_total(bot)
+    root = sheet_to_state(score_sheet, cap_upper)
+    banked = sum(v for v in score_sheet.values() if v is not None)
+
+    # --- forward: per state, {next_state: (gain offset, gain pmf)}
+    gains = {}
+
+    def on_state(state, sheet, final, categories):
+        by_next = {}
+        for (nxt, pts, bonus100), p in _turn_outcomes(tables, state, sheet, final, categories, cap_upper).items():
+            by_next.setdefault(nxt, []).append((pts + bonus100, p))
+        packed = {}
+        for nxt, items in by_next.items():
+            g = np.array([g for g, _ in items])
+            lo = int(g.min())
+            pmf = np.zeros(int(g.max()) - lo + 1)
+            np.add.at(pmf, g - lo, [p for _, p in items])
+            packed[nxt] = (lo, pmf)
+        gains[state] = packed
+        return packed
+
+    layers, _ = policy_layers(bot, score_sheet, on_state, progress, cap_upper=cap_upper)
+
+    # --- backward: only the successor layer's distributions are kept
+    if not layers:
+        offset, pmf = _terminal_distribution(tables.rules, root[1])
+        dist = ScoreDistribution(banked + offset, pmf)
+        dist.n_states, dist.elapsed_s = 0, time.perf_counter() - t0
+        return dist
+
+    n_states = 0
+    below = {}
+    for layer in reversed(layers):
+        current = {}
+        for state in layer:
+            parts = []
+            for nxt, (g_lo, g_pmf) in gains.pop(state).items():
+                d_lo, d_pmf = below[nxt] if nxt[0] != 0 else _terminal_distribution(tables.rules, nxt[1])
+                parts.append((g_lo + d_lo, _convolve(g_pmf, d_pmf)))
+            lo = min(o for o, _ in parts)
+            hi = max(o + len(v) for o, v in parts)
+            pmf = np.zeros(hi - lo)
+            for o, v in parts:
+                pmf[o - lo:o - lo + len(v)] += v
+            current[state] = _prune(lo, pmf, eps)
+        n_states += len(layer)
+        below = current
+
+    offset, pmf = below[root]
+    dist = ScoreDistribution(banked + offset, pmf)
+    dist.n_states, dist.elapsed_s = n_states, time.perf_counter() - t0
+    return dist
+
+#-----------------------------
+# MAXIMIZE P(SCORE >= THRESHOLD)
+#-----------------------------
+
+# widget rows (states x need values) per solve_rerolls batch
+DEFAULT_BATCH_ROWS = 256
+
+
+def _successor_states(tables, state):
+    """Turn-start states one category later (upper totals capped at 63)."""
+    avail_mask, upper_total, y_bonus = state
+    yahtzee_ci = tables.cat_to_idx["yahtzee"]
+    face_of = {tables.cat_to_idx[c]: face for face, c in enumerate(UPPER_CATS, start=1)}
+    out = set()
+    for ci in range(tables.n_cat):
+        if not (avail_mask >> ci) & 1:
+            continue
+        nxt_mask = avail_mask & ~(1 << ci)
+        if ci in face_of:
+            for k in range(tables.n_dice + 1):
+                out.add((nxt_mask, min(tables.upper_cap, upper_total + face_of[ci] * k), y_bonus))
+        elif ci == yahtzee_ci:
+            out.add((nxt_mask, upper_total, y_bonus))
+            out.add((nxt_mask, upper_total, True))
+        else:
+            out.add((nxt_mask, upper_total, y_bonus))
+    return out
+
+
+def _row_index(tables, states):
+    """Dense int32 row index over (avail_mask, upper_total, y_bonus): i for states[i], -1 elsewhere."""
+    index = np.full((1 << tables.n_cat, tables.upper_cap + 1, 2), -1, dtype=np.int32)
+    if states:
+        m, u, y = np.array(states, dtype=np.int64).T
+        index[m, u, y] = np.arange(len(states), dtype=np.int32)
+    return index
+
+
+def _successor_rows(tables, states, row_index, bucket=1):
+    """
+    (legal, gain, row), each (B, S, C), for B turn-start states: whether the
+    category may be scored, the points it gains (Yahtzee bonus included; in
+    buckets of `bucket` points, rounded) and the successor's row in
+    `row_index` (see _row_index).
+    """
+    masks, uppers, y_bonus = zip(*states)
+    out = category_outcomes(tables, masks, uppers, y_bonus)
+    legal = out["legal"]
+    gain = out["pts"] + tables.rules.yahtzee_bonus * out["joker"][:, :, None]
+    if bucket != 1:
+        gain = np.rint(gain / bucket).astype(np.int64)
+    row = row_index[out["next_mask"][:, None, :], out["new_upper"], out["new_y"].astype(np.int64)]
+    return legal, gain, row
+
+
+def _threshold_widgets(tables, states, row_index, W_next, n_need, bucket=1):
+    """
+    P(reach need) at the start of each of `states` for need = 0..n_need-1,
+    playing optimally: (B, n_need). W_next[row_index[...]] gives the
+    successors' vectors. With bucket > 1 the need axis counts buckets of that
+    many points.
+    """
+    legal, gain, row = _successor_rows(tables, states, row_index, bucket)
+    need = np.arange(n_need)
+    ev0 = np.full(legal.shape[:2] + (n_need,), -1.0)                         # (B, S, N)
+    for c in range(legal.shape[2]):
+        rest = np.maximum(need[None, None, :] - gain[:, :, c, None], 0)
+        vals = W_next[np.maximum(row[:, :, c], 0)[:, :, None], rest]
+        np.maximum(ev0, np.where(legal[:, :, c, None], vals, -1.0), out=ev0)
+    ev, _, _ = solve_rerolls(tables, np.ascontiguousarray(ev0.transpose(0, 2, 1)))   # (R + 1, B, N, S)
+    return ev[-1] @ tables.first_roll
+
+
+def _threshold_widget(tables, state, row_index, W_next, n_need, bucket=1):
+    """_threshold_widgets for a single state: (n_need,)."""
+    return _threshold_widgets(tables, [state], row_index, W_next, n_need, bucket)[0]
+
+
+def _solve_states(states, row_index, W_next, n_need, batch_rows):
+    """W rows of `states`, in batches of about batch_rows widget rows."""
+    tables = get_static_tables()
+    per_batch = max(1, batch_rows // n_need)
+    out = np.empty((len(states), n_need))
+    for i in range(0, len(states), per_batch):
+        out[i:i + per_batch] = _threshold_widgets(tables, states[i:i + per_batch], row_index, W_next, n_need)
+    return out
+
+
+_attached = {}
+
+
+def _solve_chunk(states, descriptor, n_need, batch_rows):
+    """Pool task: attach the successor layer's table and row index (once per layer) and solve `states`."""
+    from shared_tables import SharedTables
+
+    key = descriptor["value_table"][0]
+    if key not in _attached:
+        for shared in _attached.values():
+            shared.close()
+        _attached.clear()
+        _attached[key] = SharedTables.attach(descriptor)
+    shared = _attached[key]
+    return _solve_states(states, shared["row_index"], shared.value_table, n_need, batch_rows)
+
+
+class ThresholdTable:
+    """
+    W[row, need] = max over policies of P(points still to come >= need) at the
+    start of every turn-start state reachable from a root sheet, for
+    need = 0..n_need-1. Includes the terminal states.
+    """
+
+    def __init__(self, states, W):
+        self.states = [tuple(s) for s in states]
+        self.rows = {s: i for i, s in enumerate(self.states)}
+        self.row_index = _row_index(get_static_tables(), self.states)
+        self.W = W
+
+    @property
+    def n_need(self):
+        return self.W.shape[1]
+
+    def covers(self, state, need):
+        return state in self.rows and need < self.n_need
+
+    def probability(self, state, need):
+        """P(at least `need` more points) from `state` (1 once need <= 0)."""
+        if need <= 0:
+            return 1.0
+        return float(self.W[self.rows[state], need])
+
+    def save(self, path):
+        np.savez(path, states=np.array(self.states, dtype=np.int64), W=self.W)
+
+
+def load_threshold_table(path):
+    with np.load(path) as f:
+        return ThresholdTable([(int(m), int(u), bool(y)) for m, u, y in f["states"]], f["W"])
+
+
+def solve_threshold_table(n_need, score_sheet=None, workers=0, chunk_size=64,
+                          batch_rows=DEFAULT_BATCH_ROWS, progress=False):
+    """
+    Backward induction over (avail_mask, upper_total capped at 63, y_bonus,
+    points still needed) for need = 0..n_need-1, from every state reachable
+    from `score_sheet` (default: a fresh game). Each layer is solved in
+    batched widgets; workers > 0 splits it over a process pool that shares the
+    successor layer's table through shared memory. Returns a ThresholdTable
+    (with .n_solved and .elapsed_s).
+    """
+    tables = get_static_tables()
+    rules = tables.rules
+    t0 = time.perf_counter()
+
+    if score_sheet is None:
+        score_sheet = {c: None for c in CATS}
+    root = sheet_to_state(score_sheet, cap_upper=True)
+
+    # --- forward: reachable states per layer (state tuples only)
+    layers = [[root]]
+    while layers[-1][0][0] != 0:
+        nxt = set()
+        for state in layers[-1]:
+            nxt |= _successor_states(tables, state)
+        layers.append(sorted(nxt))
+
+    # --- backward: W[row, need] = P(remaining points >= need); one layer in memory
+    terminal = layers.pop()
+    bonus = np.array([rules.upper_bonus if s[1] >= rules.upper_bonus_threshold else 0 for s in terminal])
+    W = (np.arange(n_need)[None, :] <= bonus[:, None]).astype(np.float64)
+    all_states, all_W = [terminal], [W]
+    row_index = _row_index(tables, terminal)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+    n_solved = 0
+    try:
+        for depth, layer in enumerate(reversed(layers)):
+            if pool is None:
+                W_layer = _solve_states(layer, row_index, W, n_need, batch_rows)
+            else:
+                from shared_tables import SharedTables
+                with SharedTables.create(W, include_static=False, arrays={"row_index": row_index}) as shared:
+                    chunks = [layer[i:i + chunk_size] for i in range(0, len(layer), chunk_size)]
+                    futures = [pool.submit(_solve_chunk, c, shared.descriptor, n_need, batch_rows)
+                               for c in chunks]
+                    W_layer = np.concatenate([f.result() for f in futures])
+            row_index = _row_index(tables, layer)
+            W = W_layer
+            all_states.append(layer)
+            all_W.append(W_layer)
+            n_solved += len(layer)
+            if progress:
+                print(f"  layer {depth + 1}: {len(layer)} states "
+                      f"(elapsed {time.perf_counter() - t0:.1f}s)", flush=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    table = ThresholdTable([s for layer in all_states for s in layer], np.concatenate(all_W))
+    table.n_solved, table.elapsed_s = n_solved, time.perf_counter() - t0
+    return table
+
+
+def max_threshold_probability(threshold, score_sheet=None, progress=False, workers=0):
+    """
+    max over policies of P(final score >= threshold) from `score_sheet`
+    (default: a fresh game); see solve_threshold_table.
+    Returns {"p", "threshold", "n_states", "elapsed_s"}.
+    """
+    if score_sheet is None:
+        score_sheet = {c: None for c in CATS}
+    need_root = threshold - sum(v for v in score_sheet.values() if v is not None)
+    if need_root <= 0:
+        return {"p": 1.0, "threshold": threshold, "n_states": 0, "elapsed_s": 0.0}
+
+    table = solve_threshold_table(need_root + 1, score_sheet, workers=workers, progress=progress)
+    return {
+        "p": table.probability(sheet_to_state(score_sheet, cap_upper=True), need_root),
+        "threshold": threshold,
+        "n_states": table.n_solved,
+        "elapsed_s": table.elapsed_s,
+    }
+
+#-----------------------------
+# BOT
+#-----------------------------
+
+class ThresholdBot:
+    def __init__(self, threshold, workers=0, table_dir=None):
+        """
+        threshold: final score to reach; every decision maximizes P(final >= threshold).
+        workers: processes per layer solve (0 = in-process).
+        table_dir: persist solved tables here, keyed by root state and need.
+        """
+        self.threshold = threshold
+        self.workers = workers
+        self.table_dir = table_dir
+        self._table = None
+        self._widgets = {}   # (state, need) -> _turn result, for the current table
+
+    def _need(self, score_sheet, score_bonus):
+        return self.threshold - sum(v for v in score_sheet.values() if v is not None) - score_bonus
+
+    def table(self, score_sheet, score_bonus=0):
+        """ThresholdTable covering this sheet's turn-start state at its current need."""
+        state = sheet_to_state(score_sheet, cap_upper=True)
+        need = self._need(score_sheet, score_bonus)
+        if self._table is not None and self._table.covers(state, need):
+            return self._table   # tables solved from an earlier sheet cover later ones
+
+        table, path = None, None
+        n_need = max(need, 0) + 1
+        if self.table_dir:
+            digest = hashlib.sha1(json.dumps([list(state), n_need]).encode())
+            path = os.path.join(self.table_dir, f"threshold_{digest.hexdigest()[:16]}.npz")
+            if os.path.exists(path):
+                table = load_threshold_table(path)
+        if table is None:
+            table = solve_threshold_table(n_need, score_sheet, self.workers)
+            if path is not None:
+                os.makedirs(self.table_dir, exist_ok=True)
+                table.save(path)
+        self._table = table
+        self._widgets = {}
+        return table
+
+    def probability(self, score_sheet, score_bonus=0):
+        """P(final >= threshold) at the start of the turn, playing this bot from here on."""
+        table = self.table(score_sheet, score_bonus)
+        return table.probability(sheet_to_state(score_sheet, cap_upper=True), self._need(score_sheet, score_bonus))
+
+    def _turn(self, score_sheet, score_bonus):
+        """(ev (3, S), masks (2, S), category per dice state) for this turn, at the current need."""
+        table = self.table(score_sheet, score_bonus)
+        state = sheet_to_state(score_sheet, cap_upper=True)
+        need = max(self._need(score_sheet, score_bonus), 0)
+        widget = self._widgets.get((state, need))
+        if widget is not None:
+            return widget
+
+        t = get_static_tables()
+        legal, gain, row = (a[0] for a in _successor_rows(t, [state], table.row_index))
+        vals = table.W[np.maximum(row, 0), np.maximum(need - gain, 0)]
+        vals[~legal] = -1.0
+
+        ev, _, masks = solve_rerolls(t, vals.max(axis=1))
+        category = [t.categories[c] for c in vals.argmax(axis=1)]
+        widget = self._widgets[(state, need)] = (ev, masks, category)
+        return widget
+
+    def choose_best_keep(self, dice, rolls_left, score_sheet, score_bonus=0):
+        if rolls_left == 0:
+            return 0
+        _, masks, _ = self._turn(score_sheet, score_bonus)
+        sid = get_static_tables().state_to_id[tuple(sorted(dice))]
+        return int(masks[1 if rolls_left >= 2 else 0][sid])
+
+    def choose_best_category(self, dice, score_sheet, score_bonus=0):
+        _, _, category = self._turn(score_sheet, score_bonus)
+        return category[get_static_tables().state_to_id[tuple(sorted(dice))]]
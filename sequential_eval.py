@@ -0,0 +1,283 @@
+"""
+Adaptive sequential evaluation.
+
+Instead of a fixed number of states per bot, play paired (common random
+number) games in parallel batches and stop each pairwise comparison as soon
+as it is decided. Bots that are far apart (DP vs ML) stop after a few hundred
+games; close pairs (DP vs Greedy on late-game states) keep running.
+
+After every batch each open pair is checked against a confidence interval on
+the mean paired difference (running Welford statistics):
+
+  a > b / a < b   the interval excludes 0
+  tie             the interval lies inside [-tolerance, tolerance]
+  undecided       max_games reached first
+
+Checking after every batch is repeated testing, so the interval is
+Bonferroni-corrected over all pairs and all possible looks: each check uses
+alpha / (n_pairs * max_looks). The overall error rate stays below alpha,
+conservatively. A bot stops playing once all of its pairs are decided.
+
+    python sequential_eval.py --bots greedy dp ml --mode small --alpha 0.05 --workers 8
+    python sequential_eval.py --bots dp lookahead-greedy --mode full --dp-table yahtzee_value_table.npy \\
+        --tolerance 0.5 --max-games 50000 --out seq.csv
+"""
+import argparse
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+
+from evaluate import (
+    BOT_NAMES, ResultWriter, check_run_options, play_chunk, _chunks, _init_worker,
+)
+from rules import STANDARD_RULES, add_rules_arguments, rules_from_args
+
+# decision per pair; mean / half_width are of a - b over n paired games
+PairResult = namedtuple("PairResult", ["a", "b", "n", "mean", "half_width", "decision"])
+
+
+class Welford:
+    """Running mean and variance (Welford's algorithm)."""
+
+    __slots__ = ("n", "mean", "_m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.n - 1) if self.n > 1 else float("inf")
+
+    def half_width(self, z):
+        """z * standard error of the mean."""
+        if self.n < 2:
+            return float("inf")
+        return z * math.sqrt(self.variance / self.n)
+
+
+def bonferroni_z(alpha, n_pairs, max_looks):
+    """Two-sided normal quantile for one check out of n_pairs * max_looks."""
+    return NormalDist().inv_cdf(1.0 - alpha / (2.0 * n_pairs * max_looks))
+
+
+def decide(stats, z, tolerance=0.0):
+    """'>', '<', 'tie', or None (keep playing) for the paired differences in stats."""
+    hw = stats.half_width(z)
+    if stats.mean - hw > 0:
+        return ">"
+    if stats.mean + hw < 0:
+        return "<"
+    if tolerance > 0 and abs(stats.mean) + hw <= tolerance:
+        return "tie"
+    return None
+
+
+class SequentialSummary:
+    """Per-bot score statistics and per-pair decisions of a sequential run."""
+
+    def __init__(self, bot_names, z, alpha):
+        self.bot_names = list(bot_names)
+        self.z = z
+        self.alpha = alpha
+        self.bots = {b: Welford() for b in self.bot_names}
+        self.pairs = {}
+        for i, a in enumerate(self.bot_names):
+            for b in self.bot_names[i + 1:]:
+                self.pairs[(a, b)] = Welford()
+        self.decisions = {}
+        self.games_played = 0
+        self.elapsed_s = 0.0
+
+    def open_pairs(self):
+        return [p for p in self.pairs if p not in self.decisions]
+
+    def active_bots(self):
+        active = {bot for pair in self.open_pairs() for bot in pair}
+        return [b for b in self.bot_names if b in active]
+
+    def results(self):
+        out = []
+        for (a, b), stats in self.pairs.items():
+            decision = self.decisions.get((a, b), "undecided")
+            out.append(PairResult(a, b, stats.n, stats.mean, stats.half_width(self.z), decision))
+        return out
+
+    def report(self):
+        lines = [f"bot                 games       mean     +/-CI   (z={self.z:.2f})"]
+        for b, stats in self.bots.items():
+            lines.append(f"{b:<16} {stats.n:>8} {stats.mean:>10.2f} {stats.half_width(self.z):>9.2f}")
+        lines.append("")
+        lines.append(f"paired difference, stop when decided (overall alpha {self.alpha})")
+        for r in self.results():
+            lines.append(f"{r.a} - {r.b}: {r.mean:+.2f} +/- {r.half_width:.2f}  "
+                         f"{r.decision:<9} after {r.n} games")
+        lines.append("")
+        lines.append(f"{self.games_played} games played in {self.elapsed_s:.1f}s")
+        return "\n".join(lines)
+
+
+def run_sequential_evaluation(
+    bot_names,
+    out_path=None,
+    mode="small",
+    base_seed=67,
+    workers=None,
+    alpha=0.05,
+    tolerance=0.0,
+    batch_size=200,
+    min_games=100,
+    max_games=20000,
+    chunk_size=50,
+    min_open=1,
+    max_open=5,
+    ml_model_path=None,
+    reset_cache=True,
+    progress=True,
+    dp_table_path=None,
+    rules=STANDARD_RULES,
+):
+    """
+    Play batches of batch_size paired games (game ids 0, 1, 2, ... as in
+    evaluate.run_evaluation, so the same seed gives the same dice) until
+    every pair of bots is decided or has max_games games. Pairs are not
+    checked before min_games. If out_path is set, result rows are streamed
+    there. Returns a SequentialSummary.
+    """
+    check_run_options(bot_names, mode, rules)
+    if len(bot_names) < 2:
+        raise ValueError("need at least two bots to compare")
+    if min_games < 2 or batch_size < 1 or max_games < min_games:
+        raise ValueError("need 2 <= min_games <= max_games and batch_size >= 1")
+
+    n_pairs = len(bot_names) * (len(bot_names) - 1) // 2
+    max_looks = math.ceil((max_games - min_games) / batch_size) + 1
+    summary = SequentialSummary(bot_names, bonferroni_z(alpha, n_pairs, max_looks), alpha)
+
+    config = {
+        "base_seed": base_seed,
+        "mode": mode,
+        "min_open": min_open,
+        "max_open": max_open,
+        "ml_model_path": ml_model_path,
+        "reset_cache": reset_cache,
+        "log_games": False,
+        "rules": rules,
+    }
+    shared = None
+    if dp_table_path:
+        from shared_tables import SharedTables
+        from tables import load_value_table
+        shared = SharedTables.create(load_value_table(dp_table_path), rules=rules)
+        config["shared_tables"] = shared.descriptor
+
+    workers = workers or os.cpu_count() or 1
+    writer = ResultWriter(out_path) if out_path else None
+    t0 = time.perf_counter()
+    next_id = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+            while summary.open_pairs():
+                active = summary.active_bots()
+                n_batch = min(batch_size, max_games - next_id)
+                ids = range(next_id, next_id + n_batch)
+                futures = [
+                    pool.submit(play_chunk, b, [next_id + i for i in chunk])
+                    for chunk in _chunks(n_batch, chunk_size) for b in active
+                ]
+
+                totals = {game_id: {} for game_id in ids}
+                for fut in as_completed(futures):
+                    rows, _ = fut.result()
+                    if writer is not None:
+                        writer.write_rows(rows)
+                    for row in rows:
+                        totals[row["game_id"]][row["bot"]] = row["total"]
+                        summary.bots[row["bot"]].add(row["total"])
+                next_id += n_batch
+                summary.games_played += n_batch * len(active)
+
+                for a, b in summary.open_pairs():
+                    stats = summary.pairs[(a, b)]
+                    for game_id in ids:
+                        stats.add(totals[game_id][a] - totals[game_id][b])
+                    decision = decide(stats, summary.z, tolerance) if stats.n >= min_games else None
+                    if decision is None and stats.n >= max_games:
+                        decision = "undecided"
+                    if decision is not None:
+                        summary.decisions[(a, b)] = decision
+
+                if progress:
+                    still = ", ".join(f"{a}-{b}" for a, b in summary.open_pairs()) or "none"
+                    print(f"  {next_id} games (elapsed {time.perf_counter() - t0:.1f}s), open: {still}",
+                          flush=True)
+    finally:
+        if writer is not None:
+            writer.close()
+        if shared is not None:
+            shared.close()
+
+    summary.elapsed_s = time.perf_counter() - t0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Paired evaluation that stops each comparison once it is statistically decided.")
+    parser.add_argument("--bots", nargs="+", default=["greedy", "dp"], choices=BOT_NAMES)
+    parser.add_argument("--mode", default="small", choices=("small", "full"))
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="overall error rate (Bonferroni over pairs and looks)")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="call a tie once the CI lies within +/- this many points (0: never)")
+    parser.add_argument("--batch-size", type=int, default=200, help="paired games between checks")
+    parser.add_argument("--min-games", type=int, default=100)
+    parser.add_argument("--max-games", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=67)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--min-open", type=int, default=1)
+    parser.add_argument("--max-open", type=int, default=5)
+    parser.add_argument("--ml-model", default=None)
+    parser.add_argument("--dp-table", default=None)
+    parser.add_argument("--keep-cache", action="store_true")
+    parser.add_argument("--out", default=None, help="also stream result rows to .csv or .parquet")
+    parser.add_argument("--quiet", action="store_true")
+    add_rules_arguments(parser)
+    args = parser.parse_args(argv)
+
+    summary = run_sequential_evaluation(
+        args.bots,
+        args.out,
+        mode=args.mode,
+        base_seed=args.seed,
+        workers=args.workers,
+        alpha=args.alpha,
+        tolerance=args.tolerance,
+        batch_size=args.batch_size,
+        min_games=args.min_games,
+        max_games=args.max_games,
+        chunk_size=args.chunk_size,
+        min_open=args.min_open,
+        max_open=args.max_open,
+        ml_model_path=args.ml_model,
+        reset_cache=not args.keep_cache,
+        progress=not args.quiet,
+        dp_table_path=args.dp_table,
+        rules=rules_from_args(args),
+    )
+    print(summary.report())
+
+
+if __name__ == "__main__":
+    main()
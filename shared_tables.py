@@ -0,0 +1,142 @@
+"""
+DP tables in shared memory.
+
+A parent process builds (or loads) the game-value table once and copies it,
+together with the static transition and score tables, into
+multiprocessing.shared_memory blocks. Workers attach by name and get
+read-only NumPy views onto the same pages, so nothing is pickled and memory
+per worker stays flat however many workers run.
+
+    # parent
+    with SharedTables.create(value_table) as shared:
+        pool = ProcessPoolExecutor(initializer=init, initargs=(shared.descriptor,))
+        ...
+
+    # worker
+    shared = SharedTables.attach(descriptor)
+    bot = DynamicProgrammingBot(value_table=shared.value_table)
+
+Attaching a descriptor that includes the static tables also installs them
+(tables.install_static_tables), so get_static_tables() in the worker returns
+the shared views instead of building its own copy.
+"""
+import multiprocessing
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from rules import STANDARD_RULES
+from tables import STATIC_ARRAYS, get_static_tables, install_static_tables
+
+
+def _open_shm(name):
+    # Attaching processes must not unlink the block when they exit
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    # Before 3.13 attaching registers the block with the resource tracker. Pool
+    # workers share their parent's tracker, where the block is registered
+    # already; any other process gets its own tracker, which would unlink the
+    # block when that process exits.
+    if multiprocessing.parent_process() is None:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class SharedTables:
+    def __init__(self, blocks, arrays, owner):
+        self._blocks = blocks
+        self._arrays = arrays
+        self._owner = owner
+
+    @classmethod
+    def create(cls, value_table, include_static=True, rules=STANDARD_RULES, arrays=None):
+        """
+        Copy value_table (and the static tables for `rules`) into new shared
+        memory blocks. arrays: more {name: array} to share alongside (e.g. a
+        row index); workers read them as shared[name]. With include_static, a
+        value_table whose shape does not fit `rules` raises ValueError.
+        """
+        sources = {"value_table": np.asarray(value_table)}
+        if include_static:
+            static = get_static_tables(rules)
+            expected = (1 << static.n_cat, static.upper_cap + 1, 2)
+            if sources["value_table"].shape != expected:
+                raise ValueError(f"value table of shape {sources['value_table'].shape} does not fit "
+                                 f"these rules (expected {expected})")
+            for name in STATIC_ARRAYS:
+                sources[name] = getattr(static, name)
+        for name, src in (arrays or {}).items():
+            sources[name] = np.asarray(src)
+
+        blocks, arrays = {}, {}
+        try:
+            for name, src in sources.items():
+                shm = shared_memory.SharedMemory(create=True, size=max(src.nbytes, 1))
+                blocks[name] = shm
+                arr = np.ndarray(src.shape, dtype=src.dtype, buffer=shm.buf)
+                arr[...] = src
+                arr.setflags(write=False)
+                arrays[name] = arr
+        except Exception:
+            for shm in blocks.values():
+                shm.close()
+                shm.unlink()
+            raise
+        return cls(blocks, arrays, owner=True)
+
+    @classmethod
+    def attach(cls, descriptor, rules=STANDARD_RULES):
+        """
+        Attach read-only views to blocks created by another process. Static
+        tables in the descriptor (created for the same `rules`) become this
+        process's get_static_tables(rules).
+        """
+        blocks, arrays = {}, {}
+        for name, (shm_name, shape, dtype) in descriptor.items():
+            shm = _open_shm(shm_name)
+            blocks[name] = shm
+            arr = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf)
+            arr.setflags(write=False)
+            arrays[name] = arr
+        if all(name in arrays for name in STATIC_ARRAYS):
+            install_static_tables({name: arrays[name] for name in STATIC_ARRAYS}, rules)
+        return cls(blocks, arrays, owner=False)
+
+    @property
+    def descriptor(self):
+        """Picklable {array name: (block name, shape, dtype)} for SharedTables.attach."""
+        return {
+            name: (self._blocks[name].name, arr.shape, arr.dtype.str)
+            for name, arr in self._arrays.items()
+        }
+
+    @property
+    def value_table(self):
+        return self._arrays["value_table"]
+
+    def __getitem__(self, name):
+        return self._arrays[name]
+
+    def __contains__(self, name):
+        return name in self._arrays
+
+    @property
+    def nbytes(self):
+        return sum(arr.nbytes for arr in self._arrays.values())
+
+    def close(self):
+        """Drop this process's mapping; the owner also frees the blocks."""
+        self._arrays = {}
+        for shm in self._blocks.values():
+            shm.close()
+            if self._owner:
+                shm.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
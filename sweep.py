@@ -0,0 +1,335 @@
+"""
+Parallel hyperparameter sweep for self-play training (ml.train_self_play).
+
+Every combination of the given settings is one run. Runs advance one
+training iteration (ml.train_iteration) per task on a process pool sized to a
+shared CPU budget: --cpus total, --threads-per-run of them for each run's
+BLAS / sklearn threads.
+
+Successive halving stops weak runs early. Rungs sit at min_iterations,
+min_iterations * eta, ... up to num_iterations. At each rung, once every
+surviving run has trained that many iterations, only the best 1 / eta of them
+(by the latest evaluation score) keep training.
+
+Everything is checkpointed under --out-dir after every iteration:
+
+    sweep.json            configs, rungs, and the runs kept at each rung already decided
+    <run_id>/state.json   config, per-iteration metrics, status, current model file
+    <run_id>/model_NNN.pkl  latest model (written before state.json points to it)
+    <run_id>/best.pkl     best model by evaluation score
+
+so an interrupted sweep resumes where it stopped when started again with the
+same --out-dir (the settings are read back from sweep.json):
+
+    python sweep.py --out-dir sweeps/tp --top-percentile 10 20 30 --games-per-iteration 200 500 \\
+        --hidden 128,64 64 --num-iterations 20 --min-iterations 2 --eta 3 --cpus 8
+    python sweep.py --out-dir sweeps/tp          # resume
+
+Needs scikit-learn (and threadpoolctl, which it installs).
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from ml import MLBot, train_iteration
+
+SWEEP_FILE = "sweep.json"
+STATE_FILE = "state.json"
+
+# ml.train_iteration settings a sweep can vary
+SWEEP_KEYS = ("top_percentile", "temperature_start", "temperature_end", "games_per_iteration",
+              "hidden_layer_sizes")
+
+#-----------------------------
+# CONFIGS AND CHECKPOINTS
+#-----------------------------
+
+def make_configs(grid):
+    """Cartesian product of {key: [values]} as a list of config dicts."""
+    keys = [k for k in SWEEP_KEYS if k in grid]
+    configs = []
+    for values in itertools.product(*(grid[k] for k in keys)):
+        cfg = dict(zip(keys, values))
+        if "hidden_layer_sizes" in cfg:
+            cfg["hidden_layer_sizes"] = list(cfg["hidden_layer_sizes"])
+        configs.append(cfg)
+    return configs
+
+
+def run_id(config):
+    """Stable short id of a config."""
+    blob = json.dumps(config, sort_keys=True).encode()
+    return "run_" + hashlib.sha1(blob).hexdigest()[:10]
+
+
+def rung_budgets(num_iterations, min_iterations, eta):
+    """Iteration counts at which runs are compared, ending at num_iterations."""
+    if eta <= 1:
+        raise ValueError("eta must be > 1")
+    budgets = []
+    b = max(1, min_iterations)
+    while b < num_iterations:
+        budgets.append(b)
+        b = int(math.ceil(b * eta))
+    budgets.append(num_iterations)
+    return budgets
+
+
+def _write_json(path, obj):
+    """Atomic JSON write (temp file + rename)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_run_state(run_dir, config):
+    path = os.path.join(run_dir, STATE_FILE)
+    if os.path.exists(path):
+        return _read_json(path)
+    return {"config": config, "metrics": [], "status": "running", "model": None, "best_eval": None}
+
+#-----------------------------
+# WORKER
+#-----------------------------
+
+def train_step(run_dir, config, num_iterations, eval_games, seed, threads):
+    """
+    Train one more iteration of a run from its last checkpoint and checkpoint
+    again. Runs in a pool worker; one task per run at a time. Returns the run state.
+    """
+    from threadpoolctl import threadpool_limits
+
+    state = load_run_state(run_dir, config)
+    iteration = len(state["metrics"])
+
+    bot = MLBot()
+    if state["model"]:
+        bot.load_model(os.path.join(run_dir, state["model"]))
+
+    # reproducible per (sweep seed, run, iteration), whichever worker runs it
+    ss = np.random.SeedSequence([seed, int(run_id(config)[4:], 16), iteration])
+    np.random.seed(ss.generate_state(1)[0])
+    random.seed(int(ss.generate_state(1, dtype=np.uint64)[0]))
+
+    t0 = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        metrics = train_iteration(
+            bot, iteration, num_iterations=num_iterations, eval_games=eval_games,
+            verbose=False, **config,
+        )
+    metrics["train_s"] = time.perf_counter() - t0
+
+    # model first, then the state that points to it: a crash in between
+    # leaves the previous checkpoint intact
+    model_file = f"model_{iteration + 1:03d}.pkl"
+    bot.save_model(os.path.join(run_dir, model_file))
+    if state["best_eval"] is None or metrics["eval_mean"] > state["best_eval"]:
+        bot.save_model(os.path.join(run_dir, "best.pkl.tmp"))
+        os.replace(os.path.join(run_dir, "best.pkl.tmp"), os.path.join(run_dir, "best.pkl"))
+        state["best_eval"] = metrics["eval_mean"]
+
+    old_model = state["model"]
+    state["metrics"].append(metrics)
+    state["model"] = model_file
+    if len(state["metrics"]) >= num_iterations:
+        state["status"] = "done"
+    _write_json(os.path.join(run_dir, STATE_FILE), state)
+    if old_model and old_model != model_file:
+        try:
+            os.remove(os.path.join(run_dir, old_model))
+        except FileNotFoundError:
+            pass
+    return state
+
+#-----------------------------
+# SCHEDULER
+#-----------------------------
+
+def _apply_rung(out_dir, sweep, budget, states):
+    """Mark the runs not kept at a decided rung as stopped."""
+    kept = sweep["kept"].get(str(budget))
+    if kept is None:
+        return
+    for rid, st in states.items():
+        if rid not in kept and st["status"] != "stopped":
+            st["status"] = "stopped"
+            _write_json(os.path.join(out_dir, rid, STATE_FILE), st)
+
+
+def run_sweep(
+    out_dir,
+    grid=None,
+    num_iterations=20,
+    min_iterations=2,
+    eta=3,
+    eval_games=100,
+    cpus=None,
+    threads_per_run=1,
+    seed=0,
+    progress=True,
+):
+    """
+    Run (or resume) a successive-halving sweep in out_dir.
+    grid: {setting: [values]} over SWEEP_KEYS; ignored when resuming, where the
+    sweep's own sweep.json is used. Returns {run_id: state}.
+    """
+    if eta <= 1:
+        raise ValueError("eta must be > 1")
+    os.makedirs(out_dir, exist_ok=True)
+    sweep_path = os.path.join(out_dir, SWEEP_FILE)
+    if os.path.exists(sweep_path):
+        sweep = _read_json(sweep_path)
+        if progress:
+            print(f"resuming sweep in {out_dir} ({len(sweep['runs'])} runs)")
+    else:
+        if not grid:
+            raise ValueError("no sweep to resume in out_dir; give the settings to sweep")
+        configs = make_configs(grid)
+        sweep = {
+            "runs": {run_id(c): c for c in configs},
+            "num_iterations": num_iterations,
+            "rungs": rung_budgets(num_iterations, min_iterations, eta),
+            "eta": eta,
+            "eval_games": eval_games,
+            "seed": seed,
+            "completed_rungs": [],
+            "kept": {},
+        }
+        _write_json(sweep_path, sweep)
+
+    num_iterations = sweep["num_iterations"]
+    states = {}
+    for rid, cfg in sweep["runs"].items():
+        run_dir = os.path.join(out_dir, rid)
+        os.makedirs(run_dir, exist_ok=True)
+        states[rid] = load_run_state(run_dir, cfg)
+
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, cpus // max(1, threads_per_run))
+    t0 = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for budget in sweep["rungs"]:
+            if budget in sweep["completed_rungs"]:
+                # decided before an interruption; finish marking its runs
+                _apply_rung(out_dir, sweep, budget, states)
+                continue
+            alive = [rid for rid, st in states.items() if st["status"] != "stopped"]
+
+            # train every surviving run up to this rung, one iteration per task
+            pending = {}
+
+            def submit(rid):
+                pending[pool.submit(
+                    train_step, os.path.join(out_dir, rid), sweep["runs"][rid], num_iterations,
+                    sweep["eval_games"], sweep["seed"], threads_per_run,
+                )] = rid
+
+            for rid in alive:
+                if len(states[rid]["metrics"]) < budget:
+                    submit(rid)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    rid = pending.pop(fut)
+                    states[rid] = fut.result()
+                    m = states[rid]["metrics"][-1]
+                    if progress:
+                        print(f"  {rid} iteration {len(states[rid]['metrics'])}/{budget}: "
+                              f"eval {m['eval_mean']:.1f} ({m['train_s']:.0f}s, "
+                              f"elapsed {time.perf_counter() - t0:.0f}s)", flush=True)
+                    if len(states[rid]["metrics"]) < budget:
+                        submit(rid)
+
+            # successive halving on the score at this rung: the keep set goes
+            # into sweep.json first, so a crash while marking runs resumes
+            # with the same decision
+            if budget < num_iterations:
+                keep = max(1, int(math.ceil(len(alive) / sweep["eta"])))
+                ranked = sorted(alive, key=lambda rid: states[rid]["metrics"][budget - 1]["eval_mean"],
+                                reverse=True)
+                sweep["kept"][str(budget)] = ranked[:keep]
+            sweep["completed_rungs"].append(budget)
+            _write_json(sweep_path, sweep)
+            _apply_rung(out_dir, sweep, budget, states)
+            if progress and budget < num_iterations:
+                print(f"rung {budget}: kept {keep} of {len(alive)} runs")
+
+    return states
+
+
+def format_results(states):
+    lines = [f"{'run':<16} {'status':<8} {'iters':>5} {'last':>7} {'best':>7}  config"]
+    order = sorted(states.items(), key=lambda kv: -(kv[1]["best_eval"] or 0.0))
+    for rid, st in order:
+        last = st["metrics"][-1]["eval_mean"] if st["metrics"] else float("nan")
+        best = st["best_eval"] if st["best_eval"] is not None else float("nan")
+        lines.append(f"{rid:<16} {st['status']:<8} {len(st['metrics']):>5} {last:>7.1f} {best:>7.1f}  "
+                     f"{json.dumps(st['config'], sort_keys=True)}")
+    return "\n".join(lines)
+
+
+def _hidden(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Successive-halving sweep over self-play training settings.")
+    parser.add_argument("--out-dir", required=True, help="checkpoints; an existing sweep here is resumed")
+    parser.add_argument("--top-percentile", type=float, nargs="+", default=None)
+    parser.add_argument("--temperature-start", type=float, nargs="+", default=None)
+    parser.add_argument("--temperature-end", type=float, nargs="+", default=None)
+    parser.add_argument("--games-per-iteration", type=int, nargs="+", default=None)
+    parser.add_argument("--hidden", type=_hidden, nargs="+", default=None,
+                        help="MLP hidden layer sizes, e.g. 128,64 64")
+    parser.add_argument("--num-iterations", type=int, default=20)
+    parser.add_argument("--min-iterations", type=int, default=2, help="first rung")
+    parser.add_argument("--eta", type=float, default=3, help="keep 1/eta of the runs per rung")
+    parser.add_argument("--eval-games", type=int, default=100)
+    parser.add_argument("--cpus", type=int, default=None, help="total CPU budget (default: all)")
+    parser.add_argument("--threads-per-run", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+    if args.eta <= 1:
+        parser.error("--eta must be > 1")
+
+    grid = {}
+    for key, values in (("top_percentile", args.top_percentile),
+                        ("temperature_start", args.temperature_start),
+                        ("temperature_end", args.temperature_end),
+                        ("games_per_iteration", args.games_per_iteration),
+                        ("hidden_layer_sizes", args.hidden)):
+        if values:
+            grid[key] = values
+
+    states = run_sweep(
+        args.out_dir, grid,
+        num_iterations=args.num_iterations,
+        min_iterations=args.min_iterations,
+        eta=args.eta,
+        eval_games=args.eval_games,
+        cpus=args.cpus,
+        threads_per_run=args.threads_per_run,
+        seed=args.seed,
+        progress=not args.quiet,
+    )
+    print(format_results(states))
+
+
+if __name__ == "__main__":
+    main()
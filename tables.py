@@ -0,0 +1,384 @@
+"""
+Static NumPy tables shared by the table-driven solvers.
+
+Everything here depends only on the rules, not on the score sheet, so it is
+built once per process and rules config (see get_static_tables, rules.Rules)
+and treated as read-only. Sizes below are for the standard rules:
+
+    dice_states      all 252 sorted 5-dice multisets, interned to ids 0..251
+    keeps            all 462 kept multisets (0..5 dice), interned to ids
+    keep_transition  (n_keeps, n_states) P(final dice state | keep, reroll the rest)
+    keep_by_mask     (n_states, 32) keep id for dice state s and reroll mask m
+                     (bit i = reroll die i of the sorted dice, same as the bots)
+    first_roll       (n_states,) distribution of a fresh roll of 5 dice
+    score_table      (n_states, n_cat) standard (non-joker) category scores
+"""
+from itertools import combinations_with_replacement
+from math import factorial
+import time
+
+import numpy as np
+
+from rules import STANDARD_RULES, categories as rules_categories, upper_categories, score, check_rules
+
+# standard-rules sizes (tables built for other rules carry their own)
+N_DICE = STANDARD_RULES.n_dice
+N_FACES = STANDARD_RULES.n_faces
+N_MASKS = 1 << N_DICE
+
+
+def _multiset_prob(outcome, n_faces=N_FACES):
+    """Probability of rolling exactly this multiset with len(outcome) fair dice."""
+    counts = [0] * n_faces
+    for v in outcome:
+        counts[v - 1] += 1
+    denom = 1
+    for c in counts:
+        denom *= factorial(c)
+    return factorial(len(outcome)) / denom / (n_faces ** len(outcome))
+
+
+# the NumPy arrays of a StaticTables (the rest is small Python lookups)
+STATIC_ARRAYS = ("keep_transition", "keep_by_mask", "first_roll", "score_table", "is_yahtzee", "face")
+
+
+class StaticTables:
+    def __init__(self, rules=STANDARD_RULES, arrays=None):
+        """
+        arrays: optional {name: array} for every name in STATIC_ARRAYS, already
+        built for these rules (e.g. shared memory views); used as-is instead of
+        rebuilding them.
+        """
+        self.rules = check_rules(rules)
+        n_dice, n_faces = rules.n_dice, rules.n_faces
+        self.n_dice = n_dice
+        self.n_masks = 1 << n_dice
+        self.n_rerolls = rules.n_rerolls
+        self.upper_cap = rules.upper_bonus_threshold
+
+        self.categories = list(rules_categories(rules))
+        self.n_cat = len(self.categories)
+        self.cat_to_idx = {c: i for i, c in enumerate(self.categories)}
+
+        # --- dice states
+        faces = range(1, n_faces + 1)
+        self.dice_states = list(combinations_with_replacement(faces, n_dice))
+        self.state_to_id = {s: i for i, s in enumerate(self.dice_states)}
+        self.n_states = len(self.dice_states)
+
+        # --- kept multisets of every size
+        self.keeps = []
+        for k in range(n_dice + 1):
+            self.keeps.extend(combinations_with_replacement(faces, k))
+        self.keep_to_id = {kp: i for i, kp in enumerate(self.keeps)}
+        self.n_keeps = len(self.keeps)
+
+        if arrays is not None:
+            for name in STATIC_ARRAYS:
+                setattr(self, name, arrays[name])
+        else:
+            self._build_arrays(rules)
+        for name in STATIC_ARRAYS:
+            getattr(self, name).setflags(write=False)
+
+    def _build_arrays(self, rules):
+        n_dice, n_faces = rules.n_dice, rules.n_faces
+        faces = range(1, n_faces + 1)
+
+        # --- P(final state | keep): sparse (keep, state, p) triples, one dense scatter
+        outcomes_by_k = [
+            [(out, _multiset_prob(out, n_faces)) for out in combinations_with_replacement(faces, k)]
+            for k in range(n_dice + 1)
+        ]
+        rows, cols, probs = [], [], []
+        for kid, kept in enumerate(self.keeps):
+            for out, p in outcomes_by_k[n_dice - len(kept)]:
+                rows.append(kid)
+                cols.append(self.state_to_id[tuple(sorted(kept + out))])
+                probs.append(p)
+        self.keep_transition = np.zeros((self.n_keeps, self.n_states))
+        np.add.at(self.keep_transition, (np.array(rows), np.array(cols)), probs)
+
+        # --- keep id for (state, reroll mask)
+        self.keep_by_mask = np.zeros((self.n_states, self.n_masks), dtype=np.int32)
+        for sid, dice in enumerate(self.dice_states):
+            for m in range(self.n_masks):
+                kept = tuple(dice[i] for i in range(n_dice) if not ((m >> i) & 1))
+                self.keep_by_mask[sid, m] = self.keep_to_id[kept]
+
+        self.first_roll = self.keep_transition[self.keep_to_id[()]].copy()
+
+        # --- standard scores (Joker overrides are applied by the solvers)
+        self.score_table = np.zeros((self.n_states, self.n_cat), dtype=np.int16)
+        for sid, dice in enumerate(self.dice_states):
+            for ci, cat in enumerate(self.categories):
+                self.score_table[sid, ci] = score(dice, cat, rules)
+
+        self.is_yahtzee = np.array([d[0] == d[-1] for d in self.dice_states])
+        self.face = np.array([d[0] for d in self.dice_states], dtype=np.int8)
+
+
+_static_tables = {}
+
+
+def get_static_tables(rules=STANDARD_RULES):
+    """Process-wide StaticTables, one per rules config."""
+    tables = _static_tables.get(rules)
+    if tables is None:
+        tables = _static_tables[rules] = StaticTables(rules)
+    return tables
+
+
+def install_static_tables(arrays, rules=STANDARD_RULES):
+    """
+    Make get_static_tables(rules) in this process use prebuilt arrays (see
+    StaticTables), e.g. views attached by shared_tables.SharedTables.
+    Call before anything has fetched the tables for these rules.
+    """
+    _static_tables[rules] = StaticTables(rules, arrays)
+    return _static_tables[rules]
+
+#-----------------------------
+# GAME-VALUE TABLE
+#-----------------------------
+
+# standard-rules upper cap (tables.upper_cap for other rules)
+UPPER_CAP = STANDARD_RULES.upper_bonus_threshold
+N_UPPER = UPPER_CAP + 1
+
+
+def _category_indices(tables):
+    c = tables.cat_to_idx
+    return {
+        "yahtzee": c["yahtzee"],
+        "fullhouse": c["fullhouse"],
+        "smstraight": c["smstraight"],
+        "lgstraight": c["lgstraight"],
+        "upper": [c[n] for n in upper_categories(tables.rules)],
+    }
+
+
+def reachable_upper_totals(avail_mask, tables=None):
+    """Capped upper totals reachable with the upper categories filled in `avail_mask`."""
+    tables = tables or get_static_tables()
+    totals = {0}
+    for face, ci in enumerate(_category_indices(tables)["upper"], start=1):
+        if not (avail_mask >> ci) & 1:
+            totals = {min(tables.upper_cap, t + face * k) for t in totals for k in range(tables.n_dice + 1)}
+    return sorted(totals)
+
+
+def category_outcomes(tables, masks, uppers, y_bonus):
+    """
+    Scoring each category from every dice state, for B turn-start states.
+
+    Returns a dict of arrays:
+      legal      bool (B, S, C)  category may be scored (open, and Joker rules allow it)
+      pts        int  (B, S, C)  category points, Joker overrides applied
+      joker      bool (B, S)     a Yahtzee bonus (+100) is paid for these dice
+      new_upper  int  (B, S, C)  upper total after scoring, capped at tables.upper_cap (63)
+      new_y      bool (B, S, C)  y_bonus after scoring
+      next_mask  int  (B, C)     avail_mask after scoring
+    Joker legality and overrides follow DynamicProgrammingBot._best_category_value.
+    """
+    idx = _category_indices(tables)
+    masks = np.asarray(masks, dtype=np.int64)
+    uppers = np.asarray(uppers, dtype=np.int64)
+    y_bonus = np.asarray(y_bonus, dtype=bool)
+    n_cat = tables.n_cat
+    cat_bits = np.int64(1) << np.arange(n_cat, dtype=np.int64)
+    is_upper_cat = np.zeros(n_cat, dtype=bool)
+    is_upper_cat[idx["upper"]] = True
+    upper_mask = int(cat_bits[is_upper_cat].sum())
+
+    avail = (masks[:, None] & cat_bits[None, :]) != 0                          # (B, C)
+
+    # --- Joker / Yahtzee bonus
+    yahtzee_open = avail[:, idx["yahtzee"]]
+    apply_joker = tables.is_yahtzee[None, :] & ~yahtzee_open[:, None] & y_bonus[:, None]   # (B, S)
+    face_cat = np.asarray(idx["upper"])[tables.face - 1]                      # (S,)
+    forced = apply_joker & avail[:, face_cat]                                 # (B, S)
+    lower_avail = (masks & ~upper_mask) != 0
+    must_lower = apply_joker & ~forced & lower_avail[:, None]                 # (B, S)
+
+    legal = np.broadcast_to(avail[:, None, :], forced.shape + (n_cat,)).copy()
+    legal &= ~forced[:, :, None] | (np.arange(n_cat)[None, None, :] == face_cat[None, :, None])
+    legal &= ~(must_lower[:, :, None] & is_upper_cat[None, None, :])
+
+    pts = np.broadcast_to(tables.score_table.astype(np.int64)[None], legal.shape).copy()
+    override = apply_joker & ~forced
+    rules = tables.rules
+    for name, value in (("fullhouse", rules.fullhouse_score), ("smstraight", rules.smstraight_score),
+                        ("lgstraight", rules.lgstraight_score)):
+        pts[:, :, idx[name]] = np.where(override, value, pts[:, :, idx[name]])
+
+    new_upper = np.where(
+        is_upper_cat[None, None, :],
+        np.minimum(tables.upper_cap, uppers[:, None, None] + pts),
+        uppers[:, None, None],
+    )
+    is_yahtzee_cat = (np.arange(n_cat) == idx["yahtzee"])[None, None, :]
+    new_y = y_bonus[:, None, None] | (is_yahtzee_cat & (pts == rules.yahtzee_score))
+    next_mask = masks[:, None] & ~cat_bits[None, :]                           # (B, C)
+    return {
+        "legal": legal, "pts": pts, "joker": apply_joker,
+        "new_upper": new_upper, "new_y": new_y, "next_mask": next_mask,
+    }
+
+
+def solve_widgets(tables, value_table, masks, uppers, y_bonus, return_policy=False):
+    """
+    Solve the turn "widget" of B turn-start states at once.
+
+    masks, uppers, y_bonus: int arrays of shape (B,)
+    value_table: V[avail_mask, upper_total, y_bonus], future EV at the start of a turn
+
+    Returns (ev, policy):
+      ev      float array (R + 1, B, n_states), R = rerolls per turn (2);
+              ev[r][b, s] = best EV with dice s and r rerolls left
+      policy  (only if return_policy) dict of int arrays (B, n_states):
+                "category"  best category index at rolls_left 0
+                "keep1"     best reroll mask at rolls_left 1
+                "keep2"     best reroll mask at rolls_left 2 (0 = score now)
+                ...         up to "keep{R}"
+    """
+    out = category_outcomes(tables, masks, uppers, y_bonus)
+    pts = out["pts"]
+    next_mask = out["next_mask"]
+
+    future = value_table[next_mask[:, None, :], out["new_upper"], out["new_y"].astype(np.int64)]
+    cat_val = pts + float(tables.rules.yahtzee_bonus) * out["joker"][:, :, None] + future
+    cat_val[~out["legal"]] = -np.inf
+
+    ev0 = cat_val.max(axis=2)
+    ev, _, masks = solve_rerolls(tables, ev0)
+    if not return_policy:
+        return ev, None
+    policy = {"category": cat_val.argmax(axis=2)}
+    for r in range(1, tables.n_rerolls + 1):
+        policy[f"keep{r}"] = masks[r - 1]
+    return ev, policy
+
+
+def solve_rerolls(tables, ev0):
+    """
+    Reroll stages of turn widgets, given ev0 (..., n_states): the best EV of
+    scoring each dice state now.
+
+    Returns (ev, keep_ev, masks), R = tables.n_rerolls (2):
+      ev       (R + 1, ..., n_states)  best EV with r rerolls left, as in solve_widgets
+      keep_ev  (R, ..., n_keeps)       keep_ev[r - 1][k] = EV of keeping multiset k and
+                                       rerolling the rest with r rerolls left
+      masks    (R, ..., n_states)      best reroll mask at rolls_left 1..R (0 = score now)
+    """
+    T = tables.keep_transition
+    kbm = tables.keep_by_mask
+    evs, keep_evs, masks = [ev0], [], []
+    for r in range(1, tables.n_rerolls + 1):
+        keep_ev = evs[-1] @ T.T
+        mask_ev = keep_ev[..., kbm]                                           # (..., S, 2**n_dice)
+        if r > 1:
+            mask_ev[..., 0] = ev0                                             # mask 0 = score now
+        evs.append(mask_ev.max(axis=-1))
+        keep_evs.append(keep_ev)
+        masks.append(mask_ev.argmax(axis=-1))
+    return np.stack(evs), np.stack(keep_evs), np.stack(masks)
+
+
+def _layer_states(tables, root_mask, n_open):
+    """(masks, uppers, y_bonus) arrays for reachable turn-start states with n_open categories."""
+    yahtzee_bit = 1 << tables.cat_to_idx["yahtzee"]
+    masks, uppers, ybs = [], [], []
+    sub = root_mask
+    while True:
+        if sub.bit_count() == n_open:
+            totals = reachable_upper_totals(sub, tables)
+            y_values = (0,) if sub & yahtzee_bit else (0, 1)
+            for y in y_values:
+                masks.extend([sub] * len(totals))
+                uppers.extend(totals)
+                ybs.extend([y] * len(totals))
+        if sub == 0:
+            break
+        sub = (sub - 1) & root_mask
+    return np.array(masks, dtype=np.int64), np.array(uppers, dtype=np.int64), np.array(ybs, dtype=np.int64)
+
+
+def build_value_table(root_mask=None, batch_size=256, progress=False, rules=STANDARD_RULES):
+    """
+    Game-value table V[avail_mask, upper_total, y_bonus] (float64, shape
+    (2**13, 64, 2)): EV of the rest of the game at the start of a turn, upper
+    total capped at 63. Solved backwards layer by layer (fewest open categories
+    first), each layer in vectorized batches of turn widgets. Other rules give
+    shape (2**n_cat, upper_bonus_threshold + 1, 2).
+
+    root_mask restricts the solve to sub-masks of it (e.g. the open categories
+    of a late-game sheet); entries outside are left at 0.
+    """
+    tables = get_static_tables(rules)
+    n_cat = tables.n_cat
+    root_mask = (1 << n_cat) - 1 if root_mask is None else root_mask
+
+    V = np.zeros((1 << n_cat, tables.upper_cap + 1, 2))
+    V[0, tables.upper_cap, :] = float(rules.upper_bonus)
+
+    t0 = time.perf_counter()
+    for n_open in range(1, root_mask.bit_count() + 1):
+        masks, uppers, ybs = _layer_states(tables, root_mask, n_open)
+        for start in range(0, len(masks), batch_size):
+            sl = slice(start, start + batch_size)
+            ev, _ = solve_widgets(tables, V, masks[sl], uppers[sl], ybs[sl])
+            V[masks[sl], uppers[sl], ybs[sl]] = ev[-1] @ tables.first_roll
+        if progress:
+            print(f"  layer {n_open}: {len(masks)} states (elapsed {time.perf_counter() - t0:.1f}s)", flush=True)
+
+    # unreachable y_bonus=1 with Yahtzee still open: mirror y_bonus=0 so lookups stay sane
+    yahtzee_bit = 1 << tables.cat_to_idx["yahtzee"]
+    open_y = (np.arange(1 << n_cat) & yahtzee_bit) != 0
+    V[open_y, :, 1] = V[open_y, :, 0]
+    return V
+
+
+def load_value_table(path, mmap=True):
+    """
+    Load a table saved with np.save (memory-mapped read-only by default), a
+    packed .npz table from packed_tables.py (a PackedValueTable), or an
+    approximate .npz table from approx_tables.py (an ApproxValueTable, which
+    interpolates on lookup).
+    """
+    if str(path).endswith(".npz"):
+        with np.load(path) as f:
+            packed = "packed" in f.files
+        if packed:
+            from packed_tables import load_packed_value_table
+            return load_packed_value_table(path)
+        from approx_tables import load_approx_value_table
+        return load_approx_value_table(path)
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def main(argv=None):
+    import argparse
+
+    from rules import add_rules_arguments, rules_from_args
+
+    parser = argparse.ArgumentParser(description="Build the DP game-value table.")
+    parser.add_argument("--out", default="yahtzee_value_table.npy")
+    parser.add_argument("--batch-size", type=int, default=256)
+    add_rules_arguments(parser)
+    args = parser.parse_args(argv)
+    rules = rules_from_args(args)
+
+    t0 = time.perf_counter()
+    tables = get_static_tables(rules)
+    print(f"rules: {dict(rules._asdict())}")
+    print(f"{tables.n_states} dice states, {tables.n_keeps} keeps, {tables.n_masks} reroll masks "
+          f"(static tables in {time.perf_counter() - t0:.1f}s)")
+    V = build_value_table(batch_size=args.batch_size, progress=True, rules=rules)
+    np.save(args.out, V)
+    print(f"EV of a fresh game: {V[V.shape[0] - 1, 0, 0]:.4f}")
+    print(f"built in {time.perf_counter() - t0:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
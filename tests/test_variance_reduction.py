@@ -0,0 +1,33 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from variance_reduction import Tilt, draw_roll, _log_ratio, _straight_fills, _high_probs
+
+MIXED_TILTS = [
+    Tilt(kind=0.05, straight=0.02),
+    Tilt(kind=0.2, straight=0.1, high=0.1),
+]
+KEPT = [(), (3,), (2, 3, 4), (5, 5, 5), (1, 2, 3, 4), (6, 6, 6, 6)]
+
+
+@pytest.mark.parametrize("tilt", MIXED_TILTS)
+@pytest.mark.parametrize("kept", KEPT)
+def test_proposal_density_sums_to_one(tilt, kept):
+    k = 5 - len(kept)
+    fills, high_p = _straight_fills(kept), _high_probs(tilt.high_theta)
+    total = sum(6.0 ** -k * math.exp(-_log_ratio(x, kept, tilt, fills, high_p))
+                for x in itertools.product(range(1, 7), repeat=k))
+    assert total == pytest.approx(1.0, abs=1e-12)
+
+
+@pytest.mark.parametrize("tilt", MIXED_TILTS)
+@pytest.mark.parametrize("kept", [(2, 3, 4), (5, 5, 5), ()])
+def test_weights_have_mean_one_under_proposal(tilt, kept):
+    # E_q[w] = 1 only if draw_roll samples from the q that _log_ratio weights by
+    rng = np.random.default_rng(7)
+    k = 5 - len(kept)
+    w = np.exp([draw_roll(rng, kept, k, tilt)[1] for _ in range(100_000)])
+    assert w.mean() == pytest.approx(1.0, abs=5 * w.std() / math.sqrt(len(w)))
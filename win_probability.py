@@ -0,0 +1,337 @@
+"""
+Head-to-head play: maximize P(win) against an opponent's known score sheet.
+
+The opponent's final score is a distribution D (score_distribution.
+policy_score_distribution of their sheet under an assumed policy, or sampled
+games). Our final total t then wins with probability
+u(t) = P(D < t) + P(D = t) / 2, and the best policy maximizes E[u(final)].
+
+The state is (avail_mask, upper_total capped at 63, y_bonus) plus the score
+differential: the points we still lack to be sure of winning,
+k = T - banked, where T = max(D) + 1 (k = 0 means the game is won). k is
+bucketed by `bucket` points (1 = exact). The solve is the max-threshold
+backward induction of score_distribution with the terminal vector u instead
+of a step, and with
+
+  pruning     per state, only the k for which a win is still possible given
+              the most points the open categories can add are solved (the
+              rest is 0); k never exceeds T, so the axis is as wide as the
+              opponent's distribution
+  layers      each layer (one more category filled) is split over a process
+              pool; the successor layer's table is shared with the workers
+              through shared memory
+  persisted   WinTable.save / load_win_table (float32 .npz)
+
+    bot = WinProbabilityBot(workers=4, table_dir="win_tables")
+    bot.choose_best_keep(dice, 2, my_sheet, opponent_sheet)
+    bot.choose_best_category(dice, my_sheet, opponent_sheet)
+    bot.win_probability(my_sheet, opponent_sheet)
+
+Like max_threshold_probability this is meant for mid/late-game sheets: every
+turn-start state carries a vector as long as the opponent's score range.
+"""
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from evaluate import CATS, UPPER_CATS, NUMERIC_SCORES, make_roll_table, play_small_game, state_rng
+from policy_eval import sheet_to_state
+from score_distribution import (
+    ScoreDistribution, policy_score_distribution, _row_index, _successor_rows, _successor_states,
+    _threshold_widget,
+)
+from tables import get_static_tables, solve_rerolls, UPPER_CAP
+
+# most points one category can score (Joker overrides included)
+MAX_POINTS = {
+    **{c: 5 * f for c, f in NUMERIC_SCORES.items()},
+    "threekind": 30, "fourkind": 30, "fullhouse": 25, "smstraight": 30,
+    "lgstraight": 40, "yahtzee": 50, "chance": 30,
+}
+
+#-----------------------------
+# OPPONENT
+#-----------------------------
+
+def opponent_score_distribution(opponent_sheet, bot=None, n_games=None, bonus=0, seed=0):
+    """
+    Final-score distribution of the opponent playing out `opponent_sheet`
+    with `bot` (default GreedyBot). Exact (policy_score_distribution) unless
+    n_games is given, then the histogram of that many simulated games.
+    bonus: Yahtzee bonuses (+100 each) they have already banked.
+    """
+    if bot is None:
+        from greedy import GreedyBot
+        bot = GreedyBot()
+    if n_games is None:
+        dist = policy_score_distribution(bot, opponent_sheet)
+        return ScoreDistribution(dist.offset + bonus, dist.pmf / dist.mass)
+
+    n_open = sum(v is None for v in opponent_sheet.values())
+    totals = np.empty(n_games, dtype=np.int64)
+    for i in range(n_games):
+        roll_table = make_roll_table(state_rng(seed, i), n_open)
+        totals[i] = play_small_game(bot, opponent_sheet, roll_table)[0]
+    totals += bonus
+    lo = int(totals.min())
+    return ScoreDistribution(lo, np.bincount(totals - lo) / n_games)
+
+
+def win_utility(dist):
+    """u[t] = P(opponent < t) + P(opponent = t) / 2 for t = 0..T, T = max(opponent) + 1."""
+    T = dist.offset + len(dist.pmf)
+    pmf = np.zeros(T + 1)
+    lo = max(dist.offset, 0)
+    pmf[lo:T] = dist.pmf[lo - dist.offset:] / dist.mass
+    below = np.concatenate([[0.0], np.cumsum(pmf)[:-1]])
+    return below + pmf / 2
+
+#-----------------------------
+# SOLVER
+#-----------------------------
+
+def _max_remaining(rules, state):
+    """Upper bound on the points still to come from `state` (categories, bonuses)."""
+    avail_mask, upper_total, y_bonus = state
+    open_cats = [c for i, c in enumerate(CATS) if (avail_mask >> i) & 1]
+    r = sum(MAX_POINTS[c] for c in open_cats)
+    if upper_total < rules.upper_bonus_threshold and any(c in UPPER_CATS for c in open_cats):
+        r += rules.upper_bonus
+    yahtzee_open = "yahtzee" in open_cats
+    if y_bonus or yahtzee_open:
+        r += rules.yahtzee_bonus * (len(open_cats) - (1 if yahtzee_open else 0))
+    return r
+
+
+def _active_columns(rules, state, T, zero_below, bucket, n_cols):
+    """Deficit columns where a win is still possible (above: u stays 0)."""
+    # banked = T - k * bucket; a win needs banked + max_remaining >= zero_below
+    return min(n_cols, (T - zero_below + _max_remaining(rules, state)) // bucket + 1)
+
+
+def _terminal_vectors(rules, terminal, utility, bucket, n_cols):
+    T = len(utility) - 1
+    k = np.arange(n_cols)
+    W = np.empty((len(terminal), n_cols), dtype=np.float32)
+    for i, (_, upper_total, _) in enumerate(terminal):
+        bonus = rules.upper_bonus if upper_total >= rules.upper_bonus_threshold else 0
+        W[i] = utility[np.clip(T - k * bucket + bonus, 0, T)]
+    return W
+
+
+def _solve_states(states, row_index, W_next, T, zero_below, bucket, n_cols):
+    tables = get_static_tables()
+    out = np.zeros((len(states), n_cols), dtype=np.float32)
+    for i, state in enumerate(states):
+        n = _active_columns(tables.rules, state, T, zero_below, bucket, n_cols)
+        out[i, :n] = _threshold_widget(tables, state, row_index, W_next, n, bucket)
+    return out
+
+
+_attached = {}
+
+
+def _solve_chunk(states, descriptor, T, zero_below, bucket, n_cols):
+    """Pool task: attach the successor layer's table and row index (once per layer) and solve `states`."""
+    from shared_tables import SharedTables
+
+    key = descriptor["value_table"][0]
+    if key not in _attached:
+        for shared in _attached.values():
+            shared.close()
+        _attached.clear()
+        _attached[key] = SharedTables.attach(descriptor)
+    shared = _attached[key]
+    return _solve_states(states, shared["row_index"], shared.value_table, T, zero_below, bucket, n_cols)
+
+
+class WinTable:
+    """
+    Win probability W[row, k] at the start of every turn-start state reachable
+    from a root sheet, k = deficit bucket. Includes the terminal states.
+    """
+
+    def __init__(self, states, W, utility, bucket):
+        self.states = [tuple(s) for s in states]
+        self.rows = {s: i for i, s in enumerate(self.states)}
+        self.row_index = _row_index(get_static_tables(), self.states)
+        self.W = W
+        self.utility = np.asarray(utility)
+        self.bucket = int(bucket)
+
+    @property
+    def T(self):
+        return len(self.utility) - 1
+
+    def deficit(self, banked):
+        """Deficit bucket of a banked total (0 = already won)."""
+        return int(np.clip(math.ceil((self.T - banked) / self.bucket), 0, self.W.shape[1] - 1))
+
+    def value(self, state, banked):
+        return float(self.W[self.rows[state], self.deficit(banked)])
+
+    def save(self, path):
+        np.savez(path, states=np.array(self.states, dtype=np.int64), W=self.W,
+                 utility=self.utility, bucket=self.bucket)
+
+
+def load_win_table(path):
+    with np.load(path) as f:
+        return WinTable([(int(m), int(u), bool(y)) for m, u, y in f["states"]],
+                        f["W"], f["utility"], int(f["bucket"]))
+
+
+def solve_win_table(utility, score_sheet=None, bucket=1, workers=0, chunk_size=64, progress=False):
+    """
+    Backward induction of max E[utility(final total)] from every state
+    reachable from `score_sheet` (default: a fresh game). workers=0 solves in
+    this process. Returns a WinTable (with .n_solved and .elapsed_s).
+    """
+    tables = get_static_tables()
+    t0 = time.perf_counter()
+    utility = np.asarray(utility, dtype=np.float64)
+    T = len(utility) - 1
+    zero_below = int(np.nonzero(utility > 0)[0][0]) if utility.any() else T
+    n_cols = math.ceil(T / bucket) + 1
+
+    if score_sheet is None:
+        score_sheet = {c: None for c in CATS}
+    avail_mask, upper_total, y_bonus = sheet_to_state(score_sheet)
+    root = (avail_mask, min(UPPER_CAP, upper_total), y_bonus)
+
+    layers = [[root]]
+    while layers[-1][0][0] != 0:
+        nxt = set()
+        for state in layers[-1]:
+            nxt |= _successor_states(tables, state)
+        layers.append(sorted(nxt))
+
+    terminal = layers.pop()
+    all_states, all_W = [terminal], [_terminal_vectors(tables.rules, terminal, utility, bucket, n_cols)]
+    row_index = _row_index(tables, terminal)
+    W = all_W[0]
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+    n_solved = 0
+    try:
+        for depth, layer in enumerate(reversed(layers)):
+            args = (T, zero_below, bucket, n_cols)
+            if pool is None:
+                W_layer = _solve_states(layer, row_index, W, *args)
+            else:
+                from shared_tables import SharedTables
+                with SharedTables.create(W, include_static=False, arrays={"row_index": row_index}) as shared:
+                    chunks = [layer[i:i + chunk_size] for i in range(0, len(layer), chunk_size)]
+                    futures = [pool.submit(_solve_chunk, c, shared.descriptor, *args) for c in chunks]
+                    W_layer = np.concatenate([f.result() for f in futures])
+            row_index = _row_index(tables, layer)
+            W = W_layer
+            all_states.append(layer)
+            all_W.append(W_layer)
+            n_solved += len(layer)
+            if progress:
+                print(f"  layer {depth + 1}: {len(layer)} states "
+                      f"(elapsed {time.perf_counter() - t0:.1f}s)", flush=True)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    table = WinTable([s for layer in all_states for s in layer], np.concatenate(all_W), utility, bucket)
+    table.n_solved, table.elapsed_s = n_solved, time.perf_counter() - t0
+    return table
+
+#-----------------------------
+# BOT
+#-----------------------------
+
+def _banked(score_sheet, bonus):
+    return sum(v for v in score_sheet.values() if v is not None) + bonus
+
+
+class WinProbabilityBot:
+    def __init__(self, opponent_bot=None, bucket=1, workers=0, n_games=None, table_dir=None):
+        """
+        opponent_bot: policy assumed for the opponent (default GreedyBot).
+        bucket: points per score-differential bucket (1 = exact).
+        workers: processes per layer solve (0 = in-process).
+        n_games: sample the opponent's distribution from this many games instead
+            of computing it exactly (for sheets with many open categories).
+        table_dir: persist solved tables here, keyed by both sheets.
+        """
+        self.opponent_bot = opponent_bot
+        self.bucket = bucket
+        self.workers = workers
+        self.n_games = n_games
+        self.table_dir = table_dir
+        self._tables = {}
+        self._widgets = {}   # (state, deficit) -> _turn result, for the current table
+
+    def _key(self, score_sheet, opponent_sheet, opponent_bonus):
+        state = sheet_to_state(score_sheet)
+        root = (state[0], min(UPPER_CAP, state[1]), state[2])
+        opponent = ([opponent_sheet[c] for c in CATS], opponent_bonus)
+        return root, json.dumps(opponent)
+
+    def table(self, score_sheet, opponent_sheet, opponent_bonus=0):
+        """WinTable for our sheet's turn-start state against this opponent sheet."""
+        root, opponent = self._key(score_sheet, opponent_sheet, opponent_bonus)
+        table = self._tables.get(opponent)
+        if table is not None and root in table.rows:
+            return table     # tables solved from an earlier sheet of ours cover later ones
+
+        path = None
+        if self.table_dir:
+            digest = hashlib.sha1(json.dumps([list(root), opponent, self.bucket, self.n_games]).encode())
+            path = os.path.join(self.table_dir, f"win_{digest.hexdigest()[:16]}.npz")
+            if os.path.exists(path):
+                table = load_win_table(path)
+        if table is None or root not in table.rows:
+            dist = opponent_score_distribution(opponent_sheet, self.opponent_bot, self.n_games, opponent_bonus)
+            table = solve_win_table(win_utility(dist), score_sheet, self.bucket, self.workers)
+            if path is not None:
+                os.makedirs(self.table_dir, exist_ok=True)
+                table.save(path)
+        self._tables = {opponent: table}
+        self._widgets = {}
+        return table
+
+    def win_probability(self, score_sheet, opponent_sheet, score_bonus=0, opponent_bonus=0):
+        """P(win) at the start of our turn, playing this bot from here on."""
+        table = self.table(score_sheet, opponent_sheet, opponent_bonus)
+        root, _ = self._key(score_sheet, opponent_sheet, opponent_bonus)
+        return table.value(root, _banked(score_sheet, score_bonus))
+
+    def _turn(self, score_sheet, opponent_sheet, score_bonus, opponent_bonus):
+        """(ev (3, S), masks (2, S), category per dice state) for this turn, at our deficit."""
+        table = self.table(score_sheet, opponent_sheet, opponent_bonus)
+        state, _ = self._key(score_sheet, opponent_sheet, opponent_bonus)
+        k = table.deficit(_banked(score_sheet, score_bonus))
+        widget = self._widgets.get((state, k))
+        if widget is not None:
+            return widget
+
+        t = get_static_tables()
+        legal, gain, row = (a[0] for a in _successor_rows(t, [state], table.row_index, table.bucket))
+        vals = table.W[np.maximum(row, 0), np.maximum(k - gain, 0)].astype(np.float64)
+        vals[~legal] = -1.0
+
+        ev, _, masks = solve_rerolls(t, vals.max(axis=1))
+        category = [t.categories[c] for c in vals.argmax(axis=1)]
+        widget = self._widgets[(state, k)] = (ev, masks, category)
+        return widget
+
+    def choose_best_keep(self, dice, rolls_left, score_sheet, opponent_sheet, score_bonus=0, opponent_bonus=0):
+        if rolls_left == 0:
+            return 0
+        _, masks, _ = self._turn(score_sheet, opponent_sheet, score_bonus, opponent_bonus)
+        sid = get_static_tables().state_to_id[tuple(sorted(dice))]
+        return int(masks[1 if rolls_left >= 2 else 0][sid])
+
+    def choose_best_category(self, dice, score_sheet, opponent_sheet, score_bonus=0, opponent_bonus=0):
+        _, _, category = self._turn(score_sheet, opponent_sheet, score_bonus, opponent_bonus)
+        return category[get_static_tables().state_to_id[tuple(sorted(dice))]]
@@ -12,27 +12,20 @@ numeric_scores = {
 
 upper_by_face = {1: "aces", 2: "twos", 3: "threes", 4: "fours", 5: "fives", 6: "sixes"}
 
+# score sheet order (bots index categories by position in this tuple)
+CATEGORIES = (
+    "aces", "twos", "threes", "fours", "fives", "sixes",
+    "threekind", "fourkind", "fullhouse", "smstraight",
+    "lgstraight", "yahtzee", "chance",
+)
+
 # Solo game
 class YahtzeeGame:
     def __init__(self):
         self.dice = [0,0,0,0,0]
         self.reroll_count = 0
 
-        self.score_sheet = {
-            "aces":       None,
-            "twos":       None,
-            "threes":     None,
-            "fours":      None,
-            "fives":      None,
-            "sixes":      None,
-            "threekind":  None,
-            "fourkind":   None,
-            "fullhouse":  None,
-            "smstraight": None,
-            "lgstraight": None,
-            "yahtzee":    None,
-            "chance":     None,
-        }
+        self.score_sheet = dict.fromkeys(CATEGORIES)
 
         # For Yahtzee Bonus
         self.yahtzee_count = 0